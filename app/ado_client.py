@@ -0,0 +1,299 @@
+"""
+Azure DevOps REST client
+Fetches work items through the batch API over one pooled HTTP session
+"""
+
+import json
+import os
+import re
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from az_auth import AzAuthError, get_token_provider
+
+API_VERSION = "7.1"
+
+# The work items batch endpoint accepts at most 200 IDs per request
+BATCH_SIZE = 200
+
+_WHERE_RE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+# Queries that cannot be paged by System.Id are run once and split into pages locally
+_UNPAGEABLE_RE = re.compile(r'\bORDER\s+BY\b|\bASOF\b|\bWorkItemLinks\b', re.IGNORECASE)
+
+
+class AdoError(Exception):
+    """Raised when an Azure DevOps request fails"""
+
+
+def get_az_access_token():
+    """Get an Azure DevOps bearer token, reusing the cached one until it nears expiry"""
+    try:
+        return get_token_provider().get_token()
+    except AzAuthError as e:
+        raise AdoError(str(e)) from e
+
+
+def invalidate_az_access_token():
+    """Drop the cached az token so the next request fetches a fresh one"""
+    get_token_provider().invalidate()
+
+
+def parse_work_item_ids(text):
+    """Parse a comma, semicolon or whitespace separated list of work item IDs"""
+    ids = []
+    for token in re.split(r'[\s,;]+', text or ''):
+        token = token.strip().lstrip('#')
+        if not token:
+            continue
+        if not token.isdigit():
+            raise ValueError(f"'{token}' is not a valid work item ID")
+        if int(token) not in ids:
+            ids.append(int(token))
+    return ids
+
+
+def wiql_string(value):
+    """Quote a value as a WIQL string literal"""
+    return "'" + value.strip().replace("'", "''") + "'"
+
+
+def build_wiql_query(area_path=None, iteration_path=None):
+    """Build a WIQL query for the work items under an area path and/or iteration path"""
+    conditions = []
+    if area_path:
+        conditions.append(f"[System.AreaPath] UNDER {wiql_string(area_path)}")
+    if iteration_path:
+        conditions.append(f"[System.IterationPath] UNDER {wiql_string(iteration_path)}")
+    if not conditions:
+        raise ValueError("An area path or iteration path is required")
+    return "SELECT [System.Id] FROM WorkItems WHERE " + " AND ".join(conditions)
+
+
+def work_item_json_path(json_dir, work_item_id):
+    """Path of the exported JSON file for a work item"""
+    return os.path.join(json_dir, f"PBI-{work_item_id}.json")
+
+
+def save_work_item_json(work_item, json_dir):
+    """Write a work item to data/json under the file name the az export uses
+
+    Batch API items carry the same id, rev and fields as `az boards work-item
+    show` but not its `_links` and `url`, which nothing here reads.
+    """
+    output_file = work_item_json_path(json_dir, work_item['id'])
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(work_item, indent=2, sort_keys=True, ensure_ascii=False) + "\n")
+    return output_file
+
+
+class AdoClient:
+    """Azure DevOps REST client that reuses one keep-alive session for every request
+
+    `on_unauthorized()` is called when the organization rejects the token, so
+    the token source can drop it. It defaults to invalidating the shared az
+    token when the client uses get_az_access_token.
+    """
+
+    def __init__(self, org_url, token=None, token_getter=get_az_access_token, timeout=30, on_unauthorized=None):
+        self.org_url = org_url.rstrip('/')
+        self.timeout = timeout
+        self._token = token
+        self._token_getter = token_getter
+        if on_unauthorized is None and token is None and token_getter is get_az_access_token:
+            on_unauthorized = invalidate_az_access_token
+        self._on_unauthorized = on_unauthorized
+        self.request_count = 0
+        self._field_names = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        })
+
+    def _auth_headers(self):
+        # The token getter is cheap (cached), so it is asked on every request to pick up refreshes
+        token = self._token or self._token_getter()
+        return {"Authorization": f"Bearer {token}"}
+
+    def _request(self, method, path, **kwargs):
+        """Send a request to the organization and return the decoded JSON body"""
+        url = f"{self.org_url}/{path.lstrip('/')}"
+        params = kwargs.pop('params', {})
+        params.setdefault('api-version', API_VERSION)
+
+        try:
+            response = self.session.request(
+                method, url,
+                params=params,
+                headers=self._auth_headers(),
+                timeout=self.timeout,
+                **kwargs
+            )
+        except requests.RequestException as e:
+            raise AdoError(f"Request to {url} failed: {e}") from e
+
+        self.request_count += 1
+
+        if response.status_code in (401, 203):
+            # 203 is what ADO returns for an expired token (it serves the sign-in page)
+            if self._on_unauthorized:
+                self._on_unauthorized()
+            raise AdoError("Azure DevOps rejected the access token. Please run 'az login' and try again.")
+        if response.status_code >= 400:
+            raise AdoError(f"Azure DevOps returned {response.status_code}: {response.text[:500]}")
+
+        return response.json()
+
+    def field_names(self):
+        """Reference names of every work item field defined in the organization"""
+        if self._field_names is None:
+            result = self._request("GET", "_apis/wit/fields")
+            self._field_names = {field['referenceName'] for field in result.get('value', [])}
+        return self._field_names
+
+    def _known_fields(self, fields):
+        """Drop fields the organization does not define (the batch API rejects unknown names)"""
+        # System fields exist everywhere, so only look up the field list for other fields
+        if all(field.startswith("System.") for field in fields):
+            return list(fields)
+        known = self.field_names()
+        return [field for field in fields if field.startswith("System.") or field in known]
+
+    def iter_work_items(self, ids, fields=None, expand="Relations"):
+        """Yield work items for the given IDs, fetching up to BATCH_SIZE per request
+
+        Pass `fields` to request only specific field reference names. Azure DevOps
+        does not allow `$expand` together with `fields`, so `expand` is ignored then.
+        IDs that do not exist (or are not visible to the user) are skipped.
+        """
+        ids = [int(i) for i in ids]
+        if fields:
+            fields = self._known_fields(fields)
+
+        for start in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[start:start + BATCH_SIZE]
+            body = {"ids": chunk, "errorPolicy": "Omit"}
+            if fields:
+                body["fields"] = list(fields)
+            elif expand:
+                body["$expand"] = expand
+
+            result = self._request("POST", "_apis/wit/workitemsbatch", json=body)
+
+            for item in result.get('value', []):
+                if item:
+                    yield item
+
+    def query_work_item_ids(self, query, project=None, top=None, time_precision=False):
+        """Run a WIQL query and return the matching work item IDs
+
+        WIQL compares dates by day unless `time_precision` is set.
+        """
+        path = f"{quote(project)}/_apis/wit/wiql" if project else "_apis/wit/wiql"
+        params = {'$top': top} if top else {}
+        if time_precision:
+            params['timePrecision'] = 'true'
+        result = self._request("POST", path, params=params, json={"query": query})
+        return [ref['id'] for ref in result.get('workItems', [])]
+
+    def iter_query_id_pages(self, query, project=None, page_size=BATCH_SIZE, time_precision=False):
+        """Yield pages of work item IDs matching a WIQL query
+
+        Flat queries are paged on the server by System.Id (`$top` plus an
+        `[System.Id] > last` condition), so only one page of IDs is in flight at a
+        time. Queries with ORDER BY, ASOF or work item links are run once and split
+        into pages locally; the service caps those at 20,000 results.
+        """
+        if _UNPAGEABLE_RE.search(query):
+            ids = self.query_work_item_ids(query, project, time_precision=time_precision)
+            for start in range(0, len(ids), page_size):
+                yield ids[start:start + page_size]
+            return
+
+        match = _WHERE_RE.search(query)
+        if match:
+            head, condition = query[:match.start()].rstrip(), f"({query[match.end():].strip()}) AND "
+        else:
+            head, condition = query.rstrip(), ""
+
+        last_id = 0
+        while True:
+            paged_query = f"{head} WHERE {condition}[System.Id] > {last_id} ORDER BY [System.Id]"
+            ids = self.query_work_item_ids(paged_query, project, top=page_size, time_precision=time_precision)
+            if ids:
+                yield ids
+            if len(ids) < page_size:
+                return
+            last_id = ids[-1]
+
+    def get_work_items(self, ids, fields=None, expand="Relations"):
+        """Fetch work items for the given IDs as a list"""
+        return list(self.iter_work_items(ids, fields=fields, expand=expand))
+
+    def download(self, url, max_bytes=None):
+        """Download a file (e.g. a work item attachment) and return (content, content type)
+
+        The bearer token is only sent to URLs inside the organization, so images
+        hosted elsewhere are fetched anonymously. Raises AdoError for failed
+        requests and for files larger than `max_bytes`.
+        """
+        headers = {"Accept": "*/*"}
+        if url.lower().startswith(self.org_url.lower() + "/"):
+            headers.update(self._auth_headers())
+
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                self.request_count += 1
+                if response.status_code >= 400:
+                    raise AdoError(f"Download of {url} returned {response.status_code}")
+
+                content = b""
+                for chunk in response.iter_content(64 * 1024):
+                    content += chunk
+                    if max_bytes and len(content) > max_bytes:
+                        raise AdoError(f"{url} is larger than {max_bytes // 1024} KB")
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        except requests.RequestException as e:
+            raise AdoError(f"Download of {url} failed: {e}") from e
+
+        return content, content_type
+
+    def close(self):
+        self.session.close()
+
+
+def export_work_items(client, ids, json_dir, log=None, fields=None, cache=None):
+    """Export work items in bulk and write each one to data/json/PBI-<id>.json
+
+    Pass `fields` to export only those fields (see field_projection). With a
+    `cache` (work_item_cache.WorkItemCache over the same directory) the files
+    are written through it, so it records the exported field set and never
+    serves a projected copy to a caller that needs more fields.
+    Returns a dict of work item ID -> work item data for the items that were found.
+    """
+    log = log or (lambda message, level="INFO": None)
+    ids = [int(i) for i in ids]
+    exported = {}
+    requests_before = client.request_count
+
+    log(f"Exporting {len(ids)} work item(s) in batches of up to {BATCH_SIZE}...")
+
+    for work_item in client.iter_work_items(ids, fields=fields):
+        if cache is None:
+            save_work_item_json(work_item, json_dir)
+        exported[work_item['id']] = work_item
+    if cache is not None:
+        cache.update(exported.values(), fields)
+
+    missing = [i for i in ids if i not in exported]
+    if missing:
+        log(f"{len(missing)} work item(s) not found or not accessible: {', '.join(map(str, missing))}", "WARNING")
+
+    log(f"✓ Exported {len(exported)} work item(s) in {client.request_count - requests_before} request(s)", "SUCCESS")
+    return exported
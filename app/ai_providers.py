@@ -0,0 +1,385 @@
+"""
+AI provider client layer
+Keeps one long-lived client per (provider, API key, base URL) and sends chat requests the same way for every provider
+"""
+
+import importlib
+import importlib.metadata
+import json
+import re
+import threading
+import time
+
+from rate_limit import DEFAULT_MAX_RETRIES, get_rate_limiter
+from response_cache import cache_key
+from token_budget import estimate_tokens
+
+GITHUB_MODELS_URL = "https://models.inference.ai.azure.com"
+
+# Providers served through the OpenAI SDK at a different endpoint
+PROVIDER_BASE_URLS = {
+    'github': GITHUB_MODELS_URL
+}
+
+DEFAULT_MAX_TOKENS = 4000
+
+# Features of OpenAI-compatible model families (their context sizes are in token_budget): the first
+# dated snapshot that accepts response_format json_schema (families without one get the schema through
+# the prompt only) and whether they take image input. A bare family name is the provider's current alias.
+MODEL_FEATURES = {
+    'gpt-4o': {'json_schema_since': "2024-08-06", 'vision': True},
+    'gpt-4o-mini': {'json_schema_since': "2024-07-18", 'vision': True},
+    'gpt-4.1': {'json_schema_since': "2025-04-14", 'vision': True},
+    'gpt-4.1-mini': {'json_schema_since': "2025-04-14", 'vision': True},
+    'gpt-4.1-nano': {'json_schema_since': "2025-04-14", 'vision': True},
+    'gpt-4-turbo': {'json_schema_since': None, 'vision': True},
+    'o1': {'json_schema_since': "2024-12-17", 'vision': True},
+    'o3-mini': {'json_schema_since': "2025-01-31", 'vision': False},
+    'o3': {'json_schema_since': "2025-04-16", 'vision': True},
+    'o4-mini': {'json_schema_since': "2025-04-16", 'vision': True}
+}
+
+# Claude generations without image input; every later Claude model accepts images
+TEXT_ONLY_CLAUDE_MODELS = ('claude-2', 'claude-instant')
+
+# Oldest Anthropic SDK whose messages.create() accepts tools and tool_choice
+ANTHROPIC_TOOLS_SDK_VERSION = (0, 27)
+# Oldest OpenAI SDK whose chat.completions.create() accepts stream_options
+OPENAI_STREAM_OPTIONS_SDK_VERSION = (1, 26)
+
+
+def _import_sdk(module_name):
+    """Import a provider SDK; raises ImportError naming the requirements file when it is missing"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise ImportError(f"The {module_name} package is not installed. Install the requirements "
+                          f"(pip install -r requirements.txt or requirements-streamlit.txt)") from None
+
+
+def create_client(provider, api_key, base_url=None, log=None):
+    """Create an SDK client for a provider (github, openai, azure or anthropic)
+
+    The clients hold an HTTP connection pool, so create one per provider and key
+    and reuse it (see ClientPool) instead of building one per request. The
+    SDKs' own retries are turned off; complete() retries through the shared
+    rate limiter instead.
+    """
+    if provider == "anthropic":
+        anthropic = _import_sdk("anthropic")
+        if base_url:
+            return anthropic.Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
+        return anthropic.Anthropic(api_key=api_key, max_retries=0)
+
+    openai = _import_sdk("openai")
+    return openai.OpenAI(api_key=api_key, base_url=base_url or PROVIDER_BASE_URLS.get(provider), max_retries=0)
+
+
+class ClientPool:
+    """Process-wide clients keyed by (provider, API key, base URL)"""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, api_key, base_url=None, log=None):
+        """Return the shared client for a provider and key, creating it on first use"""
+        key = (provider, api_key, base_url or PROVIDER_BASE_URLS.get(provider))
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = create_client(provider, api_key, base_url, log)
+            return self._clients[key]
+
+    def close(self):
+        """Close every pooled client and its connections"""
+        with self._lock:
+            for client in self._clients.values():
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            self._clients.clear()
+
+
+_default_pool = ClientPool()
+
+
+def get_client_pool():
+    """Return the client pool shared by every AI call in this process"""
+    return _default_pool
+
+
+def _sdk_version(package):
+    """Installed version of an SDK package as a tuple of ints, or None when it is not installed"""
+    try:
+        version = importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+    return tuple(int(part) for part in re.findall(r'\d+', version)[:3])
+
+
+_SNAPSHOT_RE = re.compile(r'^(.+?)-(\d{4}-\d{2}-\d{2})$')
+
+
+def _model_name(model):
+    """Lowercase model name without a publisher prefix such as "openai/"""
+    return (model or '').strip().lower().rsplit('/', 1)[-1]
+
+
+def model_snapshot(model):
+    """Return (family, snapshot date or None) of a model name such as "gpt-4o-2024-08-06" or "openai/gpt-4.1"
+
+    The family is None when the name is not in MODEL_FEATURES.
+    """
+    name = _model_name(model)
+    if name in MODEL_FEATURES:
+        return name, None
+    match = _SNAPSHOT_RE.match(name)
+    if match and match.group(1) in MODEL_FEATURES:
+        return match.group(1), match.group(2)
+    return None, None
+
+
+def supports_json_schema(provider, model):
+    """True when the provider can be made to answer in a JSON schema (Anthropic through a forced tool call)"""
+    if provider == "anthropic":
+        # Older SDKs reject the tools argument outright
+        return (_sdk_version("anthropic") or (0,)) >= ANTHROPIC_TOOLS_SDK_VERSION
+    family, snapshot = model_snapshot(model)
+    since = MODEL_FEATURES[family].get('json_schema_since') if family else None
+    # Snapshots older than the first one with structured outputs reject the request
+    return bool(since) and (snapshot is None or snapshot >= since)
+
+
+def supports_vision(model):
+    """True when the model accepts image input (looked up like supports_json_schema)"""
+    name = _model_name(model)
+    if name.startswith("claude-"):
+        return not name.startswith(TEXT_ONLY_CLAUDE_MODELS)
+    if "vision" in name:
+        # e.g. gpt-4-vision-preview or Llama-3.2-11B-Vision-Instruct on GitHub Models
+        return True
+    family, _ = model_snapshot(model)
+    return bool(family) and MODEL_FEATURES[family]['vision']
+
+
+def cacheable_prompt(prompt, split_at, provider, extra_parts=None):
+    """User message content whose part before `split_at` the provider can cache between calls
+
+    Prompts start with the static instructions and end with what changes per
+    call. Anthropic caches up to a block marked with cache_control; OpenAI
+    caches identical prompt prefixes automatically, so the text stays whole.
+    Returns the plain prompt when there is nothing to mark or attach, else a
+    list of content parts ending with `extra_parts` (e.g. images).
+    """
+    index = prompt.find(split_at) if split_at else -1
+    if provider != "anthropic" or index <= 0:
+        if not extra_parts:
+            return prompt
+        return [{"type": "text", "text": prompt}] + list(extra_parts)
+    return [
+        {"type": "text", "text": prompt[:index], "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": prompt[index:]}
+    ] + list(extra_parts or [])
+
+
+def _usage(response, provider):
+    """Token usage of a response: input, output and input tokens read from / written to the prompt cache"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return None
+    if provider == "anthropic":
+        return {
+            'input_tokens': (usage.input_tokens or 0) + (getattr(usage, 'cache_read_input_tokens', 0) or 0)
+                            + (getattr(usage, 'cache_creation_input_tokens', 0) or 0),
+            'output_tokens': usage.output_tokens or 0,
+            'cached_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+            'cache_write_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        }
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'input_tokens': usage.prompt_tokens or 0,
+        'output_tokens': usage.completion_tokens or 0,
+        'cached_tokens': (getattr(details, 'cached_tokens', 0) or 0) if details else 0,
+        'cache_write_tokens': 0
+    }
+
+
+def _request_tokens(model, messages, system, max_tokens):
+    """Tokens a request counts against a per-minute limit: estimated prompt plus the output allowance"""
+    texts = [system or '']
+    for message in messages:
+        content = message['content']
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(part.get('text', '') for part in content if isinstance(part, dict))
+    return estimate_tokens("\n".join(texts), model) + max_tokens
+
+
+def complete(client, provider, model, messages, system=None, temperature=None, max_tokens=DEFAULT_MAX_TOKENS,
+             timeout=None, cache=None, refresh=False, max_retries=DEFAULT_MAX_RETRIES, response_schema=None,
+             on_usage=None, validate=None):
+    """Send a chat request and return the text of the answer
+
+    `messages` are {"role": "user"/"assistant", "content": ...} dicts; content
+    is a string or a list of parts already in the provider's format (see
+    image_cache.image_message_parts). The system prompt goes where the provider
+    expects it.
+
+    With a `cache` (response_cache.ResponseCache) a stored answer to the same
+    request is returned without calling the provider; `refresh` skips the
+    lookup but still stores the new answer.
+
+    Calls wait for the shared rate limiter (see rate_limit) and rate-limited or
+    overloaded requests are retried up to `max_retries` times.
+
+    `response_schema` ({'name', 'description', 'schema'}) asks for JSON in that
+    schema where the model supports it (see supports_json_schema); the answer
+    is then the JSON text. `on_usage` is called with the token usage of each
+    answered request, including prompt cache reads (see cacheable_prompt).
+
+    `validate` is called with the answer before it is cached; when it raises
+    the answer is not stored (and a stored answer it rejects is asked again),
+    so a malformed answer is not served on every later run.
+    """
+    key = None
+    if cache is not None:
+        key = cache_key(provider, model, messages, system, temperature, max_tokens, response_schema)
+        cached = None if refresh else cache.get(key)
+        if cached is not None:
+            try:
+                if validate:
+                    validate(cached)
+                return cached
+            except Exception:
+                pass  # Stored before validation existed; replaced below
+
+    limiter = get_rate_limiter()
+    tokens = _request_tokens(model, messages, system, max_tokens)
+    attempt = 0
+    while True:
+        limiter.acquire(provider, model, tokens)
+        try:
+            text = _complete(client, provider, model, messages, system, temperature, max_tokens, timeout,
+                             response_schema, on_usage)
+            break
+        except Exception as e:
+            delay = limiter.backoff(provider, model, e, attempt, max_retries)
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
+
+    if validate:
+        validate(text)
+    if key and text:
+        cache.put(key, text, model)
+    return text
+
+
+def _complete(client, provider, model, messages, system, temperature, max_tokens, timeout, response_schema=None,
+              on_usage=None):
+    options = {}
+    if temperature is not None:
+        options['temperature'] = temperature
+    if timeout is not None:
+        options['timeout'] = timeout
+
+    if provider == "anthropic":
+        if system:
+            options['system'] = system
+        if response_schema and supports_json_schema(provider, model):
+            # A forced tool call makes Claude answer with input matching the schema
+            options['tools'] = [{"name": response_schema['name'], "description": response_schema['description'],
+                                 "input_schema": response_schema['schema']}]
+            options['tool_choice'] = {"type": "tool", "name": response_schema['name']}
+        response = client.messages.create(model=model, max_tokens=max_tokens, messages=messages, **options)
+        if on_usage:
+            on_usage(_usage(response, provider))
+        for block in response.content:
+            if getattr(block, 'type', None) == 'tool_use':
+                return json.dumps(block.input, ensure_ascii=False)
+        return "".join(block.text for block in response.content if getattr(block, 'type', 'text') == 'text').strip()
+
+    if response_schema and supports_json_schema(provider, model):
+        options['response_format'] = {"type": "json_schema", "json_schema": {
+            "name": response_schema['name'], "schema": response_schema['schema'], "strict": True}}
+    if system:
+        messages = [{"role": "system", "content": system}] + list(messages)
+    response = client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens, **options)
+    if on_usage:
+        on_usage(_usage(response, provider))
+    return (response.choices[0].message.content or "").strip()
+
+
+def stream_complete(client, provider, model, messages, system=None, temperature=None, max_tokens=DEFAULT_MAX_TOKENS,
+                    timeout=None, cache=None, refresh=False, max_retries=DEFAULT_MAX_RETRIES, on_usage=None):
+    """Send a chat request like complete() and yield the answer text as it is generated
+
+    A cached answer is yielded in one piece; a streamed answer is stored once
+    the stream has finished. Failures are only retried before the first text
+    has been yielded.
+    """
+    key = None
+    if cache is not None:
+        key = cache_key(provider, model, messages, system, temperature, max_tokens)
+        cached = None if refresh else cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    limiter = get_rate_limiter()
+    tokens = _request_tokens(model, messages, system, max_tokens)
+    parts = []
+    attempt = 0
+    while True:
+        limiter.acquire(provider, model, tokens)
+        try:
+            for text in _stream(client, provider, model, messages, system, temperature, max_tokens, timeout,
+                                on_usage):
+                parts.append(text)
+                yield text
+            break
+        except Exception as e:
+            delay = None if parts else limiter.backoff(provider, model, e, attempt, max_retries)
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
+
+    if key and parts:
+        cache.put(key, "".join(parts).strip(), model)
+
+
+def _stream(client, provider, model, messages, system, temperature, max_tokens, timeout, on_usage=None):
+    options = {}
+    if temperature is not None:
+        options['temperature'] = temperature
+    if timeout is not None:
+        options['timeout'] = timeout
+
+    if provider == "anthropic":
+        if system:
+            options['system'] = system
+        with client.messages.stream(model=model, max_tokens=max_tokens, messages=messages, **options) as stream:
+            for text in stream.text_stream:
+                yield text
+            if on_usage:
+                on_usage(_usage(stream.get_final_message(), provider))
+        return
+
+    if system:
+        messages = [{"role": "system", "content": system}] + list(messages)
+    if (provider == "openai" and on_usage
+            and (_sdk_version("openai") or (0,)) >= OPENAI_STREAM_OPTIONS_SDK_VERSION):
+        # Only api.openai.com is known to accept stream_options; the usage arrives in a last, choice-less chunk
+        options['stream_options'] = {"include_usage": True}
+    response = client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens, stream=True,
+                                              **options)
+    for chunk in response:
+        # Azure-hosted models send a first chunk with no choices (content filter results)
+        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        elif on_usage and getattr(chunk, 'usage', None):
+            on_usage(_usage(chunk, provider))
@@ -0,0 +1,203 @@
+"""
+Cached Azure DevOps access token provider
+Calls `az account get-access-token` once and reuses the token until shortly before it expires
+"""
+
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+try:
+    import keyring
+    from keyring.errors import KeyringError
+    KEYRING_AVAILABLE = True
+except ImportError:
+    KEYRING_AVAILABLE = False
+
+# Where the disk cache's encryption key is kept in the OS keyring (Credential Manager, Keychain, Secret Service)
+KEYRING_SERVICE = "azure-devops-testcase-generator"
+KEYRING_KEY_NAME = "token-cache-key"
+
+# Azure DevOps application ID used as the token resource for `az account get-access-token`
+ADO_RESOURCE_ID = "499b84ac-1321-427f-aa17-267ca6975798"
+
+# Refresh this many seconds before the token actually expires
+DEFAULT_REFRESH_MARGIN = 300
+
+
+class AzAuthError(Exception):
+    """Raised when no access token can be obtained from the Azure CLI"""
+
+
+def _parse_expiry(token_info):
+    """Return the token expiry as a Unix timestamp"""
+    # Newer CLI versions include expires_on (epoch seconds); older ones only expiresOn (local time)
+    if token_info.get('expires_on'):
+        return float(token_info['expires_on'])
+    expires_on = token_info.get('expiresOn')
+    if expires_on:
+        return datetime.strptime(expires_on.split('.')[0], "%Y-%m-%d %H:%M:%S").timestamp()
+    return time.time() + 3600
+
+
+def fetch_az_access_token(resource=ADO_RESOURCE_ID):
+    """Run `az account get-access-token` and return its JSON output"""
+    # On Windows, az is a .cmd file that requires shell=True
+    use_shell = platform.system() == 'Windows'
+
+    try:
+        result = subprocess.run(
+            ["az", "account", "get-access-token",
+             "--resource", resource,
+             "--output", "json"],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            shell=use_shell
+        )
+    except FileNotFoundError:
+        raise AzAuthError("Azure CLI not found. Please ensure 'az' is installed")
+    except subprocess.TimeoutExpired:
+        raise AzAuthError("Timed out waiting for an access token from Azure CLI")
+
+    if result.returncode != 0:
+        raise AzAuthError(f"Could not get an access token from Azure CLI: {result.stderr.strip()}")
+
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        raise AzAuthError("Azure CLI returned an unreadable access token response")
+
+
+class AzureTokenProvider:
+    """Azure DevOps bearer token cached in memory and optionally on disk
+
+    The token is fetched with one `az account get-access-token` call and reused
+    until `refresh_margin` seconds before it expires. When `cache_file` is set and
+    the `cryptography` and `keyring` packages are installed, the token is also
+    kept on disk, encrypted with a key held in the OS keyring (never next to the
+    file), so a restarted app can skip the CLI. A missing, corrupt or
+    undecryptable cache file just means one more CLI call.
+    """
+
+    def __init__(self, resource=ADO_RESOURCE_ID, refresh_margin=DEFAULT_REFRESH_MARGIN, cache_file=None):
+        self.resource = resource
+        self.refresh_margin = refresh_margin
+        self.cache_file = cache_file
+        self.fetch_count = 0
+        self._token_info = None
+        self._lock = threading.Lock()
+
+    def _is_valid(self, token_info):
+        return bool(token_info) and token_info['expires_at'] - self.refresh_margin > time.time()
+
+    def _disk_cache_enabled(self):
+        return bool(self.cache_file) and CRYPTOGRAPHY_AVAILABLE and KEYRING_AVAILABLE
+
+    def _fernet(self, create=False):
+        """Cipher for the disk cache, with its key from the OS keyring; None when there is no key"""
+        try:
+            key = keyring.get_password(KEYRING_SERVICE, KEYRING_KEY_NAME)
+            if not key and create:
+                key = Fernet.generate_key().decode('ascii')
+                keyring.set_password(KEYRING_SERVICE, KEYRING_KEY_NAME, key)
+        except KeyringError:
+            return None
+        return Fernet(key.encode('ascii')) if key else None
+
+    def _load_from_disk(self):
+        if not (self._disk_cache_enabled() and os.path.exists(self.cache_file)):
+            return None
+        try:
+            fernet = self._fernet()
+            if fernet is None:
+                return None
+            with open(self.cache_file, 'rb') as f:
+                token_info = json.loads(fernet.decrypt(f.read()))
+        except (OSError, ValueError, InvalidToken):
+            return None
+        if not (isinstance(token_info, dict) and token_info.get('resource') == self.resource
+                and token_info.get('access_token') and isinstance(token_info.get('expires_at'), (int, float))):
+            return None
+        return token_info
+
+    def _save_to_disk(self, token_info):
+        if not self._disk_cache_enabled():
+            return
+        try:
+            fernet = self._fernet(create=True)
+            if fernet is None:
+                return
+            with open(self.cache_file, 'wb') as f:
+                f.write(fernet.encrypt(json.dumps(token_info).encode('utf-8')))
+            os.chmod(self.cache_file, 0o600)
+        except (OSError, ValueError):
+            pass  # The disk copy only saves a CLI call on the next start; a bad keyring key just skips it
+
+    def get_token_info(self):
+        """Return the cached token details, refreshing them from the Azure CLI when needed"""
+        with self._lock:
+            if self._is_valid(self._token_info):
+                return self._token_info
+
+            token_info = self._load_from_disk()
+            if not self._is_valid(token_info):
+                raw = fetch_az_access_token(self.resource)
+                self.fetch_count += 1
+                token_info = {
+                    'resource': self.resource,
+                    'access_token': raw['accessToken'],
+                    'expires_at': _parse_expiry(raw),
+                    'tenant': raw.get('tenant'),
+                    'subscription': raw.get('subscription')
+                }
+                self._save_to_disk(token_info)
+
+            self._token_info = token_info
+            return token_info
+
+    def get_token(self):
+        """Return a bearer token for Azure DevOps"""
+        return self.get_token_info()['access_token']
+
+    def is_logged_in(self):
+        """True when a token is cached or the Azure CLI can provide one"""
+        try:
+            self.get_token_info()
+            return True
+        except AzAuthError:
+            return False
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after `az login` or a rejected request"""
+        with self._lock:
+            self._token_info = None
+            if self.cache_file and os.path.exists(self.cache_file):
+                try:
+                    os.remove(self.cache_file)
+                except OSError:
+                    pass
+
+
+_default_provider = AzureTokenProvider()
+
+
+def get_token_provider():
+    """Return the token provider shared by every Azure DevOps call in this process"""
+    return _default_provider
+
+
+def configure_token_cache(cache_file):
+    """Keep the shared provider's token on disk (encrypted) at `cache_file`; returns whether that is possible"""
+    _default_provider.cache_file = cache_file
+    return CRYPTOGRAPHY_AVAILABLE and KEYRING_AVAILABLE
@@ -0,0 +1,163 @@
+"""
+Local test case coverage analysis
+Sorts test cases into direct coverage of the acceptance criteria and additional considerations without an AI call
+"""
+
+import re
+
+import numpy as np
+
+from suite_merge import CATEGORY_NAMES, CATEGORY_PREFIXES
+from suite_patch import suite_from_csv
+
+# Added to the similarity of a criterion the test case's COS Reference names
+REFERENCE_BONUS = 0.3
+# Scores at or above DIRECT_SCORE count as direct coverage, below ADDITIONAL_SCORE as additional;
+# anything in between is decided locally but reported as ambiguous
+DIRECT_SCORE = 0.35
+ADDITIONAL_SCORE = 0.2
+# Negative and regression tests usually go beyond the stated criteria; they need a stronger match
+BEYOND_CRITERIA_PREFIXES = ('NEG', 'REG')
+BEYOND_CRITERIA_PENALTY = 0.1
+
+_STOP_WORDS = frozenset("""
+a an and are as at be by can do does for from has have if in into is it its of on or should so that the their
+then there these this to user users verify was when which will with without test tests case cases step steps
+""".split())
+
+_ID_RE = re.compile(r'^\s*(' + '|'.join(CATEGORY_PREFIXES) + r')-\d+\s*[:\-]?\s*', re.IGNORECASE)
+# cos_items() numbers its entries ("COS 1: ..."); the label is added back when formatting
+_CRITERION_NUMBER_RE = re.compile(r'^\s*(?:COS|criteri(?:on|a)|expected result)\s*#?\s*\d+\s*[:.)\-]\s*', re.IGNORECASE)
+_REFERENCE_RE = re.compile(r'(?:COS|criteri(?:on|a)|expected result)\s*#?\s*(\d+)', re.IGNORECASE)
+
+
+def _stem(word):
+    """Crude suffix stripping so "validates", "validated" and "validation" meet"""
+    for suffix in ("ations", "ation", "ings", "ing", "ies", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def _terms(text):
+    """Stemmed words and word bigrams of a text"""
+    words = [_stem(word) for word in re.findall(r'[a-z0-9]+', (text or '').lower()) if word not in _STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def similarity_matrix(documents, queries):
+    """Cosine similarity of TF-IDF vectors (words and bigrams), shape (len(documents), len(queries))"""
+    term_lists = [_terms(text) for text in list(documents) + list(queries)]
+    vocabulary = {}
+    for terms in term_lists:
+        for term in terms:
+            vocabulary.setdefault(term, len(vocabulary))
+    if not vocabulary:
+        return np.zeros((len(documents), len(queries)))
+
+    counts = np.zeros((len(term_lists), len(vocabulary)))
+    for row, terms in enumerate(term_lists):
+        for term in terms:
+            counts[row, vocabulary[term]] += 1
+    # Sublinear term frequency and smoothed IDF
+    weights = np.where(counts > 0, 1 + np.log(np.maximum(counts, 1)), 0.0)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    weights *= np.log((1 + len(term_lists)) / (1 + document_frequency)) + 1
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    weights /= np.where(norms > 0, norms, 1)
+    return weights[:len(documents)] @ weights[len(documents):].T
+
+
+def _category(title):
+    match = _ID_RE.match(title)
+    return match.group(1).upper() if match else None
+
+
+def _short(text, length=90):
+    text = ' '.join(text.split())
+    return text if len(text) <= length else text[:length - 1].rstrip() + "…"
+
+
+def analyze_coverage(csv_content, criteria, label="COS"):
+    """Categorize the test cases of a suite against numbered criteria (e.g. the work item's COS)
+
+    Each test case is scored against each criterion by text similarity of its
+    title and steps, plus REFERENCE_BONUS for the criteria its COS Reference
+    names. Returns the dict the coverage view shows ('direct_coverage' with
+    'test_title'/'addresses', 'additional_considerations' with
+    'test_title'/'purpose'), plus 'ambiguous' (titles of close calls),
+    'covered' and 'uncovered' (criterion numbers).
+    """
+    _, test_cases = suite_from_csv(csv_content)
+    test_cases = [test_case for test_case in test_cases if test_case['title']]
+    criteria = [_CRITERION_NUMBER_RE.sub('', str(criterion)).strip() for criterion in criteria or []
+                if str(criterion).strip()]
+    result = {'direct_coverage': [], 'additional_considerations': [], 'ambiguous': [], 'covered': [],
+              'uncovered': list(range(1, len(criteria) + 1))}
+    if not test_cases:
+        return result
+
+    documents = []
+    for test_case in test_cases:
+        name = _ID_RE.sub('', test_case['title'])
+        steps = ' '.join(f"{step['action']} {step['expected']}" for step in test_case['steps'])
+        # The title says what a test is for; repeat it so long step text does not drown it
+        documents.append(f"{name} {name} {steps}")
+    scores = similarity_matrix(documents, criteria) if criteria else np.zeros((len(test_cases), 0))
+
+    for row, test_case in enumerate(test_cases):
+        for number in {int(number) for number in _REFERENCE_RE.findall(test_case['reference'])}:
+            if 1 <= number <= len(criteria):
+                scores[row, number - 1] += REFERENCE_BONUS
+
+    covered = set()
+    for row, test_case in enumerate(test_cases):
+        title = test_case['title']
+        category = _category(title)
+        best = int(np.argmax(scores[row])) if criteria else None
+        score = float(scores[row, best]) if criteria else 0.0
+        penalty = BEYOND_CRITERIA_PENALTY if category in BEYOND_CRITERIA_PREFIXES else 0.0
+        if ADDITIONAL_SCORE + penalty <= score < DIRECT_SCORE + penalty:
+            result['ambiguous'].append(title)
+        # Close calls go to the nearer side of the band
+        if score >= (ADDITIONAL_SCORE + DIRECT_SCORE) / 2 + penalty:
+            covered.add(best + 1)
+            result['direct_coverage'].append({
+                'test_title': title,
+                'addresses': f"{label} {best + 1}: {_short(criteria[best])}",
+                'score': round(score, 2)
+            })
+        else:
+            purpose = f"{CATEGORY_NAMES.get(category, 'Additional')} coverage beyond the stated criteria"
+            if criteria and score >= ADDITIONAL_SCORE:
+                purpose += f" (closest: {label} {best + 1})"
+            result['additional_considerations'].append({'test_title': title, 'purpose': purpose,
+                                                        'score': round(score, 2)})
+
+    result['covered'] = sorted(covered)
+    result['uncovered'] = [number for number in range(1, len(criteria) + 1) if number not in covered]
+    return result
+
+
+def apply_categorization(coverage, categorization):
+    """Let an AI categorization (categorize_test_cases_with_ai's shape) decide the test cases it names
+
+    Used for the ambiguous test cases of a local analysis; returns a new
+    coverage dict with those entries moved to the AI's side.
+    """
+    decided = {}
+    for entry in categorization.get('direct_coverage') or []:
+        if entry.get('test_title'):
+            decided[entry['test_title']] = ('direct_coverage', {'test_title': entry['test_title'],
+                                                               'addresses': entry.get('addresses', '')})
+    for entry in categorization.get('additional_considerations') or []:
+        if entry.get('test_title'):
+            decided[entry['test_title']] = ('additional_considerations', {'test_title': entry['test_title'],
+                                                                         'purpose': entry.get('purpose', '')})
+    result = dict(coverage, direct_coverage=[], additional_considerations=[],
+                  ambiguous=[title for title in coverage['ambiguous'] if title not in decided])
+    for side in ('direct_coverage', 'additional_considerations'):
+        for entry in coverage[side]:
+            target, replacement = decided.get(entry['test_title'], (side, entry))
+            result[target].append(replacement)
+    return result
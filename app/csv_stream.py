@@ -0,0 +1,98 @@
+"""
+Incremental test case CSV parser
+Emits each test case of a streamed CSV answer as soon as its rows are complete
+"""
+
+import csv
+
+DEFAULT_HEADER = ["Work Item Type", "Title", "Test Step", "Step Action", "Step Expected", "COS Reference"]
+
+
+class TestCaseStreamParser:
+    """Parse a test case CSV while it is still arriving
+
+    Feed text deltas in any sizes; a record ends at a newline outside quotes. A
+    test case is complete when the next "Test Case" row starts or the stream is
+    closed. Code fences and prose around the CSV are skipped. Each test case is
+    a dict with title, rows (its own row first, then its steps) and header.
+    """
+
+    def __init__(self, on_test_case=None):
+        self.on_test_case = on_test_case
+        self.header = None
+        self.test_cases = []
+        self._buffer = ""
+        self._scan = 0     # buffer position scanned for newlines so far
+        self._quotes = 0   # quote characters between the start of the buffer and _scan
+        self._current = None
+
+    def feed(self, text):
+        """Add streamed text and return the test cases it completed"""
+        completed = []
+        self._buffer += text
+        while True:
+            newline = self._buffer.find('\n', self._scan)
+            if newline < 0:
+                self._quotes += self._buffer.count('"', self._scan)
+                self._scan = len(self._buffer)
+                return completed
+            self._quotes += self._buffer.count('"', self._scan, newline)
+            self._scan = newline + 1
+            if self._quotes % 2 == 0:
+                # An even number of quotes means the newline is not inside a quoted field
+                record = self._buffer[:newline]
+                self._buffer = self._buffer[newline + 1:]
+                self._scan = 0
+                self._quotes = 0
+                completed.extend(self._handle(record))
+
+    def close(self):
+        """Finish the stream and return the test cases still open"""
+        completed = self._handle(self._buffer) if self._buffer.strip() else []
+        self._buffer = ""
+        self._scan = self._quotes = 0
+        if self._current:
+            completed.append(self._finish())
+        return completed
+
+    def _finish(self):
+        test_case = {
+            'title': self._current[0][1].strip() if len(self._current[0]) > 1 else "",
+            'rows': self._current,
+            'header': self.header or DEFAULT_HEADER
+        }
+        self._current = None
+        self.test_cases.append(test_case)
+        if self.on_test_case:
+            self.on_test_case(test_case)
+        return test_case
+
+    def _handle(self, record):
+        record = record.rstrip('\r')
+        if not record.strip() or record.lstrip().startswith("```"):
+            return []
+        row = next(csv.reader([record]), [])
+        first = row[0].strip() if row else ""
+
+        if first == "Work Item Type":
+            self.header = self.header or row
+            return []
+        if first == "Test Case":
+            completed = [self._finish()] if self._current else []
+            self._current = [row]
+            return completed
+        if first == "" and self._current is not None:
+            self._current.append(row)
+        # Anything else is prose around the CSV
+        return []
+
+
+def read_streamed_answer(deltas, on_test_case=None):
+    """Consume streamed text deltas, reporting each test case as it completes; return the whole answer"""
+    parser = TestCaseStreamParser(on_test_case)
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        parser.feed(delta)
+    parser.close()
+    return "".join(parts).strip()
@@ -0,0 +1,61 @@
+"""
+Work item field projection
+Derives the fields an export needs from the placeholders in the prompt template
+"""
+
+import string
+
+# Prompt template placeholder -> work item fields it reads
+PLACEHOLDER_FIELDS = {
+    'work_item_id': [],
+    'work_item_type': ['System.WorkItemType'],
+    'title': ['System.Title'],
+    'description': ['System.Description'],
+    'acceptance_criteria': ['Microsoft.VSTS.Common.AcceptanceCriteria', 'Custom.ExpectedResults'],
+    'repro_steps': ['Microsoft.VSTS.TCM.ReproSteps'],
+    'developer_notes': ['Custom.DeveloperNotes', 'Microsoft.VSTS.TCM.ReproSteps'],
+    'last_column': ['System.WorkItemType'],
+    'last_column_lower': ['System.WorkItemType'],
+    'last_column_description': ['System.WorkItemType'],
+    'template_content': [],
+    'related_context': []
+}
+
+# Always exported: revision tracking for the cache, and the fields the apps read
+# outside the prompt (COS coverage, Bug handling, titles and state in the UI and suite store)
+REQUIRED_FIELDS = [
+    "System.Id",
+    "System.Rev",
+    "System.ChangedDate",
+    "System.WorkItemType",
+    "System.State",
+    "System.Title",
+    "Microsoft.VSTS.Common.AcceptanceCriteria",
+    "Custom.ExpectedResults",
+    "Microsoft.VSTS.TCM.ReproSteps"
+]
+
+
+def template_placeholders(template):
+    """Return the names of the {placeholders} used in a str.format template"""
+    names = set()
+    for _, field_name, _, _ in string.Formatter().parse(template):
+        if field_name:
+            # {a.b} and {a[0]} both read the `a` argument
+            names.add(field_name.split('.')[0].split('[')[0])
+    return names
+
+
+def fields_for_placeholders(placeholders):
+    """Return the field reference names to export for the given placeholders"""
+    fields = list(REQUIRED_FIELDS)
+    for placeholder in sorted(placeholders):
+        for field in PLACEHOLDER_FIELDS.get(placeholder, []):
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def template_fields(template):
+    """Return the field reference names a prompt template needs"""
+    return fields_for_placeholders(template_placeholders(template))
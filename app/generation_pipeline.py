@@ -0,0 +1,229 @@
+"""
+Concurrent export and generation pipeline for lists of work items
+Exports run under a semaphore and each finished export goes straight to generation
+"""
+
+import asyncio
+import json
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ado_client import AdoError, save_work_item_json
+
+DEFAULT_CONCURRENCY = 4
+
+
+async def export_with_az_cli(work_item_id, org_url, json_dir, timeout=30):
+    """Export a work item with `az boards work-item show` without blocking the event loop"""
+    # shutil.which resolves az.cmd on Windows, which create_subprocess_exec can run directly
+    az_path = shutil.which("az")
+    if not az_path:
+        raise RuntimeError("Azure CLI not found. Please ensure 'az' is installed")
+
+    process = await asyncio.create_subprocess_exec(
+        az_path, "boards", "work-item", "show",
+        "--id", str(work_item_id),
+        "--organization", org_url,
+        "--output", "json",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        raise RuntimeError(f"Export of work item {work_item_id} timed out")
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Export failed: {stderr.decode('utf-8', errors='replace').strip()}")
+
+    work_item = json.loads(stdout.decode('utf-8'))
+    save_work_item_json(work_item, json_dir)
+    return work_item
+
+
+def make_exporter(cache, client, org_url, json_dir, log=None, fields=None):
+    """Build an async export function that uses the work item cache (REST) and falls back to az
+
+    Pass `fields` to export only the fields the prompt needs (see field_projection).
+    """
+    rest_available = [True]
+
+    async def export(work_item_id):
+        if rest_available[0]:
+            try:
+                work_item = await asyncio.to_thread(cache.get_work_item, work_item_id, client, log, fields)
+            except AdoError as e:
+                rest_available[0] = False
+                if log:
+                    log(f"REST export unavailable ({str(e)}) - falling back to Azure CLI", "WARNING")
+            else:
+                if not work_item:
+                    raise RuntimeError(f"Work item {work_item_id} was not found or is not accessible")
+                return work_item
+        # az cannot skip fields the organization does not define, so it always exports everything
+        return await export_with_az_cli(work_item_id, org_url, json_dir)
+
+    return export
+
+
+async def _call(func, *args):
+    """Await coroutine functions directly and run plain functions on a worker thread"""
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+async def run_pipeline(work_item_ids, export, generate, concurrency=DEFAULT_CONCURRENCY,
+                       generate_concurrency=None, on_result=None, log=None, thread_initializer=None):
+    """Export and generate test cases for many work items concurrently
+
+    `export(work_item_id)` returns the work item data and `generate(work_item_id,
+    work_item_data)` returns the generation result (e.g. the output file); either
+    may be a coroutine function or a plain function, which then runs on a worker
+    thread. At most `concurrency` exports and `generate_concurrency` generations
+    (defaults to `concurrency`) run at once. Each item moves to generation as soon
+    as its own export finishes, and `on_result` is called with each item's result
+    as it completes.
+
+    Returns (results, summary) where every result carries per-stage timings.
+    """
+    log = log or (lambda message, level="INFO": None)
+    generate_concurrency = generate_concurrency or concurrency
+    export_semaphore = asyncio.Semaphore(concurrency)
+    generate_semaphore = asyncio.Semaphore(generate_concurrency)
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(
+        max_workers=concurrency + generate_concurrency,
+        initializer=thread_initializer
+    )
+    loop.set_default_executor(executor)
+
+    pipeline_start = time.perf_counter()
+
+    async def process(work_item_id):
+        result = {
+            'work_item_id': work_item_id,
+            'status': 'failed',
+            'stage': 'export',
+            'output': None,
+            'error': None,
+            'timings': {'export_wait': 0.0, 'export': 0.0, 'generate_wait': 0.0, 'generate': 0.0}
+        }
+        timings = result['timings']
+        item_start = time.perf_counter()
+
+        try:
+            queued = time.perf_counter()
+            async with export_semaphore:
+                started = time.perf_counter()
+                timings['export_wait'] = started - queued
+                work_item_data = await _call(export, work_item_id)
+                timings['export'] = time.perf_counter() - started
+
+            result['stage'] = 'generate'
+            queued = time.perf_counter()
+            async with generate_semaphore:
+                started = time.perf_counter()
+                timings['generate_wait'] = started - queued
+                result['output'] = await _call(generate, work_item_id, work_item_data)
+                timings['generate'] = time.perf_counter() - started
+
+            result['status'] = 'succeeded'
+            result['stage'] = 'done'
+            log(f"✓ Work item {work_item_id} done (export {timings['export']:.1f}s, "
+                f"generate {timings['generate']:.1f}s)", "SUCCESS")
+        except Exception as e:
+            result['error'] = str(e)
+            log(f"✗ Work item {work_item_id} failed during {result['stage']}: {str(e)}", "ERROR")
+
+        timings['total'] = time.perf_counter() - item_start
+        if on_result:
+            on_result(result)
+        return result
+
+    log(f"Processing {len(work_item_ids)} work item(s) with up to {concurrency} concurrent export(s) "
+        f"and {generate_concurrency} concurrent generation(s)...")
+
+    try:
+        results = await asyncio.gather(*(process(work_item_id) for work_item_id in work_item_ids))
+    finally:
+        executor.shutdown(wait=False)
+
+    summary = summarize_results(results, time.perf_counter() - pipeline_start)
+    log(f"Pipeline finished: {summary['succeeded']} succeeded, {summary['failed']} failed in "
+        f"{summary['wall_seconds']:.1f}s (serial time would be {summary['serial_seconds']:.1f}s)", "INFO")
+    return results, summary
+
+
+def summarize_results(results, wall_seconds):
+    """Aggregate per-item timings into pipeline totals"""
+    stage_totals = {}
+    for result in results:
+        for stage, seconds in result['timings'].items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+
+    return {
+        'items': len(results),
+        'succeeded': sum(1 for r in results if r['status'] == 'succeeded'),
+        'failed': sum(1 for r in results if r['status'] != 'succeeded'),
+        'wall_seconds': wall_seconds,
+        'serial_seconds': stage_totals.get('export', 0.0) + stage_totals.get('generate', 0.0),
+        'stage_totals': stage_totals
+    }
+
+
+def run_pipeline_sync(work_item_ids, export, generate, **kwargs):
+    """Run the pipeline from synchronous code such as a UI worker thread"""
+    return asyncio.run(run_pipeline(work_item_ids, export, generate, **kwargs))
+
+
+def run_paged_pipeline(id_pages, export, generate, prefetch=None, on_progress=None, log=None, **kwargs):
+    """Run the pipeline over an iterable of work item ID pages, one page at a time
+
+    Only the current page of work items is held in memory and per-item results
+    are not kept, so this scales to large queries. `prefetch(ids)` is called with
+    each page before it is processed (e.g. to export the page in one batched
+    request) and `on_progress(totals)` after every finished item. When prefetch
+    raises AdoError it is not called again and the page's items are left to
+    `export`, which falls back to az (see make_exporter). Remaining keyword
+    arguments are passed to `run_pipeline`.
+
+    Returns the running totals: items, succeeded, failed, failed_ids, pages,
+    wall_seconds and items_per_minute.
+    """
+    log = log or (lambda message, level="INFO": None)
+    start = time.perf_counter()
+    totals = {'items': 0, 'succeeded': 0, 'failed': 0, 'failed_ids': [], 'pages': 0,
+              'wall_seconds': 0.0, 'items_per_minute': 0.0}
+
+    def record(result):
+        totals['items'] += 1
+        if result['status'] == 'succeeded':
+            totals['succeeded'] += 1
+        else:
+            totals['failed'] += 1
+            totals['failed_ids'].append(result['work_item_id'])
+        totals['wall_seconds'] = time.perf_counter() - start
+        totals['items_per_minute'] = totals['items'] / totals['wall_seconds'] * 60 if totals['wall_seconds'] else 0.0
+        if on_progress:
+            on_progress(totals)
+
+    for page in id_pages:
+        totals['pages'] += 1
+        log(f"Page {totals['pages']}: {len(page)} work item(s)")
+        if prefetch:
+            try:
+                prefetch(page)
+            except AdoError as e:
+                prefetch = None
+                log(f"Batched export unavailable ({str(e)}) - exporting work items one by one", "WARNING")
+        run_pipeline_sync(page, export, generate, on_result=record, log=log, **kwargs)
+        log(f"Progress: {totals['items']} work item(s) processed, {totals['failed']} failed, "
+            f"{totals['items_per_minute']:.1f} items/min", "INFO")
+
+    totals['wall_seconds'] = time.perf_counter() - start
+    return totals
@@ -0,0 +1,194 @@
+"""
+HTML to text normalizer for work item fields
+Turns Azure DevOps rich-text fields into clean text, list structure and COS items in one html.parser pass
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from html import escape
+from html.parser import HTMLParser
+
+# Tags that start a new line of text
+BLOCK_TAGS = {
+    'address', 'article', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'footer', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'header', 'hr', 'p', 'pre', 'section', 'table', 'tbody', 'td', 'th', 'thead', 'tr'
+}
+# Tags whose content is never shown
+SKIP_TAGS = {'head', 'script', 'style', 'title'}
+
+# Plain-text criteria: "1. ", "1) ", "- ", "* ", "• " or "[x] " bullets
+_BULLET_RE = re.compile(r'^(?:\d+[\.)]|[-*•]|\[[xX\s]\])\s*(.+)$')
+_COS_KEYWORDS = ['should', 'must', 'shall', 'will', 'can', 'user', 'system', 'given', 'when', 'then', 'verify']
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Fields repeat across exports, prompts and the COS tab, so results are kept per content hash
+MAX_CACHE_ENTRIES = 2048
+
+
+def _collapse(text):
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+class _Normalizer(HTMLParser):
+    """Collects text lines and list items while the HTML is parsed"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.list_items = []
+        self._parts = []
+        self._prefix = ""
+        self._lists = []        # open <ul>/<ol>: {'ordered', 'count'}
+        self._open_items = []   # open <li>: (item, own text parts, list depth)
+        self._skip = 0
+
+    def _own_parts(self):
+        # An item's own text stops where a nested list starts
+        if self._open_items and self._open_items[-1][2] == max(len(self._lists), 1):
+            return self._open_items[-1][1]
+        return None
+
+    def _flush(self):
+        own = self._own_parts()
+        if own is not None:
+            own.append(' ')  # keep words on either side of a block or nested list apart
+        text = _collapse(''.join(self._parts))
+        self._parts = []
+        if text:
+            self.lines.append(self._prefix + text)
+            self._prefix = ""
+
+    def _close_items(self, depth):
+        # <li> end tags are optional in HTML, so items are also closed by the next item or list end
+        while self._open_items and self._open_items[-1][2] >= depth:
+            item, parts, _ = self._open_items.pop()
+            item['text'] = _collapse(''.join(parts))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in ('ul', 'ol'):
+            self._flush()
+            self._lists.append({'ordered': tag == 'ol', 'count': 0})
+        elif tag == 'li':
+            self._flush()
+            self._close_items(max(len(self._lists), 1))
+            depth = max(len(self._lists) - 1, 0)
+            marker = "• "
+            if self._lists:
+                current = self._lists[-1]
+                current['count'] += 1
+                if current['ordered']:
+                    marker = f"{current['count']}. "
+            self._prefix = "  " * depth + marker
+            item = {'text': "", 'depth': depth}
+            self.list_items.append(item)
+            self._open_items.append((item, [], max(len(self._lists), 1)))
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in ('ul', 'ol'):
+            self._flush()
+            self._close_items(max(len(self._lists), 1))
+            if self._lists:
+                self._lists.pop()
+        elif tag == 'li':
+            self._flush()
+            self._close_items(max(len(self._lists), 1))
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self._parts.append(data)
+        own = self._own_parts()
+        if own is not None:
+            own.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        self._close_items(0)
+
+
+def _cos_items(lines, list_items):
+    """Conditions of satisfaction: top-level list items, or bulleted / requirement-like lines"""
+    top_level = [item['text'] for item in list_items if item['depth'] == 0 and item['text']]
+    if top_level:
+        return top_level
+
+    cos = []
+    for line in lines:
+        match = _BULLET_RE.match(line)
+        if match:
+            cos.append(match.group(1).strip())
+        elif len(line) > 20 and any(keyword in line.lower() for keyword in _COS_KEYWORDS):
+            cos.append(line)
+    return cos
+
+
+def _normalize(value):
+    if '<' not in value:
+        # Plain text (e.g. pasted into a non-HTML field): keep its line breaks
+        value = "<br>".join(escape(line, quote=False) for line in value.splitlines())
+    parser = _Normalizer()
+    parser.feed(value)
+    parser.close()
+    lines = tuple(parser.lines)
+    return {
+        'text': "\n".join(lines),
+        'lines': lines,
+        'list_items': tuple((item['text'], item['depth']) for item in parser.list_items),
+        'cos_items': tuple(_cos_items(lines, parser.list_items))
+    }
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_EMPTY = {'text': "", 'lines': (), 'list_items': (), 'cos_items': ()}
+
+
+def normalize_html(value):
+    """Normalize an HTML field value in a single pass
+
+    Returns a dict with text (one line per block, list items prefixed with "• "
+    or "1. " and indented by depth), lines, list_items as (text, depth) and
+    cos_items. Results are memoized by the SHA-1 of the value; treat them as read-only.
+    """
+    if not value:
+        return _EMPTY
+    key = hashlib.sha1(value.encode('utf-8', 'surrogatepass')).digest()
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+
+    result = _normalize(value)
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > MAX_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return result
+
+
+def html_to_text(value):
+    """Plain text of an HTML field, keeping line breaks and list bullets"""
+    return normalize_html(value)['text']
+
+
+def cos_items(value):
+    """Conditions of satisfaction found in an acceptance criteria field"""
+    return list(normalize_html(value)['cos_items'])
+
+
+def clear_cache():
+    """Forget all memoized results"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,198 @@
+"""
+Content-addressed cache for images embedded in work items
+Downloads <img> sources from work item HTML once and stores them by SHA-256 for vision-capable models
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from html import unescape
+
+from ado_client import AdoError
+
+# HTML fields that can contain pasted screenshots
+IMAGE_FIELDS = [
+    "System.Description",
+    "Microsoft.VSTS.Common.AcceptanceCriteria",
+    "Custom.ExpectedResults",
+    "Microsoft.VSTS.TCM.ReproSteps",
+    "Custom.StepstoReproduce",
+    "Custom.DeveloperNotes"
+]
+
+# Image types every supported provider accepts, with the file extension they are stored under
+IMAGE_TYPES = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp"
+}
+
+DEFAULT_MAX_IMAGES = 5
+# Anthropic rejects images over 5 MB
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+
+INDEX_FILE_NAME = "index.json"
+
+_IMG_SRC_RE = re.compile(r'<img\b[^>]*?\bsrc\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+
+
+def extract_image_urls(work_item, fields=IMAGE_FIELDS):
+    """Return the http(s) <img> sources in a work item's HTML fields, in order and without duplicates"""
+    urls = []
+    values = work_item.get('fields', {})
+    for field in fields:
+        for match in _IMG_SRC_RE.finditer(values.get(field) or ''):
+            url = unescape(next(group for group in match.groups() if group is not None)).strip()
+            # data: URIs are already inline and relative paths cannot be resolved
+            if url.lower().startswith(("http://", "https://")) and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def _sniff_type(content):
+    """Detect the image type from the file signature (servers often send octet-stream)"""
+    if content.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if content.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if content[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class ImageBlobCache:
+    """Images stored once per SHA-256 of their content, with an index of source URL -> hash
+
+    Blobs live in `<cache_dir>/<sha256>.<ext>`; the same screenshot pasted into
+    several work items is stored (and sent) once. Attachment URLs in Azure DevOps
+    are immutable, so a URL found in the index is never downloaded again.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass  # A lost index only costs one download per image
+        return {}
+
+    def _save_index(self):
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    def blob_path(self, sha256, mime):
+        """Path of the blob for a content hash"""
+        return os.path.join(self.cache_dir, f"{sha256}.{IMAGE_TYPES[mime]}")
+
+    def lookup(self, url):
+        """Return the cached image for a URL, or None when it has not been downloaded"""
+        with self._lock:
+            entry = self._index.get(url)
+        if entry and os.path.exists(self.blob_path(entry['sha256'], entry['mime'])):
+            return dict(entry, url=url, path=self.blob_path(entry['sha256'], entry['mime']))
+        return None
+
+    def store(self, url, content, mime):
+        """Store downloaded image bytes and index them under their source URL"""
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha256, mime)
+        if not os.path.exists(path):
+            tmp_file = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_file, path)
+
+        entry = {'sha256': sha256, 'mime': mime, 'size': len(content), 'fetched_at': time.time()}
+        with self._lock:
+            self._index[url] = entry
+            self._save_index()
+        return dict(entry, url=url, path=path)
+
+    def fetch(self, url, client):
+        """Return the cached image for a URL, downloading it only the first time"""
+        cached = self.lookup(url)
+        if cached:
+            return cached
+
+        content, content_type = client.download(url, max_bytes=self.max_bytes)
+        mime = _sniff_type(content) or content_type
+        if mime not in IMAGE_TYPES:
+            raise AdoError(f"{url} is not a supported image ({content_type or 'unknown type'})")
+        return self.store(url, content, mime)
+
+
+def get_work_item_images(work_item, cache, client, log=None, max_images=DEFAULT_MAX_IMAGES):
+    """Download (once) the images embedded in a work item and return them from the cache
+
+    Returns a list of dicts with url, sha256, mime, size and path; images that
+    cannot be downloaded are skipped with a warning. Duplicate content found under
+    different URLs is returned once.
+    """
+    log = log or (lambda message, level="INFO": None)
+    urls = extract_image_urls(work_item)
+    if not urls:
+        return []
+
+    images = []
+    seen = set()
+    downloads = 0
+    for url in urls:
+        if len(images) >= max_images:
+            log(f"Work item has {len(urls)} images - only the first {max_images} are used", "WARNING")
+            break
+        image = cache.lookup(url)
+        if image is None:
+            try:
+                image = cache.fetch(url, client)
+            except AdoError as e:
+                log(f"Skipping embedded image: {str(e)}", "WARNING")
+                continue
+            downloads += 1
+        if image['sha256'] not in seen:
+            seen.add(image['sha256'])
+            images.append(image)
+
+    log(f"✓ {len(images)} embedded image(s) ready ({downloads} downloaded, the rest from the cache)", "SUCCESS")
+    return images
+
+
+def encode_image(image):
+    """Return a cached image's content as base64"""
+    with open(image['path'], 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def image_message_parts(images, provider):
+    """Message content parts attaching cached images, in the provider's format"""
+    parts = []
+    for image in images:
+        data = encode_image(image)
+        if provider == "anthropic":
+            parts.append({
+                "type": "image",
+                "source": {"type": "base64", "media_type": image['mime'], "data": data}
+            })
+        else:
+            parts.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{image['mime']};base64,{data}"}
+            })
+    return parts
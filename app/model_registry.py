@@ -0,0 +1,177 @@
+"""
+Model availability probing and registry
+Checks which models a key can use (models.list first, then concurrent probes) and remembers the answer for a TTL
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_providers import complete
+
+# Chat models offered by GitHub Models that the generator works with
+GITHUB_CANDIDATE_MODELS = [
+    "gpt-4o",
+    "gpt-4o-mini",
+    "o1-preview",
+    "o1-mini",
+    "Phi-3.5-MoE-instruct",
+    "Phi-3.5-mini-instruct",
+    "Phi-3-medium-128k-instruct",
+    "Meta-Llama-3.1-405B-Instruct",
+    "Meta-Llama-3.1-70B-Instruct",
+    "Meta-Llama-3.1-8B-Instruct",
+    "Mistral-large",
+    "Mistral-large-2407",
+    "Mistral-large-2411",
+    "Mistral-Nemo",
+    "Mistral-small",
+    "AI21-Jamba-1.5-Large",
+    "AI21-Jamba-1.5-Mini",
+    "Cohere-command-r",
+    "Cohere-command-r-plus"
+]
+
+# Availability changes rarely; a day-old answer is good enough to open the picker with
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_PROBE_CONCURRENCY = 8
+PROBE_TIMEOUT_SECONDS = 5
+
+REGISTRY_FILE_NAME = "model_registry.json"
+
+# Probe outcomes; "unchecked" models were skipped after the provider started rate limiting
+AVAILABLE = "available"
+UNAVAILABLE = "unavailable"
+RATE_LIMITED = "rate_limited"
+ERROR = "error"
+UNCHECKED = "unchecked"
+
+
+def classify_error(error):
+    """Map a failed probe to a status"""
+    message = str(error).lower()
+    if "unknown_model" in message or "unknown model" in message or "model_not_found" in message:
+        return UNAVAILABLE
+    if "rate_limit" in message or "ratelimit" in message or "429" in message or "quota" in message:
+        # The model exists but the key cannot call it right now
+        return RATE_LIMITED
+    return ERROR
+
+
+def list_models(client):
+    """Return the model IDs the endpoint lists, or None when it does not support listing"""
+    try:
+        return {model.id for model in client.models.list()}
+    except Exception:
+        return None
+
+
+def probe_models(client, provider, candidates, concurrency=DEFAULT_PROBE_CONCURRENCY, log=None):
+    """Return model -> status for the candidates
+
+    Models the endpoint lists are taken as available without a request; the
+    rest get a one-token completion each, `concurrency` at a time. Once the
+    provider rate limits a probe, probes not yet started are left unchecked.
+    """
+    log = log or (lambda message, level="INFO": None)
+    results = {}
+
+    listed = list_models(client) if provider != "anthropic" else None
+    if listed:
+        results.update({model: AVAILABLE for model in candidates if model in listed})
+        log(f"Endpoint lists {len(listed)} models - {len(results)} of {len(candidates)} candidates confirmed", "INFO")
+
+    remaining = [model for model in candidates if model not in results]
+    rate_limited = threading.Event()
+
+    def probe(model):
+        if rate_limited.is_set():
+            return model, UNCHECKED
+        try:
+            # No retries: a rate-limited model is reported as such rather than waited for
+            complete(client, provider, model, [{"role": "user", "content": "Hi"}], max_tokens=1,
+                     timeout=PROBE_TIMEOUT_SECONDS, max_retries=0)
+            return model, AVAILABLE
+        except Exception as e:
+            status = classify_error(e)
+            if status == RATE_LIMITED:
+                rate_limited.set()
+            return model, status
+
+    if remaining:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(remaining)))) as executor:
+            results.update(executor.map(probe, remaining))
+        log(f"Probed {len(remaining)} models in {time.perf_counter() - started:.1f}s", "INFO")
+        if rate_limited.is_set():
+            log("Rate limited while probing - some models were not checked", "WARNING")
+
+    # Keep the candidates' order
+    return {model: results[model] for model in candidates}
+
+
+def _key_id(api_key):
+    """Short hash identifying a key in the registry without storing it"""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+class ModelRegistry:
+    """Probe results per (provider, API key), persisted to a JSON file
+
+    Entries older than `ttl_seconds` are still returned (the picker can open
+    with them) but reported as stale so the caller refreshes them. So are
+    entries with unchecked models, so those get probed on the next use.
+    """
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_file = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_file, self.path)
+
+    def get(self, provider, api_key):
+        """Return {'models': {model: status}, 'checked_at': ..., 'stale': bool} or None"""
+        with self._lock:
+            entry = self._entries.get(f"{provider}:{_key_id(api_key)}")
+        if not entry:
+            return None
+        stale = time.time() - entry['checked_at'] > self.ttl_seconds or UNCHECKED in entry['models'].values()
+        return dict(entry, stale=stale)
+
+    def update(self, provider, api_key, models):
+        """Record the probe results for a provider and key
+
+        A model left unchecked keeps the status an earlier probe found for it.
+        """
+        key = f"{provider}:{_key_id(api_key)}"
+        with self._lock:
+            previous = (self._entries.get(key) or {}).get('models', {})
+            models = {model: previous.get(model, status) if status == UNCHECKED else status
+                      for model, status in models.items()}
+            self._entries[key] = {'models': models, 'checked_at': time.time()}
+            try:
+                self._save()
+            except OSError:
+                pass  # Without the file the next start probes again
+
+    def refresh(self, client, provider, api_key, candidates, concurrency=DEFAULT_PROBE_CONCURRENCY, log=None):
+        """Probe the candidates now, store the results and return them"""
+        models = probe_models(client, provider, candidates, concurrency, log)
+        self.update(provider, api_key, models)
+        return self.get(provider, api_key)['models']
@@ -0,0 +1,65 @@
+"""
+Prompt compaction for work item fields
+Drops markup, checklist boilerplate and repeated lines before fields are formatted into the prompt
+"""
+
+import re
+
+from html_text import html_to_text
+from token_budget import estimate_tokens
+
+# Checklist questions answered with a plain no / not applicable say nothing to the model
+BOILERPLATE_PATTERNS = [
+    re.compile(r'^(?:any|is|are|has|have|does|do|was|were)\b.*\?\s*(?:no|n/?a|none)\.?$', re.IGNORECASE),
+    re.compile(r'^(?:none|n/?a)\.?$', re.IGNORECASE)
+]
+
+# Shorter lines ("• Description", "Tab - Comment") legitimately repeat between sections
+MIN_DEDUPE_LENGTH = 40
+
+
+def _is_heading(line):
+    return line.endswith(':') and len(line) < 80
+
+
+def compact_text(value, seen=None):
+    """Compact one field: text only, no boilerplate answers, no lines already in `seen`
+
+    `seen` is a set of normalized lines shared between the fields of one prompt,
+    so text repeated across fields is only sent once; it is updated in place.
+    """
+    seen = set() if seen is None else seen
+    lines = []
+    for line in html_to_text(value).split('\n'):
+        stripped = line.strip()
+        if any(pattern.match(stripped) for pattern in BOILERPLATE_PATTERNS):
+            continue
+        key = stripped.lstrip('•-*0123456789.) ').lower()
+        if len(key) >= MIN_DEDUPE_LENGTH:
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+
+    # Headings whose section was emptied by the rules above
+    compacted = [line for index, line in enumerate(lines)
+                 if not (_is_heading(line.strip()) and (index + 1 == len(lines) or _is_heading(lines[index + 1].strip())))]
+    return "\n".join(compacted)
+
+
+def compact_prompt_fields(values, log=None):
+    """Compact the work item fields a prompt is built from
+
+    `values` maps placeholder name -> raw field value; earlier entries win when
+    lines repeat, so pass acceptance criteria first. Logs the estimated token
+    counts before and after and returns placeholder name -> compacted text.
+    """
+    seen = set()
+    compacted = {name: compact_text(value, seen) for name, value in values.items()}
+
+    if log:
+        before = sum(estimate_tokens(value) for value in values.values())
+        after = sum(estimate_tokens(value) for value in compacted.values())
+        saved = f" (-{(before - after) * 100 // before}%)" if before else ""
+        log(f"Prompt compaction: work item fields {before:,} → {after:,} estimated tokens{saved}", "INFO")
+    return compacted
@@ -0,0 +1,219 @@
+"""
+Rate limiting for AI provider calls
+Token buckets per (provider, model) for requests and tokens per minute, plus retries that honour Retry-After
+"""
+
+import os
+import random
+import re
+import threading
+import time
+
+# Default (requests per minute, tokens per minute) a key can count on; None = not limited.
+# GitHub Models allows 10-15 requests per minute on the free tier, OpenAI and
+# Anthropic figures are their lowest paid tiers. Keys on higher tiers should raise
+# them (RateLimiter.set_limits, the apps' settings or AI_RATE_LIMIT_<PROVIDER>);
+# providers missing here, such as Azure OpenAI deployments, are not limited.
+PROVIDER_RATE_LIMITS = {
+    'github': (10, 40000),
+    'openai': (500, 30000),
+    'anthropic': (50, 40000)
+}
+
+# Environment variables such as AI_RATE_LIMIT_OPENAI="5000,800000" override the defaults
+RATE_LIMIT_ENV_PREFIX = "AI_RATE_LIMIT_"
+
+DEFAULT_MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 60
+# A longer Retry-After means a daily quota is exhausted; waiting would only hang the app
+MAX_RETRY_AFTER_SECONDS = 120
+
+# Status codes worth retrying: rate limited, overloaded (Anthropic 529) and gateway errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+_WAIT_RE = re.compile(r'(?:wait|retry after|try again in)\s+(\d+(?:\.\d+)?)\s*(?:seconds|s\b)', re.IGNORECASE)
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def is_retryable(error):
+    """True for rate limits, overloads and transient server errors"""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRY_STATUS_CODES
+    message = str(error).lower()
+    return "ratelimit" in message or "rate limit" in message or "429" in message
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (Retry-After header or the error text), or None"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass  # An HTTP date; fall back to the message or backoff
+    match = _WAIT_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def parse_rate_limit(text):
+    """Parse "requests per minute,tokens per minute" into a tuple; 0 or an empty value means not limited"""
+    parts = [part.strip() for part in str(text).split(',')]
+    if len(parts) != 2:
+        raise ValueError(f"Expected 'requests per minute,tokens per minute', got {text!r}")
+    limits = tuple(int(part) if part else 0 for part in parts)
+    if any(limit < 0 for limit in limits):
+        raise ValueError(f"Rate limits cannot be negative: {text!r}")
+    return tuple(limit or None for limit in limits)
+
+
+def limits_from_environment(environ=None):
+    """Provider limits set through AI_RATE_LIMIT_<PROVIDER> variables; malformed values are ignored"""
+    limits = {}
+    for name, value in (os.environ if environ is None else environ).items():
+        if name.upper().startswith(RATE_LIMIT_ENV_PREFIX) and len(name) > len(RATE_LIMIT_ENV_PREFIX):
+            try:
+                limits[name[len(RATE_LIMIT_ENV_PREFIX):].lower()] = parse_rate_limit(value)
+            except ValueError:
+                pass
+    return limits
+
+
+class _Bucket:
+    """Requests and tokens that may be spent now, refilled continuously up to one minute's allowance"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.available = [float(limit) if limit else None for limit in self.limits]
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def set_limits(self, requests_per_minute, tokens_per_minute):
+        """Change the allowance, keeping what has been spent (a lower limit caps the balance)"""
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.available = [None if not limit else float(limit) if available is None else min(available, limit)
+                          for limit, available in zip(self.limits, self.available)]
+
+    def reserve(self, tokens, now):
+        """Take one request and `tokens` from the bucket and return how long the caller must wait first"""
+        elapsed = now - self.updated
+        self.updated = now
+        wait = max(self.blocked_until - now, 0.0)
+        for index, (limit, amount) in enumerate(zip(self.limits, (1, tokens))):
+            if not limit:
+                continue
+            rate = limit / 60.0
+            self.available[index] = min(limit, self.available[index] + elapsed * rate)
+            # Reservations may run the balance negative; later callers queue behind them
+            self.available[index] -= min(amount, limit)
+            if self.available[index] < 0:
+                wait = max(wait, -self.available[index] / rate)
+        return wait
+
+
+class RateLimiter:
+    """Schedules calls per (provider, model) so they queue instead of being throttled
+
+    `acquire` blocks until the call fits the provider's request and token
+    budget. A 429 with Retry-After pauses every call for that model, not just
+    the one that was refused. `summary` reports queue depth and wait times.
+
+    Without `limits` the PROVIDER_RATE_LIMITS defaults are used, overridden by
+    AI_RATE_LIMIT_<PROVIDER> environment variables; `set_limits` changes them
+    at run time.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(PROVIDER_RATE_LIMITS, **limits_from_environment()) if limits is None else dict(limits)
+        self.stats = {'calls': 0, 'waits': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+                      'retries': 0, 'queued': 0}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, provider, model):
+        key = (provider, model)
+        if key not in self._buckets:
+            self._buckets[key] = _Bucket(*self.limits.get(provider, (None, None)))
+        return self._buckets[key]
+
+    def limits_for(self, provider):
+        """(requests per minute, tokens per minute) applied to a provider; None = not limited"""
+        with self._lock:
+            return self.limits.get(provider, (None, None))
+
+    def set_limits(self, provider, requests_per_minute=None, tokens_per_minute=None):
+        """Set a provider's limits, e.g. from the settings of a key on a higher tier; None = not limited"""
+        limits = (requests_per_minute or None, tokens_per_minute or None)
+        with self._lock:
+            if self.limits.get(provider, (None, None)) == limits:
+                return
+            self.limits[provider] = limits
+            for (bucket_provider, _), bucket in self._buckets.items():
+                if bucket_provider == provider:
+                    bucket.set_limits(*limits)
+
+    def acquire(self, provider, model, tokens=0):
+        """Wait until a call of about `tokens` tokens may be sent; returns the seconds waited"""
+        with self._lock:
+            wait = self._bucket(provider, model).reserve(tokens, time.monotonic())
+            self.stats['calls'] += 1
+            if wait > 0:
+                self.stats['waits'] += 1
+                self.stats['wait_seconds'] += wait
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], wait)
+                self.stats['queued'] += 1
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self.stats['queued'] -= 1
+        return wait
+
+    def pause(self, provider, model, seconds):
+        """Hold back every call for a model, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            bucket = self._bucket(provider, model)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+
+    def backoff(self, provider, model, error, attempt, max_retries=DEFAULT_MAX_RETRIES):
+        """Return the delay before retrying a failed call, or None when it should not be retried"""
+        if attempt >= max_retries or not is_retryable(error):
+            return None
+        requested = retry_after(error)
+        if requested is not None:
+            if requested > MAX_RETRY_AFTER_SECONDS:
+                return None
+            # Small jitter so the queued calls do not all fire in the same instant
+            delay = requested + random.uniform(0, 1)
+            self.pause(provider, model, delay)
+        else:
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+        with self._lock:
+            self.stats['retries'] += 1
+        return delay
+
+    def summary(self):
+        """Calls, retries, current queue depth and wait times, for display"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['avg_wait_seconds'] = stats['wait_seconds'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+
+_default_limiter = RateLimiter()
+
+
+def get_rate_limiter():
+    """Return the rate limiter shared by every AI call in this process"""
+    return _default_limiter
@@ -0,0 +1,114 @@
+"""
+Related work item context for prompts
+Collects the parent, children and linked items of a work item and summarizes them within a size budget
+"""
+
+import re
+
+from html_text import normalize_html
+
+# Relation reference name -> label used in the prompt, in the order items are included
+RELATION_LABELS = {
+    "System.LinkTypes.Hierarchy-Reverse": "Parent",
+    "System.LinkTypes.Related": "Related",
+    "System.LinkTypes.Dependency-Reverse": "Predecessor",
+    "System.LinkTypes.Dependency-Forward": "Successor",
+    "System.LinkTypes.Duplicate-Forward": "Duplicate",
+    "System.LinkTypes.Duplicate-Reverse": "Duplicate Of",
+    "System.LinkTypes.Hierarchy-Forward": "Child"
+}
+
+# Only what the summary shows, plus the revision fields the cache needs
+SUMMARY_FIELDS = [
+    "System.Id",
+    "System.Rev",
+    "System.ChangedDate",
+    "System.WorkItemType",
+    "System.Title",
+    "System.State",
+    "System.Description",
+    "Microsoft.VSTS.Common.AcceptanceCriteria"
+]
+
+DEFAULT_MAX_RELATED = 10
+# About 1,000 tokens at ~4 characters per token
+DEFAULT_CHAR_BUDGET = 4000
+
+_WORK_ITEM_URL_RE = re.compile(r"/workItems/(\d+)$", re.IGNORECASE)
+
+
+def _plain_text(value):
+    """Field text on a single line"""
+    return " ".join(normalize_html(value)['lines'])
+
+
+def related_ids(work_item, max_items=DEFAULT_MAX_RELATED):
+    """Return [(label, work item ID)] from a work item's relations, parent first"""
+    order = list(RELATION_LABELS)
+    found = []
+    for relation in work_item.get('relations') or []:
+        rel = relation.get('rel')
+        match = _WORK_ITEM_URL_RE.search(relation.get('url', ''))
+        if rel in RELATION_LABELS and match:
+            found.append((order.index(rel), RELATION_LABELS[rel], int(match.group(1))))
+
+    seen = set()
+    result = []
+    for _, label, work_item_id in sorted(found, key=lambda f: f[0]):
+        if work_item_id not in seen and work_item_id != work_item.get('id'):
+            seen.add(work_item_id)
+            result.append((label, work_item_id))
+    return result[:max_items]
+
+
+def summarize_related(related, char_budget=DEFAULT_CHAR_BUDGET):
+    """Summarize [(label, work item)] as one compact block no longer than char_budget"""
+    lines = []
+    remaining = char_budget
+    for index, (label, work_item) in enumerate(related):
+        fields = work_item.get('fields', {})
+        header = (f"- {label} {fields.get('System.WorkItemType', 'Work Item')} {work_item['id']} "
+                  f"[{fields.get('System.State', '?')}]: {_plain_text(fields.get('System.Title'))}")
+        details = " | ".join(part for part in (
+            _plain_text(fields.get('System.Description')),
+            _plain_text(fields.get('Microsoft.VSTS.Common.AcceptanceCriteria'))
+        ) if part)
+
+        # Share what is left evenly between the remaining items (one newline each)
+        items_left = len(related) - index
+        share = (remaining - items_left) // items_left
+        line = header if len(header) <= share else header[:max(share - 3, 0)] + "..."
+        room = share - len(line) - 3
+        if details and room > 40:
+            line += " - " + (details if len(details) <= room else details[:room - 3] + "...")
+
+        if len(line) + 1 > remaining:
+            break
+        lines.append(line)
+        remaining -= len(line) + 1
+    return "\n".join(lines)
+
+
+def build_related_context(work_item, cache, client, log=None, max_items=DEFAULT_MAX_RELATED,
+                          char_budget=DEFAULT_CHAR_BUDGET):
+    """Fetch a work item's related items in one batched call and summarize them for the prompt
+
+    Work items exported with a field projection carry no relations, so they are
+    fetched first in that case. Returns an empty string when there is nothing to add.
+    """
+    log = log or (lambda message, level="INFO": None)
+
+    if 'relations' not in work_item:
+        expanded = client.get_work_items([work_item['id']], fields=None, expand="Relations")
+        work_item = dict(work_item, relations=expanded[0].get('relations', []) if expanded else [])
+
+    links = related_ids(work_item, max_items)
+    if not links:
+        return ""
+
+    items = cache.get_work_items([work_item_id for _, work_item_id in links], client, log, fields=SUMMARY_FIELDS)
+    related = [(label, items[work_item_id]) for label, work_item_id in links if work_item_id in items]
+
+    context = summarize_related(related, char_budget)
+    log(f"Added {len(context.splitlines())} related work item(s) to the prompt ({len(context)} chars)", "INFO")
+    return context
@@ -0,0 +1,124 @@
+"""
+Disk cache for AI responses
+Serves the stored answer when the same prompt is sent to the same model with the same parameters again
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Answers are small; 50 MB holds thousands of generated suites
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+INDEX_FILE_NAME = "index.json"
+
+
+def cache_key(provider, model, messages, system=None, temperature=None, max_tokens=None, response_format=None):
+    """SHA-256 of everything that determines the answer to a chat request"""
+    request = [provider, model, system, messages, temperature, max_tokens]
+    if response_format is not None:
+        # Appended only when set so keys of plain requests stay the same
+        request.append(response_format)
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Answers stored as `<cache_dir>/<key>.json`, evicted least recently used first
+
+    The index records each entry's size and last use, so the cache stays below
+    `max_bytes` without scanning the directory. `stats` counts hits, misses and
+    evictions since the cache was opened.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, INDEX_FILE_NAME)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass  # A lost index only costs one request per prompt
+        return {}
+
+    def _save_index(self):
+        tmp_file = f"{self.index_file}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    def entry_path(self, key):
+        """Path of the stored answer for a cache key"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the stored answer for a key, or None on a miss"""
+        with self._lock:
+            if key in self._index:
+                try:
+                    with open(self.entry_path(key), 'r', encoding='utf-8') as f:
+                        text = json.load(f)['text']
+                except (OSError, ValueError, KeyError):
+                    # The file was removed or damaged outside the cache
+                    del self._index[key]
+                else:
+                    self._index[key]['last_used'] = time.time()
+                    self._save_index()
+                    self.stats['hits'] += 1
+                    return text
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, text, model=None):
+        """Store an answer and evict the least recently used ones beyond `max_bytes`"""
+        content = json.dumps({'model': model, 'text': text}, ensure_ascii=False)
+        path = self.entry_path(key)
+        with self._lock:
+            tmp_file = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_file, path)
+            now = time.time()
+            self._index[key] = {'size': len(content.encode('utf-8')), 'model': model,
+                                'created_at': now, 'last_used': now}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        total = sum(entry['size'] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)['size']
+            try:
+                os.remove(self.entry_path(key))
+            except OSError:
+                pass
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        """Remove every stored answer"""
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.remove(self.entry_path(key))
+                except OSError:
+                    pass
+            self._index = {}
+            self._save_index()
+
+    def summary(self):
+        """Entries, bytes on disk and hit/miss counters, for display"""
+        with self._lock:
+            return dict(self.stats, entries=len(self._index),
+                        bytes=sum(entry['size'] for entry in self._index.values()))
@@ -7,12 +7,37 @@ import streamlit as st
 import subprocess
 import json
 import csv
-import sys
+import sqlite3
 import base64
 import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from openai import OpenAI
 import pandas as pd
+from ai_providers import (cacheable_prompt, complete, create_client, stream_complete, supports_json_schema,
+                          supports_vision)
+from ado_client import AdoClient, AdoError, build_wiql_query, export_work_items, parse_work_item_ids
+from az_auth import configure_token_cache, get_token_provider
+from field_projection import template_fields
+from coverage_analysis import analyze_coverage, apply_categorization
+from csv_stream import read_streamed_answer
+from html_text import cos_items, html_to_text, normalize_html
+from prompt_compaction import compact_prompt_fields
+from rate_limit import get_rate_limiter
+from suite_merge import CATEGORY_NAMES, CATEGORY_PREFIXES, merge_suites, tag_cos_references
+from token_budget import (DEFAULT_MAX_OUTPUT_TOKENS, chunk_criteria, estimate_tokens, format_criteria_chunk,
+                          prompt_budget, shard_criteria, truncate_to_tokens)
+from image_cache import IMAGE_FIELDS, ImageBlobCache, get_work_item_images, image_message_parts
+from response_cache import ResponseCache
+from related_items import build_related_context
+from structured_output import STRUCTURED_INSTRUCTIONS, TEST_SUITE_SCHEMA, parse_structured_suite, structured_answer_to_csv
+from suite_diff import diff_suites, format_change_summary
+from suite_patch import PATCH_INSTRUCTIONS, SUITE_PATCH_SCHEMA, apply_patch_answer
+from suite_store import DB_FILE_NAME, SuiteStore
+from work_item_cache import WorkItemCache, DEFAULT_TTL_SECONDS
+from work_item_sync import sync_changed_work_items
+from generation_pipeline import DEFAULT_CONCURRENCY, make_exporter, run_paged_pipeline, run_pipeline_sync
 
 # Page configuration
 st.set_page_config(
@@ -213,12 +238,14 @@ if 'refinement_in_progress' not in st.session_state:
 if 'last_change_summary' not in st.session_state:
     st.session_state.last_change_summary = None
 if 'test_case_coverage' not in st.session_state:
-    st.session_state.test_case_coverage = None  # AI-generated categorization
+    st.session_state.test_case_coverage = None  # Categorization from analyze_test_case_coverage
 
 # Setup directories
 DATA_DIR = Path("data")
 JSON_DIR = DATA_DIR / "json"
 TESTCASES_DIR = DATA_DIR / "testcases"
+IMAGES_DIR = DATA_DIR / "images"
+RESPONSES_DIR = DATA_DIR / "responses"
 APP_DIR = Path("app")
 CONFIG_DIR = Path(".config")
 CONFIG_FILE = CONFIG_DIR / "user_settings.json"
@@ -227,6 +254,9 @@ JSON_DIR.mkdir(parents=True, exist_ok=True)
 TESTCASES_DIR.mkdir(parents=True, exist_ok=True)
 CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
+# Keep the Azure DevOps token across restarts (encrypted; needs the optional cryptography and keyring packages)
+configure_token_cache(str(CONFIG_DIR / "ado_token.cache"))
+
 def log_message(message, level="INFO"):
     """Add message to log"""
     st.session_state.log_messages.append(f"[{level}] {message}")
@@ -262,18 +292,21 @@ def save_api_key(api_key):
         return False
 
 def check_az_login():
-    """Check if Azure CLI is logged in"""
-    try:
-        result = subprocess.run(
-            ["az", "account", "show"],
-            capture_output=True,
-            text=True,
-            timeout=10,
-            shell=True
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
+    """Check if Azure CLI is logged in (uses the cached access token when still valid)"""
+    return get_token_provider().is_logged_in()
+
+def ensure_az_login():
+    """Make sure Azure CLI is logged in, prompting for login if needed"""
+    if not check_az_login():
+        st.warning("⚠️ Azure CLI is not logged in. Opening login window...")
+        
+        with st.spinner("Waiting for Azure CLI login (a browser window will open)..."):
+            if trigger_az_login():
+                get_token_provider().invalidate()
+                st.success("✓ Azure CLI authentication successful!")
+            else:
+                st.error("❌ Azure CLI login failed. Please run 'az login' manually in a terminal and try again.")
+                st.stop()
 
 def trigger_az_login():
     """Trigger Azure CLI login"""
@@ -303,46 +336,152 @@ def trigger_az_login():
 
 def verify_model_access(api_key, provider, model):
     """Verify that the API key has access to the selected model"""
-    try:
-        if provider == "github":
-            client = OpenAI(
-                base_url="https://models.inference.ai.azure.com",
-                api_key=api_key
-            )
-            # Try a minimal completion to verify access
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
-            return True, "Model is accessible"
-        elif provider == "anthropic":
-            try:
-                import anthropic
-                client = anthropic.Anthropic(api_key=api_key)
-                # Test with a minimal message
-                response = client.messages.create(
-                    model=model,
-                    max_tokens=5,
-                    messages=[{"role": "user", "content": "test"}]
-                )
-                return True, "Model is accessible"
-            except ImportError:
-                return False, "Anthropic package not installed"
-        elif provider == "openai":
-            client = OpenAI(api_key=api_key)
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
-            return True, "Model is accessible"
+    if provider not in ("github", "openai", "anthropic"):
         return False, "Unknown provider"
+    try:
+        # Try a minimal completion to verify access
+        ai_complete(api_key, provider, model, [{"role": "user", "content": "test"}], max_tokens=5, use_cache=False)
+        return True, "Model is accessible"
     except Exception as e:
         return False, str(e)
 
-def export_work_item(work_item_id, org_url):
-    """Export work item from Azure DevOps"""
+@st.cache_resource
+def get_ai_client(provider, api_key):
+    """Get the long-lived client for a provider and API key (shared by all sessions, keeps connections open)"""
+    return create_client(provider, api_key, log=log_message)
+
+@st.cache_resource
+def get_response_cache():
+    """Get the disk cache of AI answers (shared by all sessions, survives browser refreshes)"""
+    return ResponseCache(str(RESPONSES_DIR))
+
+def log_token_usage(usage):
+    """Log the tokens of an answered request and how many prompt tokens the provider served from its cache"""
+    if not usage:
+        return
+    message = f"Tokens: {usage['input_tokens']:,} in / {usage['output_tokens']:,} out"
+    if usage['cached_tokens']:
+        message += f" - {usage['cached_tokens']:,} prompt tokens read from the provider's prompt cache"
+    if usage['cache_write_tokens']:
+        message += f" - {usage['cache_write_tokens']:,} prompt tokens written to the prompt cache"
+    log_message(message, "INFO")
+
+def ai_complete(api_key, provider, model, messages, system=None, temperature=None, max_tokens=4000,
+                use_cache=True, refresh_cache=False, response_schema=None, validate=None):
+    """Send a chat request through the pooled client for the provider and return the answer text
+
+    Identical requests are answered from the response cache unless `use_cache`
+    is off; `refresh_cache` asks the model again and replaces the stored answer.
+    Answers `validate` rejects are not cached.
+    """
+    return complete(get_ai_client(provider, api_key), provider, model, messages, system=system,
+                    temperature=temperature, max_tokens=max_tokens,
+                    cache=get_response_cache() if use_cache else None, refresh=refresh_cache,
+                    response_schema=response_schema, on_usage=log_token_usage, validate=validate)
+
+def ai_stream(api_key, provider, model, messages, system=None, temperature=None, max_tokens=4000,
+              use_cache=True, refresh_cache=False):
+    """Like ai_complete, but yield the answer text while it is generated"""
+    return stream_complete(get_ai_client(provider, api_key), provider, model, messages, system=system,
+                           temperature=temperature, max_tokens=max_tokens,
+                           cache=get_response_cache() if use_cache else None, refresh=refresh_cache,
+                           on_usage=log_token_usage)
+
+def get_work_item_cache(ttl_seconds=DEFAULT_TTL_SECONDS):
+    """Get the revision-aware work item cache for this session"""
+    if 'work_item_cache' not in st.session_state:
+        st.session_state.work_item_cache = WorkItemCache(str(JSON_DIR), ttl_seconds=ttl_seconds)
+    st.session_state.work_item_cache.ttl_seconds = ttl_seconds
+    return st.session_state.work_item_cache
+
+@st.cache_resource
+def get_suite_store():
+    """Get the SQLite store of work items, suites and refinements (shared by all sessions)"""
+    store = SuiteStore(str(DATA_DIR / DB_FILE_NAME))
+    store.import_files([str(JSON_DIR), str(APP_DIR / "data" / "json")],
+                       [str(TESTCASES_DIR), str(APP_DIR / "data" / "testcases")])
+    return store
+
+@st.cache_resource
+def get_image_cache():
+    """Get the content-addressed cache of images embedded in work items (shared by all sessions)"""
+    return ImageBlobCache(str(IMAGES_DIR))
+
+def record_suite(work_item_id, csv_content, output_file, kind="generated", provider=None, model=None,
+                 work_item_data=None):
+    """Record a saved suite in the suite store and return its ID (None if the store is unavailable)"""
+    try:
+        store = get_suite_store()
+        work_item_rev = None
+        if work_item_data and str(work_item_data.get('id')) == str(work_item_id):
+            store.save_work_item(work_item_data)
+            work_item_rev = work_item_data.get('rev')
+        return store.save_suite(
+            work_item_id, csv_content, file_path=output_file, kind=kind,
+            provider=provider or st.session_state.get('ai_provider'),
+            model=model or st.session_state.get('model'),
+            work_item_rev=work_item_rev
+        )
+    except sqlite3.Error as e:
+        # The CSV file is already saved; the store only adds history and lookups
+        log_message(f"Could not record suite in the store: {str(e)}", "WARNING")
+        return None
+
+def get_export_fields(project_fields, include_images=False):
+    """Fields to export for the current prompt template, or None to export every field"""
+    if not project_fields:
+        return None
+    fields = template_fields(load_custom_prompt() or DEFAULT_PROMPT_TEMPLATE)
+    if include_images:
+        fields += [field for field in IMAGE_FIELDS if field not in fields]
+    return fields
+
+def export_work_item(work_item_id, org_url, cache_ttl=DEFAULT_TTL_SECONDS, fields=None):
+    """Export work item from Azure DevOps, reusing the cached copy when its revision is unchanged"""
+    cache = get_work_item_cache(cache_ttl)
+    client = AdoClient(org_url)
+    
+    try:
+        log_message(f"Exporting work item {work_item_id}...")
+        work_item_data = cache.get_work_item(work_item_id, client, log=log_message, fields=fields)
+    except AdoError as e:
+        log_message(f"Work item cache unavailable ({str(e)}) - exporting with Azure CLI", "WARNING")
+        work_item_data = export_work_item_with_az_cli(work_item_id, org_url)
+    except Exception as e:
+        log_message(f"Error: {str(e)}", "ERROR")
+        work_item_data = None
+    finally:
+        client.close()
+    
+    if work_item_data:
+        log_message(f"✓ Work item exported successfully", "SUCCESS")
+        log_work_item_fields(work_item_data)
+        try:
+            get_suite_store().save_work_item(work_item_data)
+        except sqlite3.Error as e:
+            log_message(f"Could not record work item in the store: {str(e)}", "WARNING")
+    
+    return work_item_data
+
+def log_work_item_fields(work_item_data):
+    """Log available fields to help diagnose issues"""
+    if 'fields' in work_item_data:
+        fields = work_item_data['fields']
+        log_message(f"Work item has {len(fields)} fields", "INFO")
+        
+        # Check for acceptance criteria variations
+        ac_field = fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', None)
+        if ac_field:
+            log_message(f"Found AcceptanceCriteria field ({len(str(ac_field))} chars)", "INFO")
+        else:
+            log_message("AcceptanceCriteria field is empty or missing", "WARNING")
+            # Log all field names that contain 'accept', 'criteria', 'expect', or 'result'
+            relevant_fields = [k for k in fields.keys() if any(term in k.lower() for term in ['accept', 'criteria', 'expect', 'result'])]
+            if relevant_fields:
+                log_message(f"Related fields found: {', '.join(relevant_fields)}", "INFO")
+
+def export_work_item_with_az_cli(work_item_id, org_url):
+    """Export work item from Azure DevOps with the Azure CLI"""
     output_file = JSON_DIR / f"PBI-{work_item_id}.json"
     
     try:
@@ -353,8 +492,6 @@ def export_work_item(work_item_id, org_url):
             "--output", "json"
         ]
         
-        log_message(f"Exporting work item {work_item_id}...")
-        
         result = subprocess.run(
             cmd,
             capture_output=True,
@@ -370,29 +507,9 @@ def export_work_item(work_item_id, org_url):
         # Save JSON
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(result.stdout)
-            
-        log_message(f"✓ Work item exported successfully", "SUCCESS")
         
         # Parse and return data
-        work_item_data = json.loads(result.stdout)
-        
-        # Debug: Log available fields to help diagnose issues
-        if 'fields' in work_item_data:
-            fields = work_item_data['fields']
-            log_message(f"Work item has {len(fields)} fields", "INFO")
-            
-            # Check for acceptance criteria variations
-            ac_field = fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', None)
-            if ac_field:
-                log_message(f"Found AcceptanceCriteria field ({len(str(ac_field))} chars)", "INFO")
-            else:
-                log_message("AcceptanceCriteria field is empty or missing", "WARNING")
-                # Log all field names that contain 'accept', 'criteria', 'expect', or 'result'
-                relevant_fields = [k for k in fields.keys() if any(term in k.lower() for term in ['accept', 'criteria', 'expect', 'result'])]
-                if relevant_fields:
-                    log_message(f"Related fields found: {', '.join(relevant_fields)}", "INFO")
-        
-        return work_item_data
+        return json.loads(result.stdout)
         
     except subprocess.TimeoutExpired:
         log_message("Command timed out", "ERROR")
@@ -404,108 +521,56 @@ def export_work_item(work_item_id, org_url):
         log_message(f"Error: {str(e)}", "ERROR")
         return None
 
+def export_work_items_bulk(work_item_ids, org_url, cache_ttl=DEFAULT_TTL_SECONDS, fields=None):
+    """Export many work items through the Azure DevOps batch API"""
+    client = AdoClient(org_url)
+    try:
+        exported = export_work_items(client, work_item_ids, JSON_DIR, log=log_message, fields=fields,
+                                     cache=get_work_item_cache(cache_ttl))
+        get_suite_store().save_work_items(exported.values())
+        return exported
+    except AdoError as e:
+        log_message(f"Bulk export failed: {str(e)}", "ERROR")
+        return None
+    except Exception as e:
+        log_message(f"Error: {str(e)}", "ERROR")
+        return None
+    finally:
+        client.close()
+
+def sync_work_items(org_url, project, area_path, cache_ttl, fields=None):
+    """Sync the work items changed since the last sync into the local mirror"""
+    client = AdoClient(org_url)
+    try:
+        return sync_changed_work_items(
+            client, get_work_item_cache(cache_ttl), get_suite_store(), project, area_path or None,
+            fields=fields, log=log_message
+        )
+    except AdoError as e:
+        log_message(f"Sync failed: {str(e)}", "ERROR")
+        return None
+    finally:
+        client.close()
+
 def encode_image_to_base64(uploaded_file):
     """Encode uploaded image to base64"""
     return base64.b64encode(uploaded_file.read()).decode('utf-8')
 
-def generate_change_summary(old_csv, new_csv, api_key, provider, model):
-    """Generate a summary of changes between old and new test cases"""
+def generate_change_summary(old_csv, new_csv):
+    """Summarize the changes between old and new test cases (local diff, see suite_diff)"""
     try:
-        log_message("Generating change summary...")
-        
-        # Parse CSVs to count test cases
-        import csv
-        import io
-        
-        old_reader = csv.reader(io.StringIO(old_csv))
-        old_rows = list(old_reader)
-        old_test_cases = [row for row in old_rows if row and row[0] == "Test Case"]
-        
-        new_reader = csv.reader(io.StringIO(new_csv))
-        new_rows = list(new_reader)
-        new_test_cases = [row for row in new_rows if row and row[0] == "Test Case"]
-        
-        # Extract test case titles for comparison
-        old_titles = set([tc[1] if len(tc) > 1 else "" for tc in old_test_cases])
-        new_titles = set([tc[1] if len(tc) > 1 else "" for tc in new_test_cases])
-        
-        added_titles = new_titles - old_titles
-        removed_titles = old_titles - new_titles
-        kept_titles = old_titles & new_titles
-        
-        system_prompt = "You are a QA analyst that concisely summarizes changes in test cases. Be specific about what was added, modified, or removed."
-        
-        user_prompt = f"""Analyze these test case changes and provide a clear, concise summary.
-
-STATISTICS:
-- Original: {len(old_test_cases)} test cases
-- Refined: {len(new_test_cases)} test cases
-- Added: {len(added_titles)} new test cases
-- Removed: {len(removed_titles)} test cases
-- Kept/Modified: {len(kept_titles)} test cases
-
-NEW TEST CASES ADDED:
-{chr(10).join(['- ' + title for title in list(added_titles)[:10]]) if added_titles else "None"}
-
-REMOVED TEST CASES:
-{chr(10).join(['- ' + title for title in list(removed_titles)[:10]]) if removed_titles else "None"}
-
-ORIGINAL CSV SAMPLE:
-{old_csv[:2000]}
-
-REFINED CSV SAMPLE:
-{new_csv[:2000]}
-
-Provide a brief summary (3-5 bullet points) highlighting:
-- What new test cases were added and why they're valuable
-- What test cases were removed or modified
-- Key improvements in test coverage or quality
-- Any patterns in the changes (e.g., added negative tests, improved steps, etc.)
-
-Keep it concise, user-friendly, and focus on the most important changes."""
-        
-        # Use simple completion for summary
-        if provider == "anthropic":
-            import anthropic
-            client = anthropic.Anthropic(api_key=api_key)
-            
-            response = client.messages.create(
-                model=model,
-                max_tokens=500,
-                temperature=0.3,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
-            )
-            
-            summary = response.content[0].text.strip()
-        else:
-            if provider == "github":
-                client = OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-            else:
-                client = OpenAI(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            summary = response.choices[0].message.content.strip()
-        
-        return summary
+        diff = diff_suites(old_csv, new_csv)
+        log_message(f"✓ Changes: {len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['modified'])} modified", "INFO")
+        return format_change_summary(diff)
     except Exception as e:
         log_message(f"Could not generate change summary: {str(e)}", "WARNING")
         return "Changes applied successfully. Review the updated test cases in the Preview tab."
 
-def categorize_test_cases_with_ai(csv_content, work_item_data, api_key, provider, model):
-    """Ask AI to categorize which test cases directly address COS/Expected Results vs additional considerations"""
+def categorize_test_cases_with_ai(csv_content, work_item_data, api_key, provider, model, titles=None):
+    """Ask AI to categorize which test cases directly address COS/Expected Results vs additional considerations
+
+    With `titles` only those test cases are categorized (the rest of the suite is context).
+    """
     try:
         log_message("Analyzing test case coverage with AI...")
         
@@ -531,7 +596,7 @@ GENERATED TEST CASES (CSV):
 For each test case in the CSV, determine:
 1. Does it DIRECTLY test one of the {criteria_label}? 
 2. Or is it an ADDITIONAL consideration (edge cases, negative tests, extra validation, etc.)?
-
+{"Only categorize these test cases:" + chr(10) + chr(10).join('- ' + title for title in titles) + chr(10) if titles else ""}
 Return a JSON object with this structure:
 {{
   "direct_coverage": [
@@ -553,39 +618,8 @@ IMPORTANT: Be strict - only categorize as "direct_coverage" if it clearly tests
 Return ONLY the JSON object, no other text."""
         
         # Use AI to categorize
-        if provider == "anthropic":
-            import anthropic
-            client = anthropic.Anthropic(api_key=api_key)
-            
-            response = client.messages.create(
-                model=model,
-                max_tokens=2000,
-                temperature=0.2,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
-            )
-            
-            result = response.content[0].text.strip()
-        else:
-            if provider == "github":
-                client = OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-            else:
-                client = OpenAI(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.2,
-                max_tokens=2000
-            )
-            
-            result = response.choices[0].message.content.strip()
+        result = ai_complete(api_key, provider, model, [{"role": "user", "content": user_prompt}],
+                             system=system_prompt, temperature=0.2, max_tokens=2000)
         
         # Clean JSON response
         if result.startswith("```json"):
@@ -605,47 +639,59 @@ Return ONLY the JSON object, no other text."""
         log_message(f"Could not analyze coverage with AI: {str(e)}", "WARNING")
         return None
 
-def generate_with_refinement(current_csv, refinement_prompt, api_key, provider, model, screenshots=None):
-    """Generate refined test cases based on current CSV and additional instructions"""
+def analyze_test_case_coverage(csv_content, work_item_data, api_key, provider, model):
+    """Categorize test cases into direct coverage and additional considerations
+
+    The analysis runs locally (see coverage_analysis). With the sidebar's AI
+    fallback option the test cases it could not place confidently are sent
+    to categorize_test_cases_with_ai.
+    """
+    fields = work_item_data.get('fields', {})
+    is_bug = fields.get('System.WorkItemType') == "Bug"
+    criteria = cos_items(fields.get('Microsoft.VSTS.Common.AcceptanceCriteria') or fields.get('Custom.ExpectedResults'))
+    
+    started = time.perf_counter()
+    coverage = analyze_coverage(csv_content, criteria, "Expected Result" if is_bug else "COS")
+    log_message(f"✓ Coverage analysis complete in {(time.perf_counter() - started) * 1000:.0f} ms: "
+                f"{len(coverage['direct_coverage'])} direct, {len(coverage['additional_considerations'])} additional, "
+                f"{len(coverage['ambiguous'])} uncertain", "SUCCESS")
+    
+    if coverage['ambiguous'] and st.session_state.get('coverage_ai_fallback', False):
+        categorization = categorize_test_cases_with_ai(csv_content, work_item_data, api_key, provider, model,
+                                                       titles=coverage['ambiguous'])
+        if categorization:
+            coverage = apply_categorization(coverage, categorization)
+    return coverage
+
+def generate_with_refinement(current_csv, refinement_prompt, api_key, provider, model, screenshots=None, images=None):
+    """Generate refined test cases based on current CSV and additional instructions
+
+    `screenshots` are uploaded files; `images` are cached work item images (see image_cache).
+    """
     try:
         log_message(f"Refining test cases with {model}...")
         
-        # Build refinement prompt
-        system_prompt = "You are a QA expert that refines and improves manual test cases based on feedback. Always maintain the CSV format and structure."
+        # The model answers with edit operations (see suite_patch), so the answer grows with the change, not the suite
+        system_prompt = "You are a QA expert that refines manual test cases based on feedback. Answer with edit operations for the existing suite, never the whole suite."
         
-        user_prompt = f"""CURRENT TEST CASES (CSV format):
+        # Rules and suite first, instructions last: refining the same suite again reuses the cached prefix
+        user_prompt = f"""{PATCH_INSTRUCTIONS}
+
+CURRENT TEST CASES (CSV format):
 {current_csv}
 
 REFINEMENT INSTRUCTIONS:
 {refinement_prompt}
-
-IMPORTANT RULES:
-1. Maintain the exact CSV format with the same header row
-2. Keep all existing test cases unless specifically asked to remove them
-3. Apply the refinement instructions to improve/add/modify test cases
-4. NEVER use commas in text fields - use semicolons instead
-5. Each Test Case is ONE row, each Step is a separate row
-6. Return ONLY the complete CSV - NO explanatory text
 """
         
-        # Handle different providers with vision support for screenshots
-        if provider == "anthropic":
-            try:
-                import anthropic
-            except ImportError:
-                log_message("Installing anthropic package...", "INFO")
-                subprocess.run([sys.executable, "-m", "pip", "install", "anthropic"], check=True)
-                import anthropic
-            
-            client = anthropic.Anthropic(api_key=api_key)
-            
-            # Build message content with screenshots if provided
-            message_content = [{"type": "text", "text": user_prompt}]
-            
-            if screenshots:
-                for screenshot in screenshots:
-                    image_data = encode_image_to_base64(screenshot)
-                    message_content.append({
+        # Screenshots if provided (in the provider's image format), attached after the prompt
+        attachments = []
+        
+        if screenshots:
+            for screenshot in screenshots:
+                image_data = encode_image_to_base64(screenshot)
+                if provider == "anthropic":
+                    attachments.append({
                         "type": "image",
                         "source": {
                             "type": "base64",
@@ -653,63 +699,33 @@ IMPORTANT RULES:
                             "data": image_data
                         }
                     })
-                    log_message(f"✓ Attached screenshot: {screenshot.name}", "INFO")
-            
-            response = client.messages.create(
-                model=model,
-                max_tokens=4000,
-                temperature=0.7,
-                system=system_prompt,
-                messages=[{"role": "user", "content": message_content}]
-            )
-            
-            csv_content = response.content[0].text.strip()
-            
-        else:
-            # OpenAI-compatible APIs (GitHub Models and OpenAI) with vision support
-            if provider == "github":
-                client = OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-            else:  # openai
-                client = OpenAI(api_key=api_key)
-            
-            # Build message content with screenshots if provided
-            message_content = [{"type": "text", "text": user_prompt}]
-            
-            if screenshots:
-                for screenshot in screenshots:
-                    image_data = encode_image_to_base64(screenshot)
-                    message_content.append({
+                else:
+                    attachments.append({
                         "type": "image_url",
                         "image_url": {
                             "url": f"data:{screenshot.type};base64,{image_data}"
                         }
                     })
-                    log_message(f"✓ Attached screenshot: {screenshot.name}", "INFO")
-            
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message_content}
-                ],
-                temperature=0.7,
-                max_tokens=4000
-            )
-            
-            csv_content = response.choices[0].message.content.strip()
+                log_message(f"✓ Attached screenshot: {screenshot.name}", "INFO")
         
-        # Clean up response
-        if csv_content.startswith("```csv"):
-            csv_content = csv_content[6:]
-        if csv_content.startswith("```"):
-            csv_content = csv_content[3:]
-        if csv_content.endswith("```"):
-            csv_content = csv_content[:-3]
+        if images:
+            attachments.extend(image_message_parts(images, provider))
+            log_message(f"✓ Attached {len(images)} embedded image(s) from the work item", "INFO")
         
-        csv_content = csv_content.strip()
+        message_content = cacheable_prompt(user_prompt, "REFINEMENT INSTRUCTIONS:", provider, attachments)
+        
+        # Models without native JSON schema support get the patch format from the prompt only
+        answer = ai_complete(api_key, provider, model, [{"role": "user", "content": message_content}],
+                             system=system_prompt, temperature=0.7, max_tokens=4000,
+                             response_schema=SUITE_PATCH_SCHEMA if supports_json_schema(provider, model) else None)
+        
+        csv_content, applied, skipped = apply_patch_answer(current_csv, answer)
+        if applied is None:
+            log_message("Model returned a whole suite instead of edits - using it as is", "WARNING")
+        else:
+            log_message(f"✓ Applied {applied} edit(s) to the current suite", "INFO")
+        for message in skipped:
+            log_message(f"Skipped edit {message}", "WARNING")
         
         # Sanitize CSV content
         csv_content = sanitize_csv_content(csv_content)
@@ -724,8 +740,239 @@ IMPORTANT RULES:
         # Return error details for display
         return {'error': True, 'message': error_msg}
 
-def generate_with_ai(work_item_data, api_key, provider, model, retry_feedback=None):
-    """Generate test cases using AI"""
+GENERATION_SYSTEM_PROMPT = "You are a QA expert that generates comprehensive manual test cases in CSV format. ALWAYS use commas as delimiters and properly escape any commas within text fields."
+
+# Smallest share of the prompt budget left for acceptance criteria when a work item is split
+MIN_CRITERIA_TOKENS = 500
+# Concurrent requests when generating one COS at a time
+COS_SHARD_CONCURRENCY = 4
+
+def retry_instructions(retry_feedback):
+    """Prompt suffix asking the model to fix the problems of a previous attempt"""
+    if not retry_feedback:
+        return ""
+    return f"\n\n⚠️ PREVIOUS ATTEMPT HAD ERRORS - PLEASE FIX:\n{retry_feedback}\n\nGenerate the CSV again with these issues corrected."
+
+def request_structured_test_cases(messages, api_key, provider, model, on_test_case=None, refresh_cache=False):
+    """Ask for the test cases as JSON and return them as CSV (the prompt already carries STRUCTURED_INSTRUCTIONS)"""
+    if not supports_json_schema(provider, model):
+        log_message(f"{model} has no native JSON schema support - the schema is only described in the prompt", "INFO")
+    answer = ai_complete(api_key, provider, model, messages, system=GENERATION_SYSTEM_PROMPT, temperature=0.7,
+                         max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, refresh_cache=refresh_cache,
+                         response_schema=TEST_SUITE_SCHEMA, validate=parse_structured_suite)
+    csv_content, test_cases = structured_answer_to_csv(answer)
+    log_message(f"✓ Structured answer converted to CSV ({test_cases} test cases)", "SUCCESS")
+    if on_test_case:
+        # Fill the live preview in one go; JSON answers are not streamed
+        read_streamed_answer([csv_content], on_test_case)
+    return csv_content
+
+def request_test_cases(prompt, api_key, provider, model, images=None, on_test_case=None, refresh_cache=False):
+    """Send one generation prompt to the provider and return the CSV text of the answer
+
+    With `on_test_case` the answer is streamed and the callback gets each test
+    case (see csv_stream) as soon as its rows are complete. `refresh_cache`
+    bypasses a cached answer (used when regenerating a rejected suite).
+    With the sidebar's structured output option the model answers in JSON
+    (see structured_output), which is converted to CSV here.
+    """
+    structured = st.session_state.get('structured_output', False)
+    if structured:
+        # The JSON shape rides on the prompt too, for models without native structured output
+        prompt += STRUCTURED_INSTRUCTIONS
+    
+    # Mark the static prompt prefix for the provider's prompt cache; embedded images go last
+    image_parts = None
+    if images and supports_vision(model):
+        image_parts = image_message_parts(images, provider)
+        log_message(f"✓ Attached {len(images)} embedded image(s) from the work item", "INFO")
+    user_content = cacheable_prompt(prompt, PROMPT_CACHE_SPLIT, provider, image_parts)
+    
+    messages = [{"role": "user", "content": user_content}]
+    cache_hits = get_response_cache().stats['hits']
+    if structured:
+        csv_content = request_structured_test_cases(messages, api_key, provider, model, on_test_case, refresh_cache)
+    elif on_test_case:
+        started = time.perf_counter()
+        first_seen = []
+        
+        def report(test_case):
+            if not first_seen:
+                first_seen.append(time.perf_counter() - started)
+                log_message(f"First test case streamed in after {first_seen[0]:.1f}s", "INFO")
+            on_test_case(test_case)
+        
+        csv_content = read_streamed_answer(
+            ai_stream(api_key, provider, model, messages, system=GENERATION_SYSTEM_PROMPT,
+                      temperature=0.7, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, refresh_cache=refresh_cache),
+            report
+        )
+    else:
+        csv_content = ai_complete(api_key, provider, model, messages, system=GENERATION_SYSTEM_PROMPT,
+                                  temperature=0.7, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, refresh_cache=refresh_cache)
+    if get_response_cache().stats['hits'] > cache_hits:
+        log_message("✓ Same prompt answered before - using the cached response (no API call)", "SUCCESS")
+    
+    # Clean up response
+    if csv_content.startswith("```csv"):
+        csv_content = csv_content[6:]
+    if csv_content.startswith("```"):
+        csv_content = csv_content[3:]
+    if csv_content.endswith("```"):
+        csv_content = csv_content[:-3]
+    
+    return csv_content.strip()
+
+def generate_in_chunks(work_item_data, template_content, api_key, provider, model, budget,
+                       related_context="", images=None, retry_feedback=None, on_test_case=None, refresh_cache=False):
+    """Generate an oversized work item one chunk of acceptance criteria at a time and merge the suites"""
+    fields = dict(work_item_data.get('fields', {}))
+    criteria = cos_items(fields.get('Microsoft.VSTS.Common.AcceptanceCriteria'))
+    
+    # Size of everything except the criteria
+    fields['Microsoft.VSTS.Common.AcceptanceCriteria'] = ""
+    base_prompt = build_prompt(dict(work_item_data, fields=fields), template_content, related_context)
+    base_tokens = estimate_tokens(GENERATION_SYSTEM_PROMPT + base_prompt + retry_instructions(retry_feedback), model)
+    
+    if base_tokens + MIN_CRITERIA_TOKENS > budget:
+        # The description alone nearly fills the budget - shorten it so the criteria still fit
+        description = html_to_text(fields.get('System.Description'))
+        keep = estimate_tokens(description, model) - (base_tokens + MIN_CRITERIA_TOKENS - budget)
+        fields['System.Description'] = truncate_to_tokens(description, max(keep, 0), model)
+        log_message(f"Description shortened to ~{max(keep, 0):,} tokens to fit the {model} budget", "WARNING")
+        base_tokens = budget - MIN_CRITERIA_TOKENS
+    
+    chunks = chunk_criteria(criteria, budget - base_tokens, model) or [[]]
+    log_message(f"Work item exceeds the {budget:,}-token prompt budget of {model} - generating in {len(chunks)} part(s)", "WARNING")
+    
+    parts = []
+    for part, chunk in enumerate(chunks, 1):
+        if chunk:
+            fields['Microsoft.VSTS.Common.AcceptanceCriteria'] = format_criteria_chunk(chunk, part, len(chunks))
+            log_message(f"Generating part {part}/{len(chunks)} (COS {chunk[0][0]}-{chunk[-1][0]})...")
+        prompt = build_prompt(dict(work_item_data, fields=fields), template_content, related_context)
+        # Images go with the first part only; they would count against every part's budget
+        parts.append(request_test_cases(prompt + retry_instructions(retry_feedback), api_key, provider, model,
+                                        images if part == 1 else None, on_test_case, refresh_cache))
+    
+    merged = merge_suites(parts)
+    log_message(f"✓ Merged {len(parts)} part(s) into one suite", "SUCCESS")
+    return merged
+
+def category_instructions(prefix):
+    """Prompt addition that limits a fan-out request to one test category"""
+    return (f"\n\nTHIS REQUEST: Write ONLY {CATEGORY_NAMES[prefix]} test cases, titled {prefix}-01, {prefix}-02 and so on. "
+            "The other categories are generated separately - do not include them. Start with the header row as usual.")
+
+def generate_fan_out(prompt, api_key, provider, model, images=None, on_test_case=None, refresh_cache=False):
+    """Generate each test category in its own concurrent request and merge the results
+
+    Each category's CSV is validated and repaired on its own, then the parts are
+    merged in category order with per-category numbering and duplicate titles
+    dropped. Wall time is that of the slowest category instead of the sum.
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    
+    # Worker threads need the script context to write to the activity log
+    ctx = get_script_run_ctx()
+    
+    def generate_category(prefix):
+        try:
+            csv_content = request_test_cases(prompt + category_instructions(prefix), api_key, provider, model,
+                                             images, on_test_case, refresh_cache)
+        except Exception as e:
+            log_message(f"{CATEGORY_NAMES[prefix]} tests failed: {str(e)}", "WARNING")
+            return None
+        is_valid, validation_messages, csv_content = validate_and_fix_csv_structure(csv_content)
+        if not is_valid:
+            log_message(f"{CATEGORY_NAMES[prefix]} tests: {'; '.join(validation_messages)}", "WARNING")
+        return csv_content
+    
+    log_message(f"Fan-out: generating {len(CATEGORY_PREFIXES)} test categories in parallel...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(CATEGORY_PREFIXES),
+                            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+        parts = [part for part in executor.map(generate_category, CATEGORY_PREFIXES) if part]
+    if not parts:
+        raise RuntimeError("Every test category failed to generate")
+    
+    merged = merge_suites(parts, drop_duplicates=True)
+    log_message(f"✓ Merged {len(parts)} test categories in {time.perf_counter() - started:.1f}s", "SUCCESS")
+    return merged
+
+def generate_by_cos(work_item_data, template_content, api_key, provider, model, related_context="", images=None,
+                    retry_feedback=None, on_test_case=None, refresh_cache=False, cos_per_shard=1):
+    """Generate test cases one COS at a time in concurrent requests and merge them in COS order
+
+    Every test case is tagged with the COS of the request that produced it and a
+    COS that comes back without tests is asked for once more. Returns None when
+    the acceptance criteria have no COS items to shard by.
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    
+    fields = dict(work_item_data.get('fields', {}))
+    criteria = cos_items(fields.get('Microsoft.VSTS.Common.AcceptanceCriteria'))
+    if not criteria or fields.get('System.WorkItemType') == "Bug":
+        log_message("No COS items to shard by - generating in a single request", "INFO")
+        return None
+    
+    shards = shard_criteria(criteria, cos_per_shard)
+    ctx = get_script_run_ctx()
+    
+    def generate_shard(index):
+        shard = shards[index]
+        numbers = [number for number, _ in shard]
+        shard_fields = dict(fields, **{'Microsoft.VSTS.Common.AcceptanceCriteria':
+                                       format_criteria_chunk(shard, index + 1, len(shards))})
+        prompt = build_prompt(dict(work_item_data, fields=shard_fields), template_content, related_context)
+        prompt += retry_instructions(retry_feedback)
+        refresh = refresh_cache
+        for attempt in range(2):
+            try:
+                # Images go with the first shard only, as with chunked generation
+                csv_content = request_test_cases(prompt, api_key, provider, model, images if index == 0 else None,
+                                                 on_test_case, refresh)
+            except Exception as e:
+                log_message(f"COS {numbers[0]}: generation failed: {str(e)}", "WARNING")
+                return None
+            _, _, csv_content = validate_and_fix_csv_structure(csv_content)
+            csv_content, test_cases = tag_cos_references(csv_content, numbers)
+            if test_cases:
+                return csv_content
+            # An empty answer is not worth keeping in the response cache
+            refresh = True
+        log_message(f"COS {numbers[0]}: no test cases returned", "WARNING")
+        return None
+    
+    log_message(f"Sharding by COS: {len(criteria)} COS in {len(shards)} parallel request(s)...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(COS_SHARD_CONCURRENCY, len(shards)),
+                            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+        results = list(executor.map(generate_shard, range(len(shards))))
+    
+    parts = [part for part in results if part]
+    if not parts:
+        raise RuntimeError("No COS shard produced test cases")
+    missing = [number for shard, part in zip(shards, results) if not part for number, _ in shard]
+    if missing:
+        log_message(f"COS without test cases: {', '.join(map(str, missing))}", "WARNING")
+    
+    merged = merge_suites(parts)
+    log_message(f"✓ Merged {len(parts)} COS shard(s) in {time.perf_counter() - started:.1f}s - "
+                f"{len(criteria) - len(missing)}/{len(criteria)} COS covered", "SUCCESS")
+    return merged
+
+def generate_with_ai(work_item_data, api_key, provider, model, retry_feedback=None, related_context="", images=None,
+                     on_test_case=None, refresh_cache=False, fan_out=False, shard_by_cos=False):
+    """Generate test cases using AI
+
+    `images` are cached work item images (see image_cache) attached for vision-capable models.
+    Prompts larger than the model's budget are split by acceptance criteria (see generate_in_chunks).
+    Pass `on_test_case` to stream the answer and receive test cases as they complete.
+    Unchanged work items are answered from the response cache unless `refresh_cache` is set.
+    With `fan_out` each test category is requested concurrently (see generate_fan_out), with
+    `shard_by_cos` each COS (see generate_by_cos).
+    """
     try:
         # Read template
         template_file = APP_DIR / "testcase_template.csv"
@@ -733,70 +980,34 @@ def generate_with_ai(work_item_data, api_key, provider, model, retry_feedback=No
             template_content = f.read()
         
         # Build prompt
-        prompt = build_prompt(work_item_data, template_content)
+        prompt = build_prompt(work_item_data, template_content, related_context)
         
         # If this is a retry, add specific feedback
-        if retry_feedback:
-            prompt += f"\n\n⚠️ PREVIOUS ATTEMPT HAD ERRORS - PLEASE FIX:\n{retry_feedback}\n\nGenerate the CSV again with these issues corrected."
+        prompt += retry_instructions(retry_feedback)
         
         log_message(f"Generating test cases with {model}...")
         
-        # Handle different providers
-        if provider == "anthropic":
-            # Use Anthropic API directly
-            try:
-                import anthropic
-            except ImportError:
-                log_message("Installing anthropic package...", "INFO")
-                import subprocess
-                subprocess.run([sys.executable, "-m", "pip", "install", "anthropic"], check=True)
-                import anthropic
-            
-            client = anthropic.Anthropic(api_key=api_key)
-            
-            response = client.messages.create(
-                model=model,
-                max_tokens=4000,
-                temperature=0.7,
-                system="You are a QA expert that generates comprehensive manual test cases in CSV format. ALWAYS use commas as delimiters and properly escape any commas within text fields.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            csv_content = response.content[0].text.strip()
-            
-        else:
-            # Use OpenAI-compatible API (GitHub Models and OpenAI)
-            if provider == "github":
-                client = OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-            else:  # openai
-                client = OpenAI(api_key=api_key)
-            
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a QA expert that generates comprehensive manual test cases in CSV format. ALWAYS use commas as delimiters and properly escape any commas within text fields."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=4000
-            )
-            
-            csv_content = response.choices[0].message.content.strip()
-        
-        # Clean up response
-        if csv_content.startswith("```csv"):
-            csv_content = csv_content[6:]
-        if csv_content.startswith("```"):
-            csv_content = csv_content[3:]
-        if csv_content.endswith("```"):
-            csv_content = csv_content[:-3]
+        # Check the prompt against the model's budget before anything is sent
+        budget = prompt_budget(provider, model)
+        prompt_tokens = estimate_tokens(GENERATION_SYSTEM_PROMPT + prompt, model)
+        log_message(f"Prompt size: ~{prompt_tokens:,} tokens ({budget:,} available for {model})", "INFO")
+        
+        csv_content = None
+        if shard_by_cos:
+            csv_content = generate_by_cos(work_item_data, template_content, api_key, provider, model, related_context,
+                                          images, retry_feedback, on_test_case, refresh_cache)
+        if csv_content is None:
+            if prompt_tokens > budget:
+                csv_content = generate_in_chunks(work_item_data, template_content, api_key, provider, model, budget,
+                                                 related_context, images, retry_feedback, on_test_case, refresh_cache)
+            elif fan_out:
+                csv_content = generate_fan_out(prompt, api_key, provider, model, images, on_test_case, refresh_cache)
+            else:
+                csv_content = request_test_cases(prompt, api_key, provider, model, images, on_test_case, refresh_cache)
         
-        csv_content = csv_content.strip()
+        if st.session_state.get('structured_output') and work_item_data.get('fields', {}).get('System.WorkItemType') == "Bug":
+            # The CSV built from JSON has the PBI header; bugs use Expected Results as the last column
+            csv_content = csv_content.replace("COS Reference", "Expected Results", 1)
         
         # Validate and auto-fix CSV structure before sanitizing
         is_valid, validation_messages, csv_content = validate_and_fix_csv_structure(csv_content)
@@ -1006,14 +1217,9 @@ def validate_and_fix_csv_structure(csv_content):
         return False, errors, csv_content
 
 # Default prompt template
-DEFAULT_PROMPT_TEMPLATE = """Generate comprehensive manual test cases for this Azure DevOps work item:
-
-WORK ITEM DETAILS:
-Type: {work_item_type}
-Title: {title}
-Description: {description}
-Acceptance Criteria: {acceptance_criteria}
-Repro Steps: {repro_steps}
+# Static instructions come first and the work item last, so providers can cache the
+# prompt prefix between work items (see PROMPT_CACHE_SPLIT)
+DEFAULT_PROMPT_TEMPLATE = """Generate comprehensive manual test cases for the Azure DevOps work item at the end of this prompt.
 
 TEMPLATE FORMAT:
 {template_content}
@@ -1071,8 +1277,21 @@ Start directly with the header row.
   ☑ No improperly escaped quotes
   ☑ Each test case is on its own row, separate from test steps
   ☑ Quotes within quoted text are properly escaped
+
+WORK ITEM DETAILS:
+Type: {work_item_type}
+Title: {title}
+Description: {description}
+Acceptance Criteria: {acceptance_criteria}
+Repro Steps: {repro_steps}
+
+RELATED WORK ITEMS (context only - do not write test cases for them):
+{related_context}
 """
 
+# Everything before this marker is the same for every work item of a type
+PROMPT_CACHE_SPLIT = "WORK ITEM DETAILS:"
+
 def load_custom_prompt():
     """Load custom prompt from config file"""
     try:
@@ -1122,14 +1341,20 @@ def reset_to_default_prompt():
         log_message(f"Could not reset prompt: {str(e)}", "ERROR")
         return False
 
-def build_prompt(work_item_data, template_content):
+def build_prompt(work_item_data, template_content, related_context=""):
     """Build AI prompt"""
     fields = work_item_data.get('fields', {})
     
+    # Rich-text fields are compacted to text; markup and boilerplate only cost tokens
     title = fields.get('System.Title', 'N/A')
-    description = fields.get('System.Description', 'N/A')
-    acceptance_criteria = fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', 'N/A')
-    repro_steps = fields.get('Microsoft.VSTS.TCM.ReproSteps', 'N/A')
+    compacted = compact_prompt_fields({
+        'acceptance_criteria': fields.get('Microsoft.VSTS.Common.AcceptanceCriteria'),
+        'repro_steps': fields.get('Microsoft.VSTS.TCM.ReproSteps'),
+        'description': fields.get('System.Description')
+    }, log=log_message)
+    description = compacted['description'] or 'N/A'
+    acceptance_criteria = compacted['acceptance_criteria'] or 'N/A'
+    repro_steps = compacted['repro_steps'] or 'N/A'
     work_item_type = fields.get('System.WorkItemType', 'Product Backlog Item')
     
     # Determine the last column header based on work item type
@@ -1152,13 +1377,122 @@ def build_prompt(work_item_data, template_content):
         template_content=template_content,
         last_column=last_column,
         last_column_lower=last_column.lower(),
-        last_column_description=last_column_description
+        last_column_description=last_column_description,
+        related_context=related_context or "None"
     )
     
+    # Custom prompts saved before related items existed have no placeholder for them
+    if related_context and "{related_context}" not in prompt_template:
+        prompt += f"\n\nRELATED WORK ITEMS (context only - do not write test cases for them):\n{related_context}"
+    
     return prompt
 
-def save_test_cases(work_item_id, csv_content):
-    """Save test cases to file"""
+def get_related_context(work_item_data, org_url, cache_ttl):
+    """Summarize the parent, children and linked items of a work item for the prompt"""
+    client = AdoClient(org_url)
+    try:
+        return build_related_context(work_item_data, get_work_item_cache(cache_ttl), client, log=log_message)
+    except AdoError as e:
+        log_message(f"Could not load related work items ({str(e)}) - continuing without them", "WARNING")
+        return ""
+    finally:
+        client.close()
+
+def get_embedded_images(work_item_data, org_url):
+    """Images embedded in a work item's HTML fields, downloaded once and then served from the blob cache"""
+    client = AdoClient(org_url)
+    try:
+        return get_work_item_images(work_item_data, get_image_cache(), client, log=log_message)
+    except OSError as e:
+        log_message(f"Could not cache embedded images ({str(e)}) - continuing without them", "WARNING")
+        return []
+    finally:
+        client.close()
+
+def make_live_preview(placeholder):
+    """Return an on_test_case callback that shows streamed test cases in a placeholder"""
+    streamed = []
+    
+    def show(test_case):
+        streamed.append(test_case)
+        header = test_case['header']
+        rows = [(row + [''] * len(header))[:len(header)] for item in streamed for row in item['rows']]
+        with placeholder.container():
+            st.caption(f"⏳ Live preview - {len(streamed)} test case(s) so far")
+            st.dataframe(pd.DataFrame(rows, columns=header), hide_index=True)
+    
+    return show
+
+def generate_test_cases_for_item(work_item_id, work_item_data, api_key, provider, model, related_context=""):
+    """Generate and save test cases for one work item of a multi-item run"""
+    csv_content = generate_with_ai(work_item_data, api_key, provider, model, related_context=related_context)
+    
+    if isinstance(csv_content, dict) and csv_content.get('error'):
+        raise RuntimeError(csv_content.get('message', 'Unknown error'))
+    if isinstance(csv_content, dict):
+        csv_content = csv_content['csv_content']
+    
+    output_file = save_test_cases(work_item_id, csv_content, provider=provider, model=model,
+                                  work_item_data=work_item_data)
+    if not output_file:
+        raise RuntimeError("Could not save test cases")
+    return output_file
+
+def generate_for_work_items(work_item_ids, org_url, cache_ttl, api_key, provider, model, concurrency, fields=None,
+                            include_related=False):
+    """Export and generate test cases for several work items concurrently"""
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    
+    # Worker threads need the script context to write to the activity log
+    ctx = get_script_run_ctx()
+    client = AdoClient(org_url)
+    export = make_exporter(get_work_item_cache(cache_ttl), client, org_url, JSON_DIR, log=log_message, fields=fields)
+    
+    try:
+        return run_pipeline_sync(
+            work_item_ids,
+            export,
+            lambda work_item_id, work_item_data: generate_test_cases_for_item(
+                work_item_id, work_item_data, api_key, provider, model,
+                get_related_context(work_item_data, org_url, cache_ttl) if include_related else ""
+            ),
+            concurrency=concurrency,
+            log=log_message,
+            thread_initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+        )
+    finally:
+        client.close()
+
+def generate_for_query(query, project, org_url, cache_ttl, api_key, provider, model, concurrency,
+                       fields=None, include_related=False, on_progress=None):
+    """Stream the IDs matching a WIQL query page by page and generate test cases for each"""
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    
+    ctx = get_script_run_ctx()
+    client = AdoClient(org_url)
+    cache = get_work_item_cache(cache_ttl)
+    export = make_exporter(cache, client, org_url, JSON_DIR, log=log_message, fields=fields)
+    
+    try:
+        return run_paged_pipeline(
+            client.iter_query_id_pages(query, project or None),
+            export,
+            lambda work_item_id, work_item_data: generate_test_cases_for_item(
+                work_item_id, work_item_data, api_key, provider, model,
+                get_related_context(work_item_data, org_url, cache_ttl) if include_related else ""
+            ),
+            # Export each page in one batched request before its items are generated
+            prefetch=lambda ids: cache.get_work_items(ids, client, log=log_message, fields=fields),
+            on_progress=on_progress,
+            concurrency=concurrency,
+            log=log_message,
+            thread_initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+        )
+    finally:
+        client.close()
+
+def save_test_cases(work_item_id, csv_content, kind="generated", provider=None, model=None, work_item_data=None):
+    """Save test cases to file and record them in the suite store"""
     output_file = TESTCASES_DIR / f"Testcases_PBI_{work_item_id}.csv"
     
     try:
@@ -1166,6 +1500,8 @@ def save_test_cases(work_item_id, csv_content):
             f.write(csv_content)
         
         log_message(f"✓ Test cases saved to {output_file}", "SUCCESS")
+        record_suite(work_item_id, csv_content, output_file, kind, provider, model,
+                     work_item_data or st.session_state.get('work_item_data'))
         return output_file
         
     except Exception as e:
@@ -1206,6 +1542,67 @@ with st.sidebar:
         help="Your Azure DevOps organization URL"
     )
     
+    max_concurrency = st.number_input(
+        "Max Concurrent Work Items",
+        min_value=1,
+        max_value=16,
+        value=DEFAULT_CONCURRENCY,
+        help="When several Work Item IDs are entered, this many are exported and generated at the same time"
+    )
+    
+    cache_ttl = st.number_input(
+        "Work Item Cache TTL (seconds)",
+        min_value=0,
+        value=DEFAULT_TTL_SECONDS,
+        step=60,
+        help="Within this time a previously exported work item is reused without asking Azure DevOps for a newer revision. Use 0 to always check."
+    )
+    
+    project_fields = st.checkbox(
+        "Export only fields used by the prompt",
+        value=True,
+        help="Requests just the fields the prompt template references (plus a few the app needs) instead of every work item field"
+    )
+    
+    include_related = st.checkbox(
+        "Include related work items in the prompt",
+        value=False,
+        help="Adds a short summary of the parent, children and linked work items (fetched in one batched request) to give the AI more context"
+    )
+    
+    include_images = st.checkbox(
+        "Attach images embedded in the work item",
+        value=False,
+        help="Downloads screenshots from the description, acceptance criteria and repro steps once (cached by content hash in data/images) and sends them to vision-capable models"
+    )
+    
+    st.checkbox(
+        "Structured output (JSON)",
+        value=False,
+        key="structured_output",
+        help="Asks the model for test cases as JSON (native JSON schema or tool calling where the provider supports it) and builds the CSV locally, so formatting mistakes no longer need a regeneration"
+    )
+    
+    st.checkbox(
+        "AI check for uncertain coverage",
+        value=False,
+        key="coverage_ai_fallback",
+        help="Coverage is analyzed locally from the COS Reference column and text similarity; with this on, test cases it cannot place confidently are also sent to the model"
+    )
+    
+    generation_mode = st.selectbox(
+        "Generation Mode",
+        options=["single", "category", "cos"],
+        format_func=lambda x: {
+            "single": "One request",
+            "category": "Parallel by test category",
+            "cos": "Parallel by COS"
+        }[x],
+        help="Parallel modes split the suite over several concurrent requests and merge the results: one per test category (Functional, Validation, UI, Negative, Regression) or one per Condition of Satisfaction, which guarantees every COS gets its own tests"
+    )
+    fan_out = generation_mode == "category"
+    shard_by_cos = generation_mode == "cos"
+    
     # AI Settings
     st.subheader("AI Configuration")
     
@@ -1275,6 +1672,26 @@ with st.sidebar:
             key="model_selector"
         )
     
+    # Provider limits default to the lowest tiers (or AI_RATE_LIMIT_<PROVIDER>); keys on higher tiers can raise them
+    default_rpm, default_tpm = get_rate_limiter().limits_for(ai_provider)
+    with st.expander("⏱️ Rate Limits"):
+        requests_per_minute = st.number_input(
+            "Requests per minute (0 = no limit)",
+            min_value=0,
+            value=default_rpm or 0,
+            key=f"rate_limit_rpm_{ai_provider}",
+            help="The most requests per minute your key's tier allows. Calls beyond it wait instead of being throttled."
+        )
+        tokens_per_minute = st.number_input(
+            "Tokens per minute (0 = no limit)",
+            min_value=0,
+            value=default_tpm or 0,
+            step=10000,
+            key=f"rate_limit_tpm_{ai_provider}",
+            help="Each call counts its prompt plus the output allowance against this budget"
+        )
+    get_rate_limiter().set_limits(ai_provider, requests_per_minute, tokens_per_minute)
+    
     # Store in session state for access across tabs
     st.session_state.model = model
     st.session_state.ai_provider = ai_provider
@@ -1290,6 +1707,19 @@ with st.sidebar:
                 else:
                     st.error(f"✗ Connection failed: {message}")
     
+    # Response cache status
+    cache_summary = get_response_cache().summary()
+    st.caption(f"💾 Cached AI answers: {cache_summary['entries']} ({cache_summary['bytes'] / 1024 / 1024:.1f} MB) · "
+               f"{cache_summary['hits']} hits / {cache_summary['misses']} misses")
+    limits = get_rate_limiter().summary()
+    if limits['calls']:
+        st.caption(f"⏱️ Rate limiter: {limits['queued']} waiting now · {limits['waits']} of {limits['calls']} calls queued "
+                   f"(avg {limits['avg_wait_seconds']:.1f}s, max {limits['max_wait_seconds']:.1f}s) · "
+                   f"{limits['retries']} retried")
+    if cache_summary['entries'] and st.button("Clear Cached Answers", width="stretch"):
+        get_response_cache().clear()
+        st.rerun()
+    
     st.divider()
     
     # Prompt Customization Section
@@ -1378,8 +1808,8 @@ col1, col2 = st.columns([1.5, 3.5])
 with col1:
     work_item_id = st.text_input(
         "Work Item ID",
-        help="Enter the PBI or Bug number",
-        placeholder="e.g., 5105699",
+        help="Enter the PBI or Bug number - or several comma-separated numbers to generate them concurrently",
+        placeholder="e.g., 5105699 or 5105699, 5145682",
         label_visibility="collapsed",
         disabled=st.session_state.refinement_in_progress,
         key="work_item_input"
@@ -1393,17 +1823,287 @@ with col2:
         key="generate_button"
     )
 
+with st.expander("📦 Bulk Export (multiple work items)", expanded=False):
+    st.caption("Export a whole sprint at once. IDs are fetched up to 200 per request through the Azure DevOps batch API and saved to data/json.")
+    bulk_ids_text = st.text_area(
+        "Work Item IDs",
+        placeholder="e.g., 5105699, 5145682, 5152532",
+        help="Separate IDs with commas, semicolons, spaces or new lines",
+        disabled=st.session_state.refinement_in_progress,
+        key="bulk_export_input"
+    )
+    bulk_export_btn = st.button(
+        "Export Work Items",
+        disabled=st.session_state.refinement_in_progress,
+        key="bulk_export_button"
+    )
+
+    if bulk_export_btn:
+        try:
+            bulk_ids = parse_work_item_ids(bulk_ids_text)
+        except ValueError as e:
+            bulk_ids = None
+            st.error(f"⚠️ {str(e)}")
+
+        if bulk_ids is not None and not bulk_ids:
+            st.error("⚠️ Please enter at least one Work Item ID")
+        elif bulk_ids:
+            st.session_state.log_messages = []
+            with st.spinner(f"Exporting {len(bulk_ids)} work item(s) from Azure DevOps..."):
+                exported = export_work_items_bulk(bulk_ids, org_url, cache_ttl, get_export_fields(project_fields))
+
+            if exported is None:
+                st.error("❌ Bulk export failed. Check the Activity Log for details.")
+            else:
+                st.success(f"✓ Exported {len(exported)} of {len(bulk_ids)} work item(s) to {JSON_DIR}")
+
+with st.expander("🔎 Bulk Generate from Query (WIQL, area or iteration path)", expanded=False):
+    st.caption("Generate test cases for every work item a query returns. IDs are fetched in pages of 200 and one CSV per work item is written to data/testcases.")
+    query_mode = st.radio(
+        "Select work items by",
+        ["Iteration Path", "Area Path", "WIQL Query"],
+        horizontal=True,
+        disabled=st.session_state.refinement_in_progress,
+        key="query_mode"
+    )
+    if query_mode == "WIQL Query":
+        query_text = st.text_area(
+            "WIQL Query",
+            placeholder="SELECT [System.Id] FROM WorkItems WHERE [System.WorkItemType] = 'Product Backlog Item' AND [System.State] = 'Committed'",
+            disabled=st.session_state.refinement_in_progress,
+            key="query_wiql"
+        )
+        query_project = st.text_input(
+            "Project (only needed when the query uses @project)",
+            disabled=st.session_state.refinement_in_progress,
+            key="query_project"
+        )
+    else:
+        query_text = st.text_input(
+            query_mode,
+            placeholder="e.g., MyProject\\Team A\\Sprint 42" if query_mode == "Iteration Path" else "e.g., MyProject\\Team A",
+            help="Includes all work items under this path",
+            disabled=st.session_state.refinement_in_progress,
+            key="query_path"
+        )
+        query_project = None
+    query_generate_btn = st.button(
+        "Generate for Query Results",
+        disabled=st.session_state.refinement_in_progress,
+        key="query_generate_button"
+    )
+
+    if query_generate_btn:
+        if not query_text.strip():
+            st.error(f"⚠️ Please enter a {query_mode}")
+        elif not api_key:
+            st.error("⚠️ Please enter an API key in the configuration sidebar")
+        else:
+            if query_mode == "WIQL Query":
+                query = query_text.strip()
+            elif query_mode == "Area Path":
+                query = build_wiql_query(area_path=query_text)
+            else:
+                query = build_wiql_query(iteration_path=query_text)
+            
+            ensure_az_login()
+            st.session_state.log_messages = []
+            progress_placeholder = st.empty()
+            
+            def show_progress(totals):
+                progress_placeholder.info(
+                    f"⏳ {totals['items']} work item(s) processed ({totals['succeeded']} succeeded, "
+                    f"{totals['failed']} failed) - {totals['items_per_minute']:.1f} items/min"
+                )
+            
+            try:
+                with st.spinner(f"Generating test cases for the {query_mode.lower()} results..."):
+                    totals = generate_for_query(
+                        query, query_project, org_url, cache_ttl, api_key, ai_provider, model,
+                        max_concurrency, fields=get_export_fields(project_fields),
+                        include_related=include_related, on_progress=show_progress
+                    )
+            except AdoError as e:
+                log_message(f"Query failed: {str(e)}", "ERROR")
+                st.error(f"❌ Query failed: {str(e)}")
+            else:
+                progress_placeholder.empty()
+                if not totals['items']:
+                    st.warning("⚠️ The query returned no work items")
+                elif totals['failed']:
+                    st.warning(f"⚠️ {totals['succeeded']} of {totals['items']} work items generated - failed: "
+                               f"{', '.join(map(str, totals['failed_ids']))}")
+                else:
+                    st.success(f"✓ Test cases generated for all {totals['items']} work items in {TESTCASES_DIR}")
+                
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Work Items", totals['items'])
+                col2.metric("Wall Time", f"{totals['wall_seconds']:.1f}s")
+                col3.metric("Throughput", f"{totals['items_per_minute']:.1f}/min")
+
+with st.expander("🔄 Incremental Sync (changed work items)", expanded=False):
+    st.caption("Fetches only the work items changed since the last sync and flags those whose acceptance criteria changed. The first sync of a project mirrors all of its work items.")
+    col1, col2 = st.columns(2)
+    with col1:
+        sync_project = st.text_input("Project", key="sync_project")
+    with col2:
+        sync_area_path = st.text_input("Area Path (optional)", placeholder="e.g., MyProject\\Team A", key="sync_area_path")
+    sync_btn = st.button(
+        "Sync Changed Work Items",
+        disabled=st.session_state.refinement_in_progress,
+        key="sync_button"
+    )
+    
+    if sync_btn:
+        if not sync_project.strip():
+            st.error("⚠️ Please enter a project")
+        else:
+            ensure_az_login()
+            st.session_state.log_messages = []
+            with st.spinner("Syncing changed work items..."):
+                sync_result = sync_work_items(org_url, sync_project.strip(), sync_area_path.strip(), cache_ttl,
+                                              get_export_fields(project_fields))
+            if sync_result is None:
+                st.error("❌ Sync failed. Check the Activity Log for details.")
+            else:
+                st.success(f"✓ {sync_result['updated']} work item(s) updated, "
+                           f"{len(sync_result['flagged'])} flagged for regeneration")
+    
+    flagged = get_suite_store().flagged_work_items()
+    if flagged:
+        st.warning(f"⚠️ {len(flagged)} work item(s) changed their acceptance criteria since their suite was generated")
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Work Item": item['work_item_id'],
+                    "Title": item['title'],
+                    "Has Suite": "Yes" if item['has_suite'] else "No",
+                    "Reason": item['reason'],
+                    "Flagged": time.strftime('%Y-%m-%d %H:%M', time.localtime(item['flagged_at']))
+                }
+                for item in flagged
+            ]),
+            hide_index=True
+        )
+        regenerate_ids = [item['work_item_id'] for item in flagged if item['has_suite']]
+        if regenerate_ids and st.button(f"Regenerate {len(regenerate_ids)} Flagged Suite(s)", key="regenerate_flagged_button"):
+            if not api_key:
+                st.error("⚠️ Please enter an API key in the configuration sidebar")
+            else:
+                ensure_az_login()
+                st.session_state.log_messages = []
+                with st.spinner(f"Regenerating {len(regenerate_ids)} suite(s)..."):
+                    results, summary = generate_for_work_items(
+                        regenerate_ids, org_url, cache_ttl, api_key, ai_provider, model, max_concurrency,
+                        get_export_fields(project_fields), include_related
+                    )
+                st.success(f"✓ Regenerated {summary['succeeded']} of {summary['items']} suite(s)")
+
+with st.expander("📚 Suite Library (previously generated test suites)", expanded=False):
+    suite_store = get_suite_store()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        library_type = st.selectbox("Work Item Type", ["All", "Product Backlog Item", "Bug"], key="library_type")
+    with col2:
+        library_state = st.text_input("State", placeholder="e.g., Committed", key="library_state")
+    with col3:
+        library_days = st.number_input("Generated in the last N days (0 = all)", min_value=0, value=0, key="library_days")
+    
+    suites = suite_store.list_suites(
+        work_item_type=None if library_type == "All" else library_type,
+        state=library_state.strip() or None,
+        since=time.time() - library_days * 86400 if library_days else None
+    )
+    if suites:
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Work Item": suite['work_item_id'],
+                    "Title": suite['title'],
+                    "Type": suite['work_item_type'],
+                    "State": suite['state'],
+                    "Test Cases": suite['test_case_count'],
+                    "Kind": suite['kind'],
+                    "Model": suite['model'],
+                    "Generated": time.strftime('%Y-%m-%d %H:%M', time.localtime(suite['generated_at']))
+                }
+                for suite in suites
+            ]),
+            hide_index=True
+        )
+        
+        history_id = st.selectbox("Show history for work item", [s['work_item_id'] for s in suites], key="library_history_id")
+        history = suite_store.suite_history(history_id)
+        st.caption(f"{len(history)} version(s) of the suite for {history_id}")
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Version": len(history) - i,
+                    "Kind": version['kind'],
+                    "Test Cases": version['test_case_count'],
+                    "Model": version['model'],
+                    "Generated": time.strftime('%Y-%m-%d %H:%M', time.localtime(version['generated_at']))
+                }
+                for i, version in enumerate(history)
+            ]),
+            hide_index=True
+        )
+    else:
+        st.info("No suites match these filters")
+
 st.divider()
 
 # Handle generation
 if generate_btn:
+    try:
+        requested_ids = parse_work_item_ids(work_item_id)
+    except ValueError:
+        requested_ids = None
+    
     if not work_item_id:
         st.error("⚠️ Please enter a Work Item ID")
-    elif not work_item_id.isdigit():
+    elif not requested_ids:
         st.error("⚠️ Work Item ID must be a number")
     elif not api_key:
         st.error("⚠️ Please enter an API key in the configuration sidebar")
+    elif len(requested_ids) > 1:
+        # Several IDs: export and generate concurrently
+        ensure_az_login()
+        st.session_state.log_messages = []
+        
+        with st.spinner(f"Generating test cases for {len(requested_ids)} work items (up to {max_concurrency} at a time)..."):
+            results, summary = generate_for_work_items(
+                requested_ids, org_url, cache_ttl, api_key, ai_provider, model, max_concurrency,
+                get_export_fields(project_fields), include_related
+            )
+        
+        if summary['failed']:
+            st.warning(f"⚠️ {summary['succeeded']} of {summary['items']} work items generated - {summary['failed']} failed (see Activity Log)")
+        else:
+            st.success(f"✓ Test cases generated for all {summary['items']} work items")
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Work Items", summary['items'])
+        col2.metric("Wall Time", f"{summary['wall_seconds']:.1f}s")
+        col3.metric("Serial Time", f"{summary['serial_seconds']:.1f}s")
+        
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Work Item": r['work_item_id'],
+                    "Status": r['status'],
+                    "Export (s)": round(r['timings']['export'], 2),
+                    "Generate (s)": round(r['timings']['generate'], 2),
+                    "Waiting (s)": round(r['timings']['export_wait'] + r['timings']['generate_wait'], 2),
+                    "Output": r['output'].name if r['output'] else r['error']
+                }
+                for r in results
+            ]),
+            hide_index=True
+        )
     else:
+        work_item_id = str(requested_ids[0])
+        
         # Store settings in session state for potential retries
         st.session_state.api_key = api_key
         st.session_state.ai_provider = ai_provider
@@ -1412,25 +2112,27 @@ if generate_btn:
         st.session_state.retry_count = 0  # Reset retry count for new generation
         
         # Check Azure CLI authentication
-        if not check_az_login():
-            st.warning("⚠️ Azure CLI is not logged in. Opening login window...")
-            
-            with st.spinner("Waiting for Azure CLI login (a browser window will open)..."):
-                if trigger_az_login():
-                    st.success("✓ Azure CLI authentication successful!")
-                else:
-                    st.error("❌ Azure CLI login failed. Please run 'az login' manually in a terminal and try again.")
-                    st.stop()
+        ensure_az_login()
         
         # Proceed with work item export
         # Clear previous logs
         st.session_state.log_messages = []
         
         with st.spinner("Exporting work item from Azure DevOps..."):
-            work_item_data = export_work_item(work_item_id, org_url)
+            work_item_data = export_work_item(work_item_id, org_url, cache_ttl,
+                                              get_export_fields(project_fields, include_images))
         
         if work_item_data:
             st.session_state.work_item_data = work_item_data
+            st.session_state.related_context = (
+                get_related_context(work_item_data, org_url, cache_ttl) if include_related else ""
+            )
+            st.session_state.work_item_images = []
+            if include_images:
+                if supports_vision(model):
+                    st.session_state.work_item_images = get_embedded_images(work_item_data, org_url)
+                else:
+                    log_message(f"{model} cannot read images - embedded images are not attached", "WARNING")
             
             # Store work item details for COS tab
             fields = work_item_data.get('fields', {})
@@ -1462,8 +2164,15 @@ if generate_btn:
             # Display work item info
             st.success(f"✓ Exported: {fields.get('System.Title', 'N/A')}")
             
+            # Test cases appear here while the answer streams in
+            live_preview = st.empty()
+            
             with st.spinner("Generating test cases with AI..."):
-                csv_content = generate_with_ai(work_item_data, api_key, ai_provider, model)
+                csv_content = generate_with_ai(work_item_data, api_key, ai_provider, model,
+                                               related_context=st.session_state.related_context,
+                                               images=st.session_state.work_item_images,
+                                               on_test_case=make_live_preview(live_preview), fan_out=fan_out,
+                                               shard_by_cos=shard_by_cos)
             
             # Check for validation errors and retry with feedback
             if isinstance(csv_content, dict) and csv_content.get('validation_errors'):
@@ -1476,7 +2185,10 @@ if generate_btn:
                 
                 # Retry with specific feedback about what went wrong
                 with st.spinner("Regenerating with corrections..."):
-                    csv_content = generate_with_ai(work_item_data, api_key, ai_provider, model, retry_feedback=error_feedback)
+                    csv_content = generate_with_ai(work_item_data, api_key, ai_provider, model, retry_feedback=error_feedback,
+                                                   related_context=st.session_state.related_context,
+                                                   images=st.session_state.work_item_images, fan_out=fan_out,
+                                                   shard_by_cos=shard_by_cos)
                 
                 # If retry also failed, show clearer message
                 if isinstance(csv_content, dict) and csv_content.get('validation_errors'):
@@ -1532,9 +2244,9 @@ if generate_btn:
                             st.markdown(f"- {warning}")
                         st.info("💡 **You can still view and edit the CSV in the Preview tab.** Use the Save button to fix issues manually, or click 'Generate Test Cases' again to retry with AI.")
                     
-                    # Analyze test case coverage with AI
+                    # Analyze test case coverage
                     with st.spinner("Analyzing test case coverage..."):
-                        coverage = categorize_test_cases_with_ai(
+                        coverage = analyze_test_case_coverage(
                             csv_content,
                             work_item_data,
                             api_key,
@@ -1629,7 +2341,12 @@ with tab1:
                         ai_provider = st.session_state.get('ai_provider', 'github')
                         model = st.session_state.get('model', 'Mistral-large-2411')
                         
-                        csv_content = generate_with_ai(st.session_state.work_item_data, api_key, ai_provider, model)
+                        # The cached answer is the one being rejected - ask the model again
+                        csv_content = generate_with_ai(st.session_state.work_item_data, api_key, ai_provider, model,
+                                                       related_context=st.session_state.get('related_context', ''),
+                                                       images=st.session_state.get('work_item_images'),
+                                                       refresh_cache=True, fan_out=fan_out,
+                                                       shard_by_cos=shard_by_cos)
                         
                         if csv_content:
                             output_file = save_test_cases(work_item_id, csv_content)
@@ -1638,7 +2355,7 @@ with tab1:
                                 st.session_state.current_csv = csv_content
                                 
                                 # Re-analyze coverage
-                                coverage = categorize_test_cases_with_ai(
+                                coverage = analyze_test_case_coverage(
                                     csv_content,
                                     st.session_state.work_item_data,
                                     api_key,
@@ -1706,7 +2423,12 @@ with tab2:
                         ai_provider = st.session_state.get('ai_provider', 'github')
                         model = st.session_state.get('model', 'Mistral-large-2411')
                         
-                        csv_content = generate_with_ai(st.session_state.work_item_data, api_key, ai_provider, model)
+                        # The cached answer is the one being rejected - ask the model again
+                        csv_content = generate_with_ai(st.session_state.work_item_data, api_key, ai_provider, model,
+                                                       related_context=st.session_state.get('related_context', ''),
+                                                       images=st.session_state.get('work_item_images'),
+                                                       refresh_cache=True, fan_out=fan_out,
+                                                       shard_by_cos=shard_by_cos)
                         
                         if csv_content:
                             output_file = save_test_cases(work_item_id, csv_content)
@@ -1741,9 +2463,12 @@ with tab2:
                     st.metric("Test Steps", steps)
                 
                 with col3:
-                    # Use AI-generated coverage data if available
-                    if st.session_state.test_case_coverage:
-                        direct_coverage = len(st.session_state.test_case_coverage.get('direct_coverage', []))
+                    # Use the coverage analysis if available
+                    coverage = st.session_state.test_case_coverage
+                    if coverage and 'covered' in coverage:
+                        st.metric("COS Covered", f"{len(coverage['covered'])} / {len(coverage['covered']) + len(coverage['uncovered'])}")
+                    elif coverage:
+                        direct_coverage = len(coverage.get('direct_coverage', []))
                         st.metric("COS Covered", direct_coverage)
                     else:
                         st.metric("COS Covered", "N/A")
@@ -1849,6 +2574,10 @@ with tab2:
                         # Save the edited data back to CSV
                         edited_df.to_csv(st.session_state.generated_file, index=False)
                         st.session_state.current_csv = edited_df.to_csv(index=False)
+                        record_suite(
+                            st.session_state.generated_file.name.split('_')[-1].replace('.csv', ''),
+                            st.session_state.current_csv, st.session_state.generated_file, kind="edited"
+                        )
                         log_message("✓ Changes saved to CSV", "SUCCESS")
                         st.success("✅ Changes saved successfully!")
                         st.rerun()  # Rerun to clear the "has changes" state
@@ -1890,39 +2619,16 @@ with tab3:
             st.subheader(f"{criteria_header}")
             
             if acceptance_criteria and acceptance_criteria != 'N/A':
-                # Parse COS/Expected Results from HTML
-                import re
-                from html import unescape
-                
-                # First, unescape HTML entities
-                text = unescape(acceptance_criteria)
-                
-                # Replace HTML list items and breaks with newlines BEFORE removing tags
-                text = re.sub(r'<li[^>]*>', '\n• ', text)  # Replace <li> with bullet
-                text = re.sub(r'</li>', '', text)
-                text = re.sub(r'<br\s*/?>', '\n', text)  # Replace <br> with newline
-                text = re.sub(r'</p>\s*<p>', '\n\n', text)  # Replace paragraph breaks
-                text = re.sub(r'<div[^>]*>', '\n', text)  # Replace div starts with newline
-                text = re.sub(r'</div>', '', text)
-                
-                # Now remove remaining HTML tags
-                text = re.sub(r'<[^<]+?>', '', text)
-                
-                # Clean up whitespace but preserve line breaks
-                lines = text.split('\n')
-                cos_list = []
-                for line in lines:
-                    line = line.strip()
-                    if line and len(line) > 3:  # Skip empty or very short lines
-                        cos_list.append(line)
+                # Parse COS/Expected Results from HTML (one line per paragraph or list item)
+                normalized = normalize_html(acceptance_criteria)
+                cos_list = [line for line in normalized['lines'] if len(line.strip()) > 3]
                 
                 if cos_list:
                     for cos in cos_list:
                         st.markdown(cos)
                 else:
                     # Fallback to text area if parsing fails
-                    clean_text = re.sub(r'\s+', ' ', text).strip()
-                    st.text_area("Details", clean_text, height=200, disabled=True)
+                    st.text_area("Details", normalized['text'], height=200, disabled=True)
             else:
                 if work_item_type == "Bug":
                     st.info(f"The 'Acceptance Criteria' field is empty in Azure DevOps. Expected results may be documented in 'Repro Steps' or generated by AI based on the bug description.")
@@ -1933,7 +2639,7 @@ with tab3:
             
             # Show AI-generated coverage analysis
             st.subheader("Test Case Coverage Analysis")
-            st.caption("🤖 Analyzed by AI - categorized based on whether tests directly address the criteria above")
+            st.caption("Categorized by COS Reference and text similarity to the criteria above (uncertain cases optionally checked by AI)")
             
             coverage = st.session_state.test_case_coverage
             
@@ -2036,16 +2742,15 @@ with tab4:
         
         # Check if current model supports vision
         current_model = st.session_state.get('model', 'Mistral-large-2411')
-        vision_models = ['gpt-4-vision', 'gpt-4o', 'gpt-4-turbo', 'claude-3', 'claude-3-opus', 'claude-3-sonnet', 'claude-3-5-sonnet']
-        model_supports_vision = any(vm in current_model.lower() for vm in vision_models)
+        model_supports_vision = supports_vision(current_model)
         
         if model_supports_vision:
             st.markdown("✅ **Vision Supported** - Your selected model can analyze screenshots")
-            st.caption("Vision-capable models: Claude 3.5 Sonnet, Claude 3 Opus, GPT-4 Vision, GPT-4o, GPT-4 Turbo")
+            st.caption("Vision-capable models: Claude 3 and later, GPT-4o, GPT-4.1, GPT-4 Turbo, o1, o3 and o4-mini")
         else:
             st.markdown(f"<div style='color: #d32f2f; font-weight: 500;'>❌ Screenshots Not Supported</div>", unsafe_allow_html=True)
             st.markdown(f"<div style='color: #d32f2f;'>Your current model (<strong>{current_model}</strong>) cannot analyze images. Screenshots will be <strong>ignored</strong> during refinement.</div>", unsafe_allow_html=True)
-            st.caption("To use screenshots, switch to a vision-capable model in the sidebar: Claude 3.5 Sonnet, Claude 3 Opus, GPT-4 Vision, GPT-4o, or GPT-4 Turbo")
+            st.caption("To use screenshots, switch to a vision-capable model in the sidebar: Claude 3 or later, GPT-4o, GPT-4.1 or GPT-4 Turbo")
         
         is_refining = st.session_state.refinement_in_progress
         
@@ -2063,6 +2768,20 @@ with tab4:
                 with cols[idx % 4]:
                     st.image(screenshot, caption=screenshot.name, width="stretch")
         
+        # Images embedded in the work item are already in the blob cache - no need to re-paste them
+        embedded_images = st.session_state.get('work_item_images') or []
+        use_embedded_images = False
+        if embedded_images:
+            use_embedded_images = st.checkbox(
+                f"Attach the {len(embedded_images)} image(s) embedded in the work item",
+                value=True,
+                disabled=(not model_supports_vision) or is_refining
+            )
+            cols = st.columns(min(len(embedded_images), 4))
+            for idx, image in enumerate(embedded_images):
+                with cols[idx % 4]:
+                    st.image(image['path'], caption=image['url'].split('?')[0].split('/')[-1], width="stretch")
+        
         st.divider()
         
         # Refinement button
@@ -2119,7 +2838,8 @@ with tab4:
                 api_key,
                 ai_provider,
                 model,
-                screenshots=uploaded_screenshots
+                screenshots=uploaded_screenshots,
+                images=embedded_images if use_embedded_images and model_supports_vision else None
             )
             
             # Check for errors
@@ -2151,17 +2871,11 @@ with tab4:
                 log_message("✓ Test case refinement successful", "SUCCESS")
                 
                 # Generate change summary
-                change_summary = generate_change_summary(
-                    current_csv,
-                    refined_csv,
-                    api_key,
-                    ai_provider,
-                    model
-                )
+                change_summary = generate_change_summary(current_csv, refined_csv)
                 
                 # Save refined version
                 work_item_id = st.session_state.last_work_item_id or st.session_state.generated_file.name.split('_')[-1].replace('.csv', '')
-                output_file = save_test_cases(work_item_id, refined_csv)
+                output_file = save_test_cases(work_item_id, refined_csv, kind="refined")
                 
                 if output_file:
                     st.session_state.generated_file = output_file
@@ -2173,7 +2887,7 @@ with tab4:
                     # Re-analyze coverage after refinement
                     if st.session_state.work_item_data:
                         log_message("Re-analyzing test case coverage...", "INFO")
-                        coverage = categorize_test_cases_with_ai(
+                        coverage = analyze_test_case_coverage(
                             refined_csv,
                             st.session_state.work_item_data,
                             api_key,
@@ -2184,6 +2898,17 @@ with tab4:
                         log_message("✓ Coverage analysis updated", "SUCCESS")
                     
                     # Track refinement with summary
+                    try:
+                        store = get_suite_store()
+                        latest = store.latest_suite(work_item_id)
+                        store.add_refinement(
+                            work_item_id, refinement_prompt,
+                            suite_id=latest['id'] if latest else None,
+                            summary=change_summary,
+                            screenshots=[s.name for s in uploaded_screenshots] if uploaded_screenshots else None
+                        )
+                    except sqlite3.Error as e:
+                        log_message(f"Could not record refinement in the store: {str(e)}", "WARNING")
                     st.session_state.refinement_history.append({
                         'prompt': refinement_prompt,
                         'screenshots': [s.name for s in uploaded_screenshots] if uploaded_screenshots else None,
@@ -0,0 +1,122 @@
+"""
+Structured (JSON) test case generation
+Asks the model for test cases as JSON matching a schema and converts them to the 6-column CSV locally
+"""
+
+import csv
+import io
+import json
+import re
+
+# Passed to ai_providers.complete(response_schema=...): OpenAI json_schema / Anthropic tool input
+TEST_SUITE_SCHEMA = {
+    'name': "test_suite",
+    'description': "Manual test cases for one work item",
+    'schema': {
+        'type': "object",
+        'properties': {
+            'test_cases': {
+                'type': "array",
+                'items': {
+                    'type': "object",
+                    'properties': {
+                        'title': {'type': "string", 'description': "Prefixed title, e.g. FUNC-01: User can log in"},
+                        'reference': {'type': "string",
+                                      'description': "COS reference (e.g. COS 1) or, for bugs, the expected result"},
+                        'steps': {
+                            'type': "array",
+                            'items': {
+                                'type': "object",
+                                'properties': {
+                                    'action': {'type': "string"},
+                                    'expected': {'type': "string"}
+                                },
+                                'required': ["action", "expected"],
+                                'additionalProperties': False
+                            }
+                        }
+                    },
+                    'required': ["title", "reference", "steps"],
+                    'additionalProperties': False
+                }
+            }
+        },
+        'required': ["test_cases"],
+        'additionalProperties': False
+    }
+}
+
+# Appended to the generation prompt; the CSV rules above it still describe titles and coverage
+STRUCTURED_INSTRUCTIONS = """
+
+OUTPUT OVERRIDE - JSON INSTEAD OF CSV:
+Ignore the CSV formatting, quoting and comma rules above; the CSV is built from your answer.
+Return ONLY a JSON object of this shape (no markdown, no other text):
+{"test_cases": [{"title": "FUNC-01: ...", "reference": "COS 1", "steps": [{"action": "...", "expected": "..."}]}]}
+Commas and quotes inside the text are fine."""
+
+HEADER = ["Work Item Type", "Title", "Test Step", "Step Action", "Step Expected"]
+
+
+def _salvage_test_cases(text):
+    """Complete test case objects from a JSON answer that was cut off (e.g. at max_tokens)"""
+    match = re.search(r'"test_cases"\s*:\s*\[', text)
+    if not match:
+        return []
+    decoder = json.JSONDecoder()
+    test_cases = []
+    index = match.end()
+    while True:
+        while index < len(text) and text[index] in ' \t\r\n,':
+            index += 1
+        try:
+            test_case, index = decoder.raw_decode(text, index)
+        except ValueError:
+            return test_cases
+        if isinstance(test_case, dict):
+            test_cases.append(test_case)
+
+
+def parse_structured_suite(text):
+    """Return the test case dicts of a JSON answer
+
+    Tolerates code fences and text around the object; from an answer that was
+    cut off the complete test cases are kept. Raises ValueError when nothing
+    usable is found.
+    """
+    text = (text or '').strip()
+    start = text.find('{')
+    if start >= 0:
+        try:
+            suite, _ = json.JSONDecoder().raw_decode(text, start)
+            if isinstance(suite, dict) and isinstance(suite.get('test_cases'), list):
+                return suite['test_cases']
+        except ValueError:
+            pass
+    test_cases = _salvage_test_cases(text)
+    if not test_cases:
+        raise ValueError("The answer contains no test cases in the expected JSON shape")
+    return test_cases
+
+
+def suite_to_csv(test_cases, last_column="COS Reference"):
+    """Build the 6-column test case CSV from parsed test case dicts"""
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+    writer.writerow(HEADER + [last_column])
+    for test_case in test_cases:
+        title = str(test_case.get('title') or '').strip()
+        if not title:
+            continue
+        writer.writerow(["Test Case", title, "", "", "", str(test_case.get('reference') or '').strip()])
+        for number, step in enumerate(test_case.get('steps') or [], 1):
+            if isinstance(step, dict):
+                writer.writerow(["", "", number, str(step.get('action') or '').strip(),
+                                 str(step.get('expected') or '').strip(), ""])
+    return output.getvalue().strip()
+
+
+def structured_answer_to_csv(text, last_column="COS Reference"):
+    """Convert a JSON answer to CSV; returns (csv_content, number of test cases)"""
+    test_cases = parse_structured_suite(text)
+    return suite_to_csv(test_cases, last_column), len(test_cases)
@@ -0,0 +1,153 @@
+"""
+Test suite diffing
+Compares two versions of a suite test case by test case and describes what was added, removed or modified
+"""
+
+import difflib
+import re
+
+from suite_merge import CATEGORY_PREFIXES
+from suite_patch import suite_from_csv
+
+# Titles this similar (ignoring the ID) are taken as the same test case renamed
+TITLE_MATCH_RATIO = 0.75
+# Test cases listed by name per section of a summary before the rest are counted
+MAX_LISTED = 10
+
+_ID_RE = re.compile(r'^\s*(' + '|'.join(CATEGORY_PREFIXES) + r')-(\d+)\b\s*[:\-]?\s*', re.IGNORECASE)
+
+
+def _test_id(title):
+    match = _ID_RE.match(title)
+    return f"{match.group(1).upper()}-{int(match.group(2)):02d}" if match else None
+
+
+def _name(title):
+    """Title without its ID, lowercased and with collapsed whitespace"""
+    return ' '.join(_ID_RE.sub('', title).lower().split())
+
+
+def align_test_cases(old_cases, new_cases):
+    """Pair old and new test cases; returns (pairs of indexes, unmatched old indexes, unmatched new indexes)
+
+    Test cases are matched by exact title first, then by title ignoring the
+    ID (renumbered), then by ID (renamed), then by similar title.
+    """
+    old_left = list(range(len(old_cases)))
+    new_left = list(range(len(new_cases)))
+    pairs = []
+
+    def match(key):
+        new_by_key = {}
+        for index in new_left:
+            value = key(new_cases[index]['title'])
+            if value:
+                new_by_key.setdefault(value, index)
+        for old_index in list(old_left):
+            new_index = new_by_key.pop(key(old_cases[old_index]['title']) or None, None)
+            if new_index is not None and new_index in new_left:
+                pairs.append((old_index, new_index))
+                old_left.remove(old_index)
+                new_left.remove(new_index)
+
+    match(lambda title: title.strip())
+    match(_name)
+    match(_test_id)
+
+    # Remaining titles: best similar pair first
+    candidates = []
+    for old_index in old_left:
+        for new_index in new_left:
+            ratio = difflib.SequenceMatcher(None, _name(old_cases[old_index]['title']),
+                                            _name(new_cases[new_index]['title'])).ratio()
+            if ratio >= TITLE_MATCH_RATIO:
+                candidates.append((ratio, old_index, new_index))
+    for _, old_index, new_index in sorted(candidates, reverse=True):
+        if old_index in old_left and new_index in new_left:
+            pairs.append((old_index, new_index))
+            old_left.remove(old_index)
+            new_left.remove(new_index)
+
+    return sorted(pairs, key=lambda pair: pair[1]), old_left, new_left
+
+
+def _step_range(first, last):
+    return f"step {first + 1}" if last - first == 1 else f"steps {first + 1}-{last}"
+
+
+def diff_steps(old_steps, new_steps):
+    """Describe the differences between two step lists, e.g. ["step 2 changed", "steps 4-5 added"]"""
+    old_keys = [(step['action'], step['expected']) for step in old_steps]
+    new_keys = [(step['action'], step['expected']) for step in new_steps]
+    changes = []
+    for tag, old_first, old_last, new_first, new_last in difflib.SequenceMatcher(None, old_keys, new_keys,
+                                                                                    autojunk=False).get_opcodes():
+        if tag == "replace":
+            # One old step rewritten as two is a change plus an addition
+            common = min(old_last - old_first, new_last - new_first)
+            changes.append(f"{_step_range(new_first, new_first + common)} changed")
+            if new_last - new_first > common:
+                changes.append(f"{_step_range(new_first + common, new_last)} added")
+            elif old_last - old_first > common:
+                changes.append(f"{_step_range(old_first + common, old_last)} removed")
+        elif tag == "insert":
+            changes.append(f"{_step_range(new_first, new_last)} added")
+        elif tag == "delete":
+            changes.append(f"{_step_range(old_first, old_last)} removed")
+    return changes
+
+
+def diff_suites(old_csv, new_csv):
+    """Compare two suite CSVs test case by test case
+
+    Returns {'added': [titles], 'removed': [titles], 'modified': [{'title',
+    'old_title', 'changes'}], 'unchanged': count, 'old_count', 'new_count'}.
+    """
+    _, old_cases = suite_from_csv(old_csv)
+    _, new_cases = suite_from_csv(new_csv)
+    pairs, removed, added = align_test_cases(old_cases, new_cases)
+
+    modified = []
+    for old_index, new_index in pairs:
+        old, new = old_cases[old_index], new_cases[new_index]
+        changes = []
+        if old['title'] != new['title']:
+            changes.append(f"renamed from \"{old['title']}\"")
+        if old['reference'] != new['reference']:
+            changes.append(f"reference {old['reference'] or '(none)'} → {new['reference'] or '(none)'}")
+        changes.extend(diff_steps(old['steps'], new['steps']))
+        if changes:
+            modified.append({'title': new['title'], 'old_title': old['title'], 'changes': changes})
+
+    return {
+        'added': [new_cases[index]['title'] for index in sorted(added)],
+        'removed': [old_cases[index]['title'] for index in sorted(removed)],
+        'modified': modified,
+        'unchanged': len(pairs) - len(modified),
+        'old_count': len(old_cases),
+        'new_count': len(new_cases)
+    }
+
+
+def _listed(lines):
+    if len(lines) > MAX_LISTED:
+        lines = lines[:MAX_LISTED] + [f"  - ... and {len(lines) - MAX_LISTED} more"]
+    return lines
+
+
+def format_change_summary(diff):
+    """Markdown bullet list describing a diff_suites result"""
+    lines = [f"- **{diff['old_count']} → {diff['new_count']} test cases:** {len(diff['added'])} added, "
+             f"{len(diff['removed'])} removed, {len(diff['modified'])} modified, {diff['unchanged']} unchanged"]
+    if diff['added']:
+        lines.append(f"- **Added ({len(diff['added'])}):**")
+        lines.extend(_listed([f"  - {title}" for title in diff['added']]))
+    if diff['removed']:
+        lines.append(f"- **Removed ({len(diff['removed'])}):**")
+        lines.extend(_listed([f"  - {title}" for title in diff['removed']]))
+    if diff['modified']:
+        lines.append(f"- **Modified ({len(diff['modified'])}):**")
+        lines.extend(_listed([f"  - {entry['title']}: {'; '.join(entry['changes'])}" for entry in diff['modified']]))
+    if not (diff['added'] or diff['removed'] or diff['modified']):
+        lines.append("- No test case changed")
+    return "\n".join(lines)
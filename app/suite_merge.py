@@ -0,0 +1,134 @@
+"""
+Test suite merging
+Combines test case CSVs generated in parts into one suite with consistent FUNC/VAL/UI/NEG/REG numbering
+"""
+
+import csv
+import io
+import re
+
+# Test case ID prefixes the prompt asks for, in the order suites list them
+CATEGORY_PREFIXES = ['FUNC', 'VAL', 'UI', 'NEG', 'REG']
+
+CATEGORY_NAMES = {
+    'FUNC': "Functional",
+    'VAL': "Validation",
+    'UI': "UI",
+    'NEG': "Negative",
+    'REG': "Regression"
+}
+
+_TEST_ID_RE = re.compile(r'\b(' + '|'.join(CATEGORY_PREFIXES) + r')-(\d+)\b')
+
+
+def _strip_fences(text):
+    """Remove markdown code fences around a model's CSV answer"""
+    text = (text or '').strip()
+    if "```" in text:
+        blocks = text.split("```")
+        # The CSV is the fenced block that contains the header row
+        text = next((block for block in blocks if "Work Item Type" in block), blocks[1] if len(blocks) > 1 else text)
+        if text.startswith("csv"):
+            text = text[3:]
+    return text.strip()
+
+
+def parse_suite(csv_content):
+    """Return (header, rows) of a generated suite, skipping text before the header and non-CSV lines"""
+    rows = list(csv.reader(io.StringIO(_strip_fences(csv_content))))
+    start = next((index for index, row in enumerate(rows) if row and row[0].strip() == "Work Item Type"), None)
+    if start is None:
+        return None, [row for row in rows if row and row[0].strip() in ("Test Case", "")]
+    # Test case rows start with "Test Case" and step rows with an empty first column; anything else is prose
+    return rows[start], [row for row in rows[start + 1:] if row and row[0].strip() in ("Test Case", "")]
+
+
+def tag_cos_references(csv_content, numbers):
+    """Make every test case of a suite generated for some COS numbers reference one of them
+
+    Test cases whose COS Reference is empty or names a COS outside `numbers`
+    get the shard's own references ("COS 3", or "COS 3; COS 4" for a shard of
+    several). Returns (csv_content, number of test cases).
+    """
+    header, rows = parse_suite(csv_content)
+    allowed = {f"COS {number}" for number in numbers}
+    default = "; ".join(f"COS {number}" for number in numbers)
+    test_cases = 0
+    for row in rows:
+        if row[0].strip() != "Test Case":
+            continue
+        test_cases += 1
+        row.extend([''] * (6 - len(row)))
+        referenced = {f"COS {number}" for number in re.findall(r'COS\s*(\d+)', row[5], re.IGNORECASE)}
+        if not referenced or not referenced <= allowed:
+            row[5] = default
+
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+    writer.writerow(header or ["Work Item Type", "Title", "Test Step", "Step Action", "Step Expected", "COS Reference"])
+    writer.writerows(rows)
+    return output.getvalue().strip(), test_cases
+
+
+def _title_key(title):
+    """Test case title without its ID, case and punctuation, for spotting duplicates"""
+    title = _TEST_ID_RE.sub('', title).lower()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', title).split())
+
+
+def _drop_duplicate_test_cases(rows, seen_titles):
+    """Remove test cases (title row and steps) whose title is already in `seen_titles`"""
+    kept = []
+    skipping = False
+    for row in rows:
+        if row[0].strip() == "Test Case":
+            key = _title_key(row[1]) if len(row) > 1 else ''
+            skipping = bool(key) and key in seen_titles
+            seen_titles.add(key)
+        if not skipping:
+            kept.append(row)
+    return kept
+
+
+def merge_suites(csv_parts, drop_duplicates=False):
+    """Merge suites generated for parts of one work item into a single CSV string
+
+    Test case IDs are renumbered per category across the parts (the second
+    part's FUNC-01 follows the first part's last FUNC ID), and references to a
+    part's own IDs inside step text are updated to match. With
+    `drop_duplicates` a test case whose title (ignoring its ID) already came
+    up in an earlier part is left out.
+    """
+    header = None
+    merged = []
+    counters = {prefix: 0 for prefix in CATEGORY_PREFIXES}
+    seen_titles = set()
+
+    for csv_content in csv_parts:
+        part_header, rows = parse_suite(csv_content)
+        header = header or part_header
+        if drop_duplicates:
+            rows = _drop_duplicate_test_cases(rows, seen_titles)
+
+        # First pass: new IDs for this part's test cases, in order of appearance
+        mapping = {}
+        for row in rows:
+            if row[0].strip() == "Test Case" and len(row) > 1:
+                match = _TEST_ID_RE.search(row[1])
+                if match and match.group(0) not in mapping:
+                    prefix = match.group(1)
+                    counters[prefix] += 1
+                    mapping[match.group(0)] = f"{prefix}-{counters[prefix]:02d}"
+
+        # Second pass: rewrite IDs in titles and step text ("as in FUNC-01")
+        def renumber(match):
+            return mapping.get(match.group(0), match.group(0))
+
+        merged.extend([_TEST_ID_RE.sub(renumber, cell) for cell in row] for row in rows)
+
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+    if header:
+        writer.writerow(header)
+    writer.writerows(merged)
+    return output.getvalue().strip()
@@ -0,0 +1,250 @@
+"""
+Patch-based test suite refinement
+Has the model answer a refinement with edit operations and applies them to the parsed suite locally
+"""
+
+import json
+import re
+
+from structured_output import parse_structured_suite, suite_to_csv
+from suite_merge import CATEGORY_PREFIXES, parse_suite
+
+OPERATIONS = ["add_test", "delete_test", "retitle", "set_reference", "replace_steps", "replace_step", "add_step",
+              "delete_step"]
+
+_STEP_SCHEMA = {
+    'type': "object",
+    'properties': {
+        'action': {'type': "string"},
+        'expected': {'type': "string"}
+    },
+    'required': ["action", "expected"],
+    'additionalProperties': False
+}
+
+# Passed to ai_providers.complete(response_schema=...). Strict JSON schema has no optional
+# fields, so every operation carries all of them and leaves the unused ones null.
+SUITE_PATCH_SCHEMA = {
+    'name': "suite_patch",
+    'description': "Edit operations that apply a refinement to an existing test suite",
+    'schema': {
+        'type': "object",
+        'properties': {
+            'operations': {
+                'type': "array",
+                'items': {
+                    'type': "object",
+                    'properties': {
+                        'op': {'type': "string", 'enum': OPERATIONS},
+                        'test': {'type': ["string", "null"],
+                                 'description': "ID (e.g. FUNC-03) or full title of the test case to change"},
+                        'title': {'type': ["string", "null"]},
+                        'reference': {'type': ["string", "null"]},
+                        'step': {'type': ["integer", "null"], 'description': "1-based step number"},
+                        'action': {'type': ["string", "null"]},
+                        'expected': {'type': ["string", "null"]},
+                        'steps': {'type': ["array", "null"], 'items': _STEP_SCHEMA}
+                    },
+                    'required': ["op", "test", "title", "reference", "step", "action", "expected", "steps"],
+                    'additionalProperties': False
+                }
+            }
+        },
+        'required': ["operations"],
+        'additionalProperties': False
+    }
+}
+
+# Placed before the current suite in the refinement prompt
+PATCH_INSTRUCTIONS = """Apply the refinement instructions at the end of this prompt to the current test cases.
+Do NOT return the suite. Return ONLY a JSON object listing the edits (no markdown, no other text):
+{"operations": [{"op": "...", "test": null, "title": null, "reference": null, "step": null, "action": null, "expected": null, "steps": null}]}
+
+OPERATIONS (set the fields each one needs; leave the others null):
+- add_test: title (with a FUNC/VAL/UI/NEG/REG-XX prefix), reference, steps [{"action": "...", "expected": "..."}]
+- delete_test: test
+- retitle: test, title
+- set_reference: test, reference
+- replace_steps: test, steps (all steps of the test case)
+- replace_step: test, step, action, expected
+- add_step: test, step (position; null appends), action, expected
+- delete_step: test, step
+
+RULES:
+1. Identify test cases in "test" by their ID (e.g. FUNC-03) or full title
+2. Step numbers start at 1; operations are applied in order, so later ones see the effect of earlier ones
+3. Keep all existing test cases unless the instructions ask to change or remove them
+4. Only include edits the instructions call for - an unchanged test case needs no operation
+5. Follow the title prefix and COS Reference conventions of the current suite"""
+
+_ID_RE = re.compile(r'^\s*(' + '|'.join(CATEGORY_PREFIXES) + r')-(\d+)\b', re.IGNORECASE)
+
+
+def suite_from_csv(csv_content):
+    """Return (last column name, test case dicts) of a suite CSV, in the shape structured_output uses"""
+    header, rows = parse_suite(csv_content)
+    last_column = header[5] if header and len(header) > 5 and header[5].strip() else "COS Reference"
+    test_cases = []
+    for row in rows:
+        row = row + [''] * (6 - len(row))
+        if row[0].strip() == "Test Case":
+            test_cases.append({'title': row[1].strip(), 'reference': row[5].strip(), 'steps': []})
+        elif test_cases and (row[3].strip() or row[4].strip()):
+            test_cases[-1]['steps'].append({'action': row[3].strip(), 'expected': row[4].strip()})
+    return last_column, test_cases
+
+
+def parse_patch(text):
+    """Return the operation dicts of a patch answer; raises ValueError when there are none"""
+    text = (text or '').strip()
+    start = text.find('{')
+    if start >= 0:
+        try:
+            patch, _ = json.JSONDecoder().raw_decode(text, start)
+            if isinstance(patch, dict) and isinstance(patch.get('operations'), list):
+                return [operation for operation in patch['operations'] if isinstance(operation, dict)]
+        except ValueError:
+            pass
+    raise ValueError("The answer contains no edit operations in the expected JSON shape")
+
+
+def _find(test_cases, test):
+    """Index of the test case an operation names by ID or title, or None"""
+    test = str(test or '').strip()
+    if not test:
+        return None
+    for index, test_case in enumerate(test_cases):
+        if test_case['title'].lower() == test.lower():
+            return index
+    match = _ID_RE.match(test)
+    if match:
+        wanted = (match.group(1).upper(), int(match.group(2)))
+        for index, test_case in enumerate(test_cases):
+            found = _ID_RE.match(test_case['title'])
+            if found and (found.group(1).upper(), int(found.group(2))) == wanted:
+                return index
+    return None
+
+
+def _steps(steps):
+    return [{'action': str(step.get('action') or '').strip(), 'expected': str(step.get('expected') or '').strip()}
+            for step in steps or [] if isinstance(step, dict)]
+
+
+def _used_ids(test_cases):
+    used = set()
+    for test_case in test_cases:
+        match = _ID_RE.match(test_case['title'])
+        if match:
+            used.add((match.group(1).upper(), int(match.group(2))))
+    return used
+
+
+def _add_test(test_cases, operation):
+    """Insert a new test case after the last one of its category, with an ID not used yet"""
+    title = str(operation.get('title') or '').strip()
+    if not title:
+        raise ValueError("add_test needs a title")
+    match = _ID_RE.match(title)
+    prefix = match.group(1).upper() if match else "FUNC"
+    used = _used_ids(test_cases)
+    if not match or (prefix, int(match.group(2))) in used:
+        number = max([n for p, n in used if p == prefix] + [0]) + 1
+        name = title[match.end():].lstrip(' :-') if match else title
+        title = f"{prefix}-{number:02d}: {name}"
+    position = len(test_cases)
+    for index, test_case in enumerate(test_cases):
+        found = _ID_RE.match(test_case['title'])
+        if found and found.group(1).upper() == prefix:
+            position = index + 1
+    test_cases.insert(position, {'title': title, 'reference': str(operation.get('reference') or '').strip(),
+                                 'steps': _steps(operation.get('steps'))})
+
+
+def _apply(test_cases, operation):
+    """Apply one operation in place; raises ValueError when it does not fit the suite"""
+    op = operation.get('op')
+    if op == "add_test":
+        _add_test(test_cases, operation)
+        return
+    if op not in OPERATIONS:
+        raise ValueError(f"unknown operation {op!r}")
+    index = _find(test_cases, operation.get('test'))
+    if index is None:
+        raise ValueError(f"no test case {operation.get('test')!r}")
+    test_case = test_cases[index]
+
+    if op == "delete_test":
+        del test_cases[index]
+    elif op == "retitle":
+        title = str(operation.get('title') or '').strip()
+        if not title:
+            raise ValueError("retitle needs a title")
+        current = _ID_RE.match(test_case['title'])
+        if current and not _ID_RE.match(title):
+            # Keep the test case's ID when only the name was given
+            title = f"{current.group(0).strip()}: {title}"
+        test_case['title'] = title
+    elif op == "set_reference":
+        test_case['reference'] = str(operation.get('reference') or '').strip()
+    elif op == "replace_steps":
+        test_case['steps'] = _steps(operation.get('steps'))
+    else:
+        steps = test_case['steps']
+        step = operation.get('step')
+        new_step = {'action': str(operation.get('action') or '').strip(),
+                    'expected': str(operation.get('expected') or '').strip()}
+        if op == "add_step" and step is None:
+            steps.append(new_step)
+            return
+        if not isinstance(step, int) or not 1 <= step <= len(steps) + (op == "add_step"):
+            raise ValueError(f"{test_case['title']} has no step {step}")
+        if op == "replace_step":
+            steps[step - 1] = new_step
+        elif op == "add_step":
+            steps.insert(step - 1, new_step)
+        else:
+            del steps[step - 1]
+
+
+def _describe(operation):
+    return f"{operation.get('op')} {operation.get('test') or operation.get('title') or ''}".strip()
+
+
+def apply_patch(test_cases, operations):
+    """Apply edit operations to test case dicts in order; returns (test_cases, messages of skipped operations)
+
+    The input list is not modified. An operation that names a missing test
+    case or step is skipped rather than failing the whole refinement.
+    """
+    test_cases = [dict(test_case, steps=list(test_case['steps'])) for test_case in test_cases]
+    skipped = []
+    for operation in operations:
+        try:
+            _apply(test_cases, operation)
+        except ValueError as e:
+            skipped.append(f"{_describe(operation)}: {e}")
+    return test_cases, skipped
+
+
+def apply_patch_answer(current_csv, answer):
+    """Apply a model's patch answer to a suite CSV; returns (csv_content, operations applied, skipped messages)
+
+    Models that ignore the protocol and send the whole suite anyway are
+    accepted: a CSV answer (fenced or not) or a JSON suite is rewritten as a
+    clean CSV, and the number of operations applied is None then. Raises
+    ValueError when the answer holds neither edits nor a suite.
+    """
+    try:
+        operations = parse_patch(answer)
+    except ValueError:
+        if "Work Item Type" in (answer or ''):
+            return suite_to_csv(*reversed(suite_from_csv(answer))), None, []
+        last_column, _ = suite_from_csv(current_csv)
+        try:
+            return suite_to_csv(parse_structured_suite(answer), last_column), None, []
+        except ValueError:
+            raise ValueError("The answer contains no usable edits") from None
+    last_column, test_cases = suite_from_csv(current_csv)
+    test_cases, skipped = apply_patch(test_cases, operations)
+    return suite_to_csv(test_cases, last_column), len(operations) - len(skipped), skipped
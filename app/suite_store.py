@@ -0,0 +1,334 @@
+"""
+SQLite store for work items, generated test suites and refinement history
+One WAL-mode database with indexes on work item ID, type, state and generation time
+"""
+
+import csv
+import glob
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DB_FILE_NAME = "testgen.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id INTEGER PRIMARY KEY,
+    rev INTEGER,
+    work_item_type TEXT,
+    state TEXT,
+    title TEXT,
+    changed_date TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_type ON work_items (work_item_type);
+CREATE INDEX IF NOT EXISTS idx_work_items_state ON work_items (state);
+
+CREATE TABLE IF NOT EXISTS suites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    work_item_id INTEGER NOT NULL,
+    work_item_rev INTEGER,
+    kind TEXT NOT NULL,
+    provider TEXT,
+    model TEXT,
+    test_case_count INTEGER NOT NULL,
+    csv_content TEXT NOT NULL,
+    file_path TEXT,
+    generated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_suites_work_item ON suites (work_item_id, generated_at);
+CREATE INDEX IF NOT EXISTS idx_suites_generated_at ON suites (generated_at);
+
+CREATE TABLE IF NOT EXISTS refinements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    work_item_id INTEGER NOT NULL,
+    suite_id INTEGER REFERENCES suites (id),
+    prompt TEXT,
+    summary TEXT,
+    screenshots TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refinements_work_item ON refinements (work_item_id, created_at);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    scope TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS regeneration_flags (
+    work_item_id INTEGER PRIMARY KEY,
+    reason TEXT,
+    flagged_at REAL NOT NULL
+);
+"""
+
+# Suite metadata returned by listings (everything except the CSV itself)
+_SUITE_COLUMNS = ("s.id, s.work_item_id, s.work_item_rev, s.kind, s.provider, s.model, "
+                  "s.test_case_count, s.file_path, s.generated_at")
+
+
+def count_test_cases(csv_content):
+    """Count the 'Test Case' rows of a generated suite"""
+    return sum(1 for row in csv.reader(io.StringIO(csv_content)) if row and row[0].strip() == "Test Case")
+
+
+class SuiteStore:
+    """Work items, every generated or refined suite, and refinement history in one SQLite file
+
+    The CSV and JSON files in data/ are still written for the viewers and
+    downloads; the store is what finding, listing and comparing suites use.
+    The connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets the UI read while a worker thread writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # Work items
+
+    def save_work_items(self, work_items):
+        """Insert or update work items (as exported from Azure DevOps)"""
+        now = time.time()
+        rows = []
+        for work_item in work_items:
+            fields = work_item.get('fields', {})
+            rows.append((
+                int(work_item['id']),
+                work_item.get('rev', fields.get('System.Rev')),
+                fields.get('System.WorkItemType'),
+                fields.get('System.State'),
+                fields.get('System.Title'),
+                fields.get('System.ChangedDate'),
+                json.dumps(work_item, ensure_ascii=False),
+                now
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO work_items "
+                "(id, rev, work_item_type, state, title, changed_date, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def save_work_item(self, work_item):
+        self.save_work_items([work_item])
+
+    def get_work_item(self, work_item_id):
+        """Return the stored work item data, or None"""
+        rows = self._query("SELECT data FROM work_items WHERE id = ?", (int(work_item_id),))
+        return json.loads(rows[0]['data']) if rows else None
+
+    def list_work_items(self, work_item_type=None, state=None):
+        """List stored work items (without their data), optionally filtered by type and state"""
+        sql = "SELECT id, rev, work_item_type, state, title, changed_date, updated_at FROM work_items WHERE 1 = 1"
+        params = []
+        if work_item_type:
+            sql += " AND work_item_type = ?"
+            params.append(work_item_type)
+        if state:
+            sql += " AND state = ?"
+            params.append(state)
+        return self._query(sql + " ORDER BY id", params)
+
+    # Suites
+
+    def save_suite(self, work_item_id, csv_content, file_path=None, kind="generated",
+                   provider=None, model=None, work_item_rev=None, generated_at=None):
+        """Record a generated or refined suite and return its ID
+
+        A newly generated suite clears the work item's regeneration flag.
+        """
+        if kind == "generated":
+            self.clear_regeneration_flag(work_item_id)
+        cursor = self._execute(
+            "INSERT INTO suites (work_item_id, work_item_rev, kind, provider, model, "
+            "test_case_count, csv_content, file_path, generated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (int(work_item_id), work_item_rev, kind, provider, model,
+             count_test_cases(csv_content), csv_content,
+             str(file_path) if file_path else None, generated_at or time.time())
+        )
+        return cursor.lastrowid
+
+    def get_suite(self, suite_id):
+        """Return a suite including its CSV content, or None"""
+        rows = self._query("SELECT * FROM suites WHERE id = ?", (suite_id,))
+        return rows[0] if rows else None
+
+    def latest_suite(self, work_item_id):
+        """Return the most recent suite for a work item including its CSV content, or None"""
+        rows = self._query(
+            "SELECT * FROM suites WHERE work_item_id = ? ORDER BY generated_at DESC, id DESC LIMIT 1",
+            (int(work_item_id),)
+        )
+        return rows[0] if rows else None
+
+    def suite_history(self, work_item_id):
+        """Every suite recorded for a work item, newest first (without CSV content)"""
+        return self._query(
+            f"SELECT {_SUITE_COLUMNS} FROM suites s WHERE s.work_item_id = ? "
+            "ORDER BY s.generated_at DESC, s.id DESC",
+            (int(work_item_id),)
+        )
+
+    def list_suites(self, work_item_type=None, state=None, since=None, limit=None):
+        """The latest suite of each work item with its title, type and state, newest first
+
+        Filters use the work item type/state indexes and `since` (a Unix
+        timestamp) the generation time index.
+        """
+        sql = (f"SELECT {_SUITE_COLUMNS}, w.title, w.work_item_type, w.state FROM suites s "
+               "LEFT JOIN work_items w ON w.id = s.work_item_id "
+               "WHERE s.id = (SELECT id FROM suites WHERE work_item_id = s.work_item_id "
+               "ORDER BY generated_at DESC, id DESC LIMIT 1)")
+        params = []
+        if work_item_type:
+            sql += " AND w.work_item_type = ?"
+            params.append(work_item_type)
+        if state:
+            sql += " AND w.state = ?"
+            params.append(state)
+        if since:
+            sql += " AND s.generated_at >= ?"
+            params.append(since)
+        sql += " ORDER BY s.generated_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self._query(sql, params)
+
+    # Refinements
+
+    def add_refinement(self, work_item_id, prompt, suite_id=None, summary=None, screenshots=None):
+        """Record one refinement iteration and return its ID"""
+        cursor = self._execute(
+            "INSERT INTO refinements (work_item_id, suite_id, prompt, summary, screenshots, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (int(work_item_id), suite_id, prompt, summary,
+             json.dumps(screenshots) if screenshots else None, time.time())
+        )
+        return cursor.lastrowid
+
+    def refinement_history(self, work_item_id):
+        """Refinement iterations for a work item, oldest first"""
+        rows = self._query(
+            "SELECT * FROM refinements WHERE work_item_id = ? ORDER BY created_at, id",
+            (int(work_item_id),)
+        )
+        for row in rows:
+            row['screenshots'] = json.loads(row['screenshots']) if row['screenshots'] else None
+        return rows
+
+    # Incremental sync
+
+    def get_watermark(self, scope):
+        """Latest System.ChangedDate synced for a scope, or None before the first sync"""
+        rows = self._query("SELECT watermark FROM sync_state WHERE scope = ?", (scope,))
+        return rows[0]['watermark'] if rows else None
+
+    def set_watermark(self, scope, watermark):
+        self._execute(
+            "INSERT OR REPLACE INTO sync_state (scope, watermark, synced_at) VALUES (?, ?, ?)",
+            (scope, watermark, time.time())
+        )
+
+    def flag_for_regeneration(self, work_item_ids, reason):
+        """Mark work items whose suites are out of date"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO regeneration_flags (work_item_id, reason, flagged_at) VALUES (?, ?, ?)",
+                [(int(work_item_id), reason, now) for work_item_id in work_item_ids]
+            )
+
+    def clear_regeneration_flag(self, work_item_id):
+        self._execute("DELETE FROM regeneration_flags WHERE work_item_id = ?", (int(work_item_id),))
+
+    def flagged_work_items(self):
+        """Work items flagged for regeneration with their title and whether a suite exists"""
+        return self._query(
+            "SELECT f.work_item_id, f.reason, f.flagged_at, w.title, w.work_item_type, w.state, "
+            "EXISTS (SELECT 1 FROM suites s WHERE s.work_item_id = f.work_item_id) AS has_suite "
+            "FROM regeneration_flags f LEFT JOIN work_items w ON w.id = f.work_item_id "
+            "ORDER BY f.flagged_at DESC"
+        )
+
+    # Import of existing files
+
+    def import_files(self, json_dirs, testcases_dirs, log=None):
+        """Load existing PBI-<id>.json and Testcases_PBI_<id>.csv files not yet in the store
+
+        Returns (work items imported, suites imported).
+        """
+        log = log or (lambda message, level="INFO": None)
+        known_ids = {row['id'] for row in self._query("SELECT id FROM work_items")}
+        known_files = {row['file_path'] for row in self._query("SELECT DISTINCT file_path FROM suites")}
+
+        work_items = []
+        for json_dir in json_dirs:
+            for path in glob.glob(os.path.join(json_dir, "PBI-*.json")):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        work_item = json.load(f)
+                except (OSError, ValueError) as e:
+                    log(f"Skipping {path}: {str(e)}", "WARNING")
+                    continue
+                if work_item.get('id') not in known_ids:
+                    known_ids.add(work_item.get('id'))
+                    work_items.append(work_item)
+        if work_items:
+            self.save_work_items(work_items)
+
+        candidates = []
+        for testcases_dir in testcases_dirs:
+            for path in glob.glob(os.path.join(testcases_dir, "Testcases_PBI_*.csv")):
+                # Backups such as Testcases_PBI_<id>_before_missing_cos.csv are earlier versions
+                match = re.match(r"Testcases_PBI_(\d+)(_.+)?\.csv$", os.path.basename(path))
+                if match and str(path) not in known_files:
+                    try:
+                        candidates.append((os.path.getmtime(path), not match.group(2), path, match))
+                    except OSError as e:
+                        log(f"Skipping {path}: {str(e)}", "WARNING")
+
+        # Oldest first, and a backup before the main file when both have the same time
+        suites = 0
+        for mtime, is_main, path, match in sorted(candidates, key=lambda c: c[:2]):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    csv_content = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                log(f"Skipping {path}: {str(e)}", "WARNING")
+                continue
+            self.save_suite(
+                match.group(1), csv_content, file_path=path,
+                kind="imported" if is_main else "backup",
+                generated_at=mtime
+            )
+            suites += 1
+
+        if work_items or suites:
+            log(f"Imported {len(work_items)} work item(s) and {suites} suite(s) into {self.db_path}", "INFO")
+        return len(work_items), suites
+
+    def close(self):
+        self._conn.close()
@@ -4,7 +4,7 @@ Generates automated test cases from Azure DevOps work items
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, filedialog
+from tkinter import ttk, messagebox, scrolledtext, filedialog, simpledialog
 import subprocess
 import json
 import csv
@@ -13,7 +13,33 @@ import sys
 import threading
 import base64
 import io
+import re
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
+from ai_providers import cacheable_prompt, complete, get_client_pool, stream_complete, supports_vision
+from ado_client import AdoClient, AdoError, build_wiql_query, export_work_items, parse_work_item_ids
+from az_auth import AzAuthError, configure_token_cache, get_token_provider
+from csv_stream import read_streamed_answer
+from field_projection import template_fields
+from html_text import cos_items
+from prompt_compaction import compact_prompt_fields
+from rate_limit import get_rate_limiter
+from structured_output import STRUCTURED_INSTRUCTIONS, TEST_SUITE_SCHEMA, parse_structured_suite, structured_answer_to_csv
+from suite_merge import merge_suites, tag_cos_references
+from token_budget import (DEFAULT_MAX_OUTPUT_TOKENS, chunk_criteria, estimate_tokens, format_criteria_chunk,
+                          prompt_budget, shard_criteria, truncate_to_tokens)
+from model_registry import (AVAILABLE, ERROR, GITHUB_CANDIDATE_MODELS, RATE_LIMITED, UNAVAILABLE, UNCHECKED,
+                            REGISTRY_FILE_NAME, ModelRegistry)
+from image_cache import IMAGE_FIELDS, ImageBlobCache, get_work_item_images, image_message_parts
+from response_cache import ResponseCache
+from related_items import build_related_context
+from suite_store import DB_FILE_NAME, SuiteStore
+from work_item_cache import WorkItemCache
+from work_item_sync import sync_changed_work_items
+from generation_pipeline import DEFAULT_CONCURRENCY, make_exporter, run_paged_pipeline, run_pipeline_sync
 try:
     from PIL import ImageGrab, Image
     PIL_AVAILABLE = True
@@ -21,6 +47,71 @@ except ImportError:
     PIL_AVAILABLE = False
 
 
+# Filled in by build_test_case_prompt; its placeholders decide which fields an export needs (see field_projection).
+# Static instructions come first and the work item last (see PROMPT_CACHE_SPLIT).
+PROMPT_TEMPLATE = """Generate manual test cases in CSV format for the Azure DevOps work item at the end of this prompt.
+
+CSV TEMPLATE FORMAT - FOLLOW THIS EXACTLY:
+{template_content}
+
+CRITICAL FORMAT RULES:
+1. Header row MUST be: Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference
+2. Each Test Case is ONE row with: "Test Case" in column 1, full title in column 2, empty columns 3-5, COS number/text in column 6
+3. Each Step is a SEPARATE row with: empty column 1, empty column 2, step number in column 3, action in column 4, expected result in column 5, empty column 6
+4. COS Reference: For each test case, include which Condition of Satisfaction (COS) it addresses. Use "COS 1", "COS 2", etc. based on the numbered/bulleted list in Acceptance Criteria
+5. Example structure (EXACTLY 6 columns per row, NO trailing commas):
+   Test Case,FUNC-01: Test Name,,,, COS 1
+   , ,1,Do action 1,Expected result 1,
+   , ,2,Do action 2,Expected result 2,
+   Test Case,FUNC-02: Another Test,,,,COS 2
+   , ,1,Do action,Expected result,
+
+CONTENT REQUIREMENTS:
+1. Test Case Titles: Use prefixes FUNC-XX (Functional), VAL-XX (Validation), UI-XX (UI), NEG-XX (Negative), REG-XX (Regression)
+2. Do NOT include the PBI/Bug number in titles
+3. NO COMMAS inside any text field (use semicolons or dashes instead)
+4. Keep steps clear and actionable
+5. Each step must have a specific expected result
+6. EVERY test case MUST have a COS Reference indicating which Acceptance Criteria item it addresses
+7. Create at least one test case for EACH Condition of Satisfaction in the Acceptance Criteria
+8. Cover all aspects: Functional, Validation, UI, Negative, and Regression scenarios
+9. Pay special attention to Developer Notes - test what was actually implemented
+
+OUTPUT FORMAT:
+IMPORTANT: Return ONLY the CSV data - NO explanatory text, NO markdown formatting, NO notes.
+Start directly with the header row: Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference
+Do NOT include phrases like "Here is the CSV" or notes at the end.
+Just return pure CSV data that can be parsed directly.
+
+WORK ITEM DETAILS:
+ID: {work_item_id}
+Type: {work_item_type}
+Title: {title}
+
+Description:
+{description}
+
+Acceptance Criteria:
+{acceptance_criteria}
+
+Developer Notes (CRITICAL - must be covered by tests):
+{developer_notes}
+
+Related Work Items (context only - do not write test cases for them):
+{related_context}
+"""
+
+GENERATION_SYSTEM_PROMPT = "You are an expert QA test case writer. Generate comprehensive manual test cases in CSV format."
+# Generation prompts put the static instructions before this marker and the work item after it,
+# so providers can cache the prompt prefix between work items
+PROMPT_CACHE_SPLIT = "WORK ITEM DETAILS:"
+
+# Smallest share of the prompt budget left for acceptance criteria when a work item is split
+MIN_CRITERIA_TOKENS = 500
+# Concurrent requests when generating one COS at a time
+COS_SHARD_CONCURRENCY = 4
+
+
 class TestCaseGeneratorApp:
     def __init__(self, root):
         self.root = root
@@ -50,6 +141,9 @@ class TestCaseGeneratorApp:
         # Config file for storing settings
         self.config_file = os.path.join(os.getcwd(), '.testgen_config.json')
         
+        # Keep the Azure DevOps token across restarts (encrypted; needs the optional cryptography and keyring packages)
+        configure_token_cache(os.path.join(os.getcwd(), '.ado_token_cache'))
+        
         # Setup data directories
         self.data_dir = os.path.join(os.getcwd(), 'data')
         self.json_dir = os.path.join(self.data_dir, 'json')
@@ -67,10 +161,28 @@ class TestCaseGeneratorApp:
         self.api_key = tk.StringVar()
         self.ai_provider = tk.StringVar(value="github")
         self.use_ai = tk.BooleanVar(value=True)
+        self.project_fields = tk.BooleanVar(value=True)  # Export only the fields the prompt uses
+        self.include_related = tk.BooleanVar(value=False)  # Summarize parent/child/linked items in the prompt
+        self.include_images = tk.BooleanVar(value=False)  # Attach images embedded in the work item (vision models)
+        self.shard_by_cos = tk.BooleanVar(value=False)  # One concurrent request per COS instead of one for the suite
+        self.structured_output = tk.BooleanVar(value=False)  # Ask for JSON test cases and build the CSV locally
+        self.refresh_cache = tk.BooleanVar(value=False)  # Ask the model again instead of reusing cached answers
+        self.sync_project = ""  # Project used by the last incremental sync
         self.selected_model = "gpt-4o"  # Default model
         self.pasted_screenshot = None
         self.last_analysis_summary = None
         self.current_work_item_data = None  # Store work item JSON for COS mapping
+        self.work_item_cache = WorkItemCache(self.json_dir)  # Skips re-export when the revision is unchanged
+        self.max_concurrency = DEFAULT_CONCURRENCY  # Work items processed at once when several IDs are entered
+        self.rate_limits = {}  # Per-provider [requests, tokens] per minute from the config file; defaults otherwise
+        self.suite_store = SuiteStore(os.path.join(self.data_dir, DB_FILE_NAME))  # Indexed history of work items and suites
+        self.suite_store.import_files(
+            [self.json_dir, os.path.join(self.app_dir, 'data', 'json')],
+            [self.testcases_dir, os.path.join(self.app_dir, 'data', 'testcases')]
+        )
+        self.image_cache = ImageBlobCache(os.path.join(self.data_dir, 'images'))  # Embedded images by SHA-256
+        self.response_cache = ResponseCache(os.path.join(self.data_dir, 'responses'))  # AI answers by request hash
+        self.model_registry = ModelRegistry(os.path.join(self.data_dir, REGISTRY_FILE_NAME))  # Probed models per key
         
         # Load saved settings
         self.load_config()
@@ -220,7 +332,7 @@ class TestCaseGeneratorApp:
         # Info label
         info_label = ttk.Label(
             quick_frame,
-            text="💡 Enter your Azure DevOps work item ID and click Generate",
+            text="💡 Enter your Azure DevOps work item ID and click Generate (several comma-separated IDs are processed concurrently)",
             font=("Segoe UI", 9),
             foreground="#666"
         )
@@ -325,6 +437,53 @@ class TestCaseGeneratorApp:
         ttk.Label(self.advanced_frame, text="💡 Default: GitHub Models (free) | Change only if using different provider", 
                  font=("Segoe UI", 8), foreground="#666").grid(row=6, column=1, columnspan=2, sticky=tk.W, pady=(5, 0))
         
+        # Field projection
+        ttk.Checkbutton(
+            self.advanced_frame,
+            text="Export only the work item fields used by the prompt (smaller, faster exports)",
+            variable=self.project_fields
+        ).grid(row=7, column=1, columnspan=2, sticky=tk.W, pady=(8, 0))
+        
+        # Related work items
+        ttk.Checkbutton(
+            self.advanced_frame,
+            text="Include parent, child and linked work items in the prompt",
+            variable=self.include_related
+        ).grid(row=8, column=1, columnspan=2, sticky=tk.W, pady=(4, 0))
+        
+        # Embedded images
+        ttk.Checkbutton(
+            self.advanced_frame,
+            text="Attach images embedded in the work item (vision models, downloaded once)",
+            variable=self.include_images
+        ).grid(row=9, column=1, columnspan=2, sticky=tk.W, pady=(4, 0))
+        
+        ttk.Checkbutton(
+            self.advanced_frame,
+            text="Generate each COS in its own parallel request (guarantees per-COS coverage)",
+            variable=self.shard_by_cos
+        ).grid(row=10, column=1, columnspan=2, sticky=tk.W, pady=(4, 0))
+        
+        ttk.Checkbutton(
+            self.advanced_frame,
+            text="Structured output - ask for JSON and build the CSV locally (no CSV repair needed)",
+            variable=self.structured_output
+        ).grid(row=11, column=1, columnspan=2, sticky=tk.W, pady=(4, 0))
+        
+        # Cached AI answers: regenerate without the cache, or drop it entirely
+        cache_frame = ttk.Frame(self.advanced_frame)
+        cache_frame.grid(row=12, column=1, columnspan=2, sticky=tk.W, pady=(4, 0))
+        ttk.Checkbutton(
+            cache_frame,
+            text="Ignore cached AI answers (regenerate even if the prompt is unchanged)",
+            variable=self.refresh_cache
+        ).pack(side=tk.LEFT)
+        ttk.Button(
+            cache_frame,
+            text="Clear Cached Answers",
+            command=self.clear_response_cache
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        
         self.advanced_frame.columnconfigure(1, weight=1)
         
         # Action Buttons Frame
@@ -340,6 +499,30 @@ class TestCaseGeneratorApp:
         )
         self.generate_btn.pack(side=tk.LEFT, padx=8)
         
+        # Bulk Export Button
+        self.bulk_export_btn = ttk.Button(
+            button_frame,
+            text="📦 Bulk Export",
+            command=self.bulk_export_work_items
+        )
+        self.bulk_export_btn.pack(side=tk.LEFT, padx=8)
+        
+        # Generate from Query Button
+        self.query_btn = ttk.Button(
+            button_frame,
+            text="🔎 Generate from Query",
+            command=self.generate_from_query
+        )
+        self.query_btn.pack(side=tk.LEFT, padx=8)
+        
+        # Incremental Sync Button
+        self.sync_btn = ttk.Button(
+            button_frame,
+            text="🔄 Sync Changes",
+            command=self.sync_work_items
+        )
+        self.sync_btn.pack(side=tk.LEFT, padx=8)
+        
         # Check Prerequisites Button
         check_btn = ttk.Button(
             button_frame,
@@ -391,6 +574,8 @@ class TestCaseGeneratorApp:
         
         # Initialize viewer tab reference
         self.viewer_tab = None
+        self.live_tab = None
+        self.live_tree = None
         self.screenshot_tab = None
         self.current_csv_for_screenshot = None
         
@@ -420,6 +605,27 @@ class TestCaseGeneratorApp:
                     self.ai_provider.set(config['ai_provider'])
                 if 'selected_model' in config:
                     self.selected_model = config['selected_model']
+                if 'cache_ttl_seconds' in config:
+                    self.work_item_cache.ttl_seconds = config['cache_ttl_seconds']
+                if 'max_concurrency' in config:
+                    self.max_concurrency = config['max_concurrency']
+                if 'project_fields' in config:
+                    self.project_fields.set(config['project_fields'])
+                if 'include_related' in config:
+                    self.include_related.set(config['include_related'])
+                if 'include_images' in config:
+                    self.include_images.set(config['include_images'])
+                if 'shard_by_cos' in config:
+                    self.shard_by_cos.set(config['shard_by_cos'])
+                if 'structured_output' in config:
+                    self.structured_output.set(config['structured_output'])
+                if 'sync_project' in config:
+                    self.sync_project = config['sync_project']
+                if 'rate_limits' in config:
+                    # {provider: [requests per minute, tokens per minute]} for keys above the lowest tiers
+                    self.rate_limits = config['rate_limits']
+                    for provider, (requests_per_minute, tokens_per_minute) in self.rate_limits.items():
+                        get_rate_limiter().set_limits(provider, requests_per_minute, tokens_per_minute)
                     
         except Exception as e:
             # Silently fail - not critical if config doesn't load
@@ -433,7 +639,16 @@ class TestCaseGeneratorApp:
                 'organization_url': self.organization_url.get(),
                 'workspace_path': self.workspace_path.get(),
                 'ai_provider': self.ai_provider.get(),
-                'selected_model': self.selected_model
+                'selected_model': self.selected_model,
+                'cache_ttl_seconds': self.work_item_cache.ttl_seconds,
+                'max_concurrency': self.max_concurrency,
+                'project_fields': self.project_fields.get(),
+                'sync_project': self.sync_project,
+                'include_related': self.include_related.get(),
+                'include_images': self.include_images.get(),
+                'shard_by_cos': self.shard_by_cos.get(),
+                'structured_output': self.structured_output.get(),
+                'rate_limits': self.rate_limits
             }
             
             with open(self.config_file, 'w') as f:
@@ -459,7 +674,7 @@ class TestCaseGeneratorApp:
             messagebox.showerror("Save Error", f"Failed to save settings:\n{str(e)}")
     
     def check_available_models(self):
-        """Check which models are available through GitHub Models API"""
+        """Show the models the GitHub token can use, from the model registry when it has them"""
         provider = self.ai_provider.get()
         
         if provider != "github":
@@ -473,7 +688,35 @@ class TestCaseGeneratorApp:
                                  "Please enter your GitHub token first to check available models.")
             return
         
-        # Show progress
+        entry = self.model_registry.get(provider, api_key)
+        if entry:
+            # Open instantly with the last results; refresh old ones in the background
+            self.show_model_picker(entry['models'], entry['checked_at'])
+            if entry['stale']:
+                self.log_message("Model list is older than a day - re-checking in the background", "INFO")
+                threading.Thread(target=self.refresh_models_in_background, args=(provider, api_key),
+                                 daemon=True).start()
+            return
+        
+        self.probe_models_with_progress(provider, api_key)
+    
+    def refresh_models(self, provider, api_key):
+        """Probe the candidate models and update the registry (runs in a worker thread)"""
+        client = get_client_pool().get(provider, api_key, log=self.log_message)
+        models = self.model_registry.refresh(client, provider, api_key, GITHUB_CANDIDATE_MODELS, log=self.log_message)
+        available = sum(1 for status in models.values() if status in (AVAILABLE, RATE_LIMITED))
+        self.log_message(f"✓ Model list updated: {available} of {len(models)} models available", "SUCCESS")
+        return models
+    
+    def refresh_models_in_background(self, provider, api_key):
+        """refresh_models for the stale-list refresh, which has no window to report errors in"""
+        try:
+            self.refresh_models(provider, api_key)
+        except Exception as e:
+            self.log_message(f"Could not re-check the model list: {e}", "WARNING")
+    
+    def probe_models_with_progress(self, provider, api_key):
+        """Probe the models behind a progress window, then open the picker"""
         progress_window = tk.Toplevel(self.root)
         progress_window.title("Checking Models...")
         progress_window.geometry("400x100")
@@ -487,192 +730,157 @@ class TestCaseGeneratorApp:
         
         def check_models_thread():
             try:
-                import openai
-                
-                # Try a list of known GitHub Models
-                test_models = [
-                    "gpt-4o",
-                    "gpt-4o-mini", 
-                    "o1-preview",
-                    "o1-mini",
-                    "Phi-3.5-MoE-instruct",
-                    "Phi-3-medium-128k-instruct",
-                    "Meta-Llama-3.1-405B-Instruct",
-                    "Meta-Llama-3.1-70B-Instruct",
-                    "Meta-Llama-3.1-8B-Instruct",
-                    "Mistral-large",
-                    "Mistral-large-2407",
-                    "Mistral-Nemo",
-                    "Mistral-small",
-                    "AI21-Jamba-1.5-Large",
-                    "AI21-Jamba-1.5-Mini",
-                    "Cohere-command-r",
-                    "Cohere-command-r-plus"
-                ]
-                
-                client = openai.OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-                
-                available = []
-                unavailable = []
-                
-                for model in test_models:
-                    try:
-                        # Try a minimal completion to test model availability
-                        response = client.chat.completions.create(
-                            model=model,
-                            messages=[{"role": "user", "content": "Hi"}],
-                            max_tokens=1,
-                            timeout=5
-                        )
-                        available.append(model)
-                    except Exception as e:
-                        error_msg = str(e).lower()
-                        if "unknown_model" in error_msg or "unknown model" in error_msg:
-                            unavailable.append(model)
-                        elif "rate_limit" in error_msg or "quota" in error_msg:
-                            # If we hit rate limit, model exists but can't test further
-                            available.append(f"{model} (rate limited)")
-                            break
-                        else:
-                            # Other errors might mean the model exists but has different issues
-                            available.append(f"{model} (?)")
-                
-                progress_window.destroy()
-                
-                # Show results with selection capability
-                result_window = tk.Toplevel(self.root)
-                result_window.title("Select AI Model")
-                result_window.geometry("650x550")
-                
-                ttk.Label(result_window, 
-                         text="✅ Select a Model for Test Case Generation",
-                         font=("Segoe UI", 12, "bold")).pack(pady=10)
-                
-                if not available:
-                    ttk.Label(result_window, 
-                             text="⚠️ No models were confirmed available.\nThis might be due to token permissions or rate limiting.",
-                             font=("Segoe UI", 10),
-                             foreground="#d13438").pack(pady=20)
-                    ttk.Button(result_window, text="Close", 
-                              command=result_window.destroy).pack(pady=10)
-                    return
-                
-                # Info label
-                ttk.Label(result_window, 
-                         text="Select a model below and click 'Use This Model' to update the configuration.",
-                         font=("Segoe UI", 9),
-                         foreground="#666").pack(pady=5)
-                
-                # Create scrollable frame for radio buttons
-                canvas_frame = ttk.Frame(result_window)
-                canvas_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-                
-                canvas = tk.Canvas(canvas_frame, highlightthickness=0)
-                scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview)
-                scrollable_frame = ttk.Frame(canvas)
-                
-                scrollable_frame.bind(
-                    "<Configure>",
-                    lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-                )
-                
-                canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-                canvas.configure(yscrollcommand=scrollbar.set)
-                
-                canvas.pack(side="left", fill="both", expand=True)
-                scrollbar.pack(side="right", fill="y")
-                
-                # Variable to store selected model
-                selected_model = tk.StringVar(value=available[0] if available else "")
-                
-                # Create radio buttons for available models
-                ttk.Label(scrollable_frame, 
-                         text="AVAILABLE MODELS:", 
-                         font=("Segoe UI", 10, "bold"),
-                         foreground="#107c10").pack(anchor=tk.W, pady=(5, 10))
-                
-                for model in available:
-                    # Clean model name (remove annotations like "(?)" or "(rate limited)")
-                    clean_model = model.split(" (")[0] if " (" in model else model
-                    display_text = f"✅ {model}"
-                    
-                    rb = ttk.Radiobutton(
-                        scrollable_frame,
-                        text=display_text,
-                        variable=selected_model,
-                        value=clean_model,
-                        style="TRadiobutton"
-                    )
-                    rb.pack(anchor=tk.W, padx=20, pady=3)
-                
-                # Show unavailable models (not selectable)
-                if unavailable:
-                    ttk.Separator(scrollable_frame, orient="horizontal").pack(fill=tk.X, pady=15)
-                    ttk.Label(scrollable_frame, 
-                             text="UNAVAILABLE MODELS:", 
-                             font=("Segoe UI", 10, "bold"),
-                             foreground="#d13438").pack(anchor=tk.W, pady=(5, 10))
-                    
-                    for model in unavailable:
-                        ttk.Label(
-                            scrollable_frame,
-                            text=f"❌ {model}",
-                            foreground="#999"
-                        ).pack(anchor=tk.W, padx=20, pady=2)
-                
-                # Summary label
-                summary = ttk.Label(result_window, 
-                                   text=f"📊 Total: {len(available)} available, {len(unavailable)} unavailable",
-                                   font=("Segoe UI", 9),
-                                   foreground="#666")
-                summary.pack(pady=5)
-                
-                # Buttons frame
-                button_frame = ttk.Frame(result_window)
-                button_frame.pack(pady=15)
-                
-                def apply_model_selection():
-                    model = selected_model.get()
-                    if not model:
-                        messagebox.showwarning("No Selection", "Please select a model first.")
-                        return
-                    
-                    # Update the model in the config and code
-                    self.selected_model = model
-                    self.save_config()
-                    
-                    # Update the model status label
-                    if hasattr(self, 'model_status_label'):
-                        self.model_status_label.config(text=f"🤖 {model}")
-                    
-                    result_window.destroy()
-                    messagebox.showinfo(
-                        "Model Updated",
-                        f"✓ Model updated to: {model}\n\n"
-                        "The new model will be used for all test case generation operations."
-                    )
-                    self.log_message(f"✓ AI Model changed to: {model}", "SUCCESS")
-                
-                ttk.Button(button_frame, 
-                          text="✓ Use This Model", 
-                          command=apply_model_selection,
-                          style="Accent.TButton").pack(side=tk.LEFT, padx=5)
-                
-                ttk.Button(button_frame, 
-                          text="Cancel", 
-                          command=result_window.destroy).pack(side=tk.LEFT, padx=5)
-                
+                models = self.refresh_models(provider, api_key)
+                self.root.after(0, lambda: (progress_window.destroy(), self.show_model_picker(models)))
             except Exception as e:
-                progress_window.destroy()
-                messagebox.showerror("Error", f"Failed to check models:\n{str(e)}")
+                error = str(e)
+                self.root.after(0, lambda: (progress_window.destroy(),
+                                            messagebox.showerror("Error", f"Failed to check models:\n{error}")))
         
         # Run in thread to not block UI
         thread = threading.Thread(target=check_models_thread, daemon=True)
         thread.start()
     
+    def show_model_picker(self, models, checked_at=None):
+        """Let the user pick one of the available models (`models` maps model -> registry status)"""
+        labels = {AVAILABLE: "", RATE_LIMITED: " (rate limited)", ERROR: " (?)", UNCHECKED: " (not checked)"}
+        available = [f"{model}{labels[status]}" for model, status in models.items() if status in labels]
+        unavailable = [model for model, status in models.items() if status == UNAVAILABLE]
+        
+        # Show results with selection capability
+        result_window = tk.Toplevel(self.root)
+        result_window.title("Select AI Model")
+        result_window.geometry("650x550")
+        
+        ttk.Label(result_window, 
+                 text="✅ Select a Model for Test Case Generation",
+                 font=("Segoe UI", 12, "bold")).pack(pady=10)
+        
+        def recheck():
+            result_window.destroy()
+            self.probe_models_with_progress(self.ai_provider.get(), self.api_key.get().strip())
+        
+        if not available:
+            ttk.Label(result_window, 
+                     text="⚠️ No models were confirmed available.\nThis might be due to token permissions or rate limiting.",
+                     font=("Segoe UI", 10),
+                     foreground="#d13438").pack(pady=20)
+            ttk.Button(result_window, text="🔄 Check Again", 
+                      command=recheck).pack(pady=5)
+            ttk.Button(result_window, text="Close", 
+                      command=result_window.destroy).pack(pady=10)
+            return
+        
+        # Info label
+        checked = f" (checked {datetime.fromtimestamp(checked_at).strftime('%Y-%m-%d %H:%M')})" if checked_at else ""
+        ttk.Label(result_window, 
+                 text=f"Select a model below and click 'Use This Model' to update the configuration.{checked}",
+                 font=("Segoe UI", 9),
+                 foreground="#666").pack(pady=5)
+        
+        # Create scrollable frame for radio buttons
+        canvas_frame = ttk.Frame(result_window)
+        canvas_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        canvas = tk.Canvas(canvas_frame, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview)
+        scrollable_frame = ttk.Frame(canvas)
+        
+        scrollable_frame.bind(
+            "<Configure>",
+            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        )
+        
+        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        
+        # Variable to store selected model
+        selected_model = tk.StringVar(value=available[0].split(" (")[0] if available else "")
+        
+        # Create radio buttons for available models
+        ttk.Label(scrollable_frame, 
+                 text="AVAILABLE MODELS:", 
+                 font=("Segoe UI", 10, "bold"),
+                 foreground="#107c10").pack(anchor=tk.W, pady=(5, 10))
+        
+        for model in available:
+            # Clean model name (remove annotations like "(?)" or "(rate limited)")
+            clean_model = model.split(" (")[0] if " (" in model else model
+            display_text = f"✅ {model}"
+            
+            rb = ttk.Radiobutton(
+                scrollable_frame,
+                text=display_text,
+                variable=selected_model,
+                value=clean_model,
+                style="TRadiobutton"
+            )
+            rb.pack(anchor=tk.W, padx=20, pady=3)
+        
+        # Show unavailable models (not selectable)
+        if unavailable:
+            ttk.Separator(scrollable_frame, orient="horizontal").pack(fill=tk.X, pady=15)
+            ttk.Label(scrollable_frame, 
+                     text="UNAVAILABLE MODELS:", 
+                     font=("Segoe UI", 10, "bold"),
+                     foreground="#d13438").pack(anchor=tk.W, pady=(5, 10))
+            
+            for model in unavailable:
+                ttk.Label(
+                    scrollable_frame,
+                    text=f"❌ {model}",
+                    foreground="#999"
+                ).pack(anchor=tk.W, padx=20, pady=2)
+        
+        # Summary label
+        summary = ttk.Label(result_window, 
+                           text=f"📊 Total: {len(available)} available, {len(unavailable)} unavailable",
+                           font=("Segoe UI", 9),
+                           foreground="#666")
+        summary.pack(pady=5)
+        
+        # Buttons frame
+        button_frame = ttk.Frame(result_window)
+        button_frame.pack(pady=15)
+        
+        def apply_model_selection():
+            model = selected_model.get()
+            if not model:
+                messagebox.showwarning("No Selection", "Please select a model first.")
+                return
+            
+            # Update the model in the config and code
+            self.selected_model = model
+            self.save_config()
+            
+            # Update the model status label
+            if hasattr(self, 'model_status_label'):
+                self.model_status_label.config(text=f"🤖 {model}")
+            
+            result_window.destroy()
+            messagebox.showinfo(
+                "Model Updated",
+                f"✓ Model updated to: {model}\n\n"
+                "The new model will be used for all test case generation operations."
+            )
+            self.log_message(f"✓ AI Model changed to: {model}", "SUCCESS")
+        
+        ttk.Button(button_frame, 
+                  text="✓ Use This Model", 
+                  command=apply_model_selection,
+                  style="Accent.TButton").pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(button_frame, 
+                  text="🔄 Check Again", 
+                  command=recheck).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(button_frame, 
+                  text="Cancel", 
+                  command=result_window.destroy).pack(side=tk.LEFT, padx=5)
+    
     def toggle_advanced_settings(self):
         """Show or hide advanced settings"""
         if self.show_advanced.get():
@@ -741,68 +949,47 @@ class TestCaseGeneratorApp:
         self.root.update_idletasks()
         
     def check_prerequisites(self):
-        """Check if Azure CLI is installed"""
+        """Check if Azure CLI is installed and logged in"""
         self.log_message("Checking prerequisites...")
         self.update_status("Checking prerequisites...")
         
-        # On Windows, az is a .cmd file that requires shell=True
-        import platform
-        use_shell = platform.system() == 'Windows'
-        
         try:
-            result = subprocess.run(
-                ["az", "--version"],
-                capture_output=True,
-                text=True,
-                timeout=10,
-                shell=use_shell
-            )
+            # shutil.which finds az without launching it; the login check reuses the cached token
+            az_path = shutil.which("az")
+            if not az_path:
+                self.log_message("✗ Azure CLI is NOT installed", "ERROR")
+                self.show_install_instructions()
+                return
             
-            if result.returncode == 0:
-                self.log_message("✓ Azure CLI is installed", "SUCCESS")
-                version_line = result.stdout.split('\n')[0]
-                self.log_message(f"  {version_line}")
-                
-                # Check if logged in
-                self.log_message("")
-                self.log_message("Checking Azure login status...")
-                login_result = subprocess.run(
-                    ["az", "account", "show"],
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
-                    shell=use_shell
-                )
-                
-                if login_result.returncode == 0:
-                    self.log_message("✓ You are logged in to Azure", "SUCCESS")
-                    import json
-                    try:
-                        account = json.loads(login_result.stdout)
-                        self.log_message(f"  Account: {account.get('user', {}).get('name', 'Unknown')}")
-                        self.log_message(f"  Subscription: {account.get('name', 'Unknown')}")
-                    except:
-                        pass
-                    messagebox.showinfo("Prerequisites Check", 
-                                      "✓ Azure CLI is installed and you are logged in!\n\n"
-                                      "Ready to generate test cases.")
-                else:
-                    self.log_message("⚠ You are NOT logged in to Azure", "WARNING")
-                    self.log_message("Please run: az login", "WARNING")
-                    messagebox.showwarning("Not Logged In", 
-                                         "Azure CLI is installed but you are not logged in.\n\n"
-                                         "Please run this command in PowerShell:\n"
-                                         "az login\n\n"
-                                         "Then try again.")
-                
-                self.update_status("Prerequisites OK")
+            self.log_message("✓ Azure CLI is installed", "SUCCESS")
+            self.log_message(f"  {az_path}")
+            
+            # Check if logged in
+            self.log_message("")
+            self.log_message("Checking Azure login status...")
+            try:
+                token_info = get_token_provider().get_token_info()
+            except AzAuthError as e:
+                self.log_message("⚠ You are NOT logged in to Azure", "WARNING")
+                self.log_message(f"  {str(e)}", "WARNING")
+                self.log_message("Please run: az login", "WARNING")
+                messagebox.showwarning("Not Logged In", 
+                                     "Azure CLI is installed but you are not logged in.\n\n"
+                                     "Please run this command in PowerShell:\n"
+                                     "az login\n\n"
+                                     "Then try again.")
             else:
-                self.log_message("✗ Azure CLI check failed", "ERROR")
-                self.show_install_instructions()
+                self.log_message("✓ You are logged in to Azure", "SUCCESS")
+                self.log_message(f"  Tenant: {token_info.get('tenant') or 'Unknown'}")
+                self.log_message(f"  Subscription: {token_info.get('subscription') or 'Unknown'}")
+                expires = datetime.fromtimestamp(token_info['expires_at']).strftime('%H:%M:%S')
+                self.log_message(f"  Access token cached until {expires}")
+                messagebox.showinfo("Prerequisites Check", 
+                                  "✓ Azure CLI is installed and you are logged in!\n\n"
+                                  "Ready to generate test cases.")
+            
+            self.update_status("Prerequisites OK")
                 
-        except FileNotFoundError:
-            self.log_message("✗ Azure CLI is NOT installed", "ERROR")
-            self.show_install_instructions()
         except Exception as e:
             self.log_message(f"Error checking prerequisites: {str(e)}", "ERROR")
             
@@ -815,6 +1002,36 @@ class TestCaseGeneratorApp:
         messagebox.showwarning("Azure CLI Not Found", msg)
         self.update_status("Azure CLI not found")
         
+    def record_suite(self, csv_file, kind, work_item_data=None, prompt=None, summary=None):
+        """Record a written suite (and optionally its work item and refinement) in the suite store"""
+        try:
+            match = re.match(r"Testcases_PBI_(\d+)\.csv$", os.path.basename(csv_file))
+            if not match:
+                return
+            if work_item_data:
+                self.suite_store.save_work_item(work_item_data)
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                csv_content = f.read()
+            suite_id = self.suite_store.save_suite(
+                match.group(1), csv_content, file_path=csv_file, kind=kind,
+                provider=self.ai_provider.get(), model=self.selected_model,
+                work_item_rev=work_item_data.get('rev') if work_item_data else None
+            )
+            if prompt:
+                self.suite_store.add_refinement(match.group(1), prompt, suite_id=suite_id, summary=summary)
+        except (OSError, sqlite3.Error) as e:
+            # The CSV file is already saved; the store only adds history and lookups
+            self.log_message(f"Could not record suite in the store: {str(e)}", "WARNING")
+    
+    def export_fields(self):
+        """Fields to export for the prompt, or None to export every field"""
+        if not self.project_fields.get():
+            return None
+        fields = template_fields(PROMPT_TEMPLATE)
+        if self.include_images.get():
+            fields += [field for field in IMAGE_FIELDS if field not in fields]
+        return fields
+    
     def generate_test_cases(self):
         """Main function to generate test cases"""
         work_item_id = self.work_item_id.get().strip()
@@ -822,16 +1039,272 @@ class TestCaseGeneratorApp:
         if not work_item_id:
             messagebox.showerror("Error", "Please enter a Work Item ID")
             return
-            
-        if not work_item_id.isdigit():
+        
+        try:
+            work_item_ids = parse_work_item_ids(work_item_id)
+        except ValueError:
             messagebox.showerror("Error", "Work Item ID must be a number")
             return
+        
+        if len(work_item_ids) > 1:
+            if not self.api_key.get().strip():
+                messagebox.showerror("Error", "Generating several work items at once requires an AI API key.\n\n"
+                                              "Click 'Show Advanced Settings' to configure your token.")
+                return
+            thread = threading.Thread(target=self._generate_many_thread, args=(work_item_ids,))
+        else:
+            # Run in separate thread to avoid freezing UI
+            thread = threading.Thread(target=self._generate_test_cases_thread, args=(str(work_item_ids[0]),))
+        thread.daemon = True
+        thread.start()
+    
+    def _generate_many_thread(self, work_item_ids):
+        """Thread worker that exports and generates several work items concurrently"""
+        org_url = self.organization_url.get()
+        client = AdoClient(org_url)
+        
+        try:
+            self.generate_btn.config(state=tk.DISABLED)
+            self.progress.start(10)
+            self.update_status(f"Generating test cases for {len(work_item_ids)} work items...")
+            
+            self.log_message(f"Starting test case generation for {len(work_item_ids)} work items")
+            self.log_message("=" * 60)
+            
+            fields = self.export_fields()
+            export = make_exporter(self.work_item_cache, client, org_url, self.json_dir,
+                                   log=self.log_message, fields=fields)
+            results, summary = run_pipeline_sync(
+                work_item_ids, export, self._generate_for_pipeline,
+                concurrency=self.max_concurrency,
+                log=self.log_message
+            )
+            
+            self.log_message("=" * 60)
+            self.log_message(f"{'Work Item':<12}{'Status':<12}{'Export':>10}{'Generate':>10}{'Waiting':>10}")
+            for result in results:
+                timings = result['timings']
+                self.log_message(
+                    f"{result['work_item_id']:<12}{result['status']:<12}"
+                    f"{timings['export']:>9.1f}s{timings['generate']:>9.1f}s"
+                    f"{timings['export_wait'] + timings['generate_wait']:>9.1f}s"
+                )
+            self.log_message(f"Wall time {summary['wall_seconds']:.1f}s vs {summary['serial_seconds']:.1f}s serial")
+            limits = get_rate_limiter().summary()
+            if limits['waits'] or limits['retries']:
+                self.log_message(
+                    f"Rate limiter: {limits['waits']} call(s) queued (avg {limits['avg_wait_seconds']:.1f}s, "
+                    f"max {limits['max_wait_seconds']:.1f}s), {limits['retries']} retried", "INFO"
+                )
+            self.update_status(f"Completed: {summary['succeeded']} of {summary['items']} work items")
+            
+            messagebox.showinfo(
+                "Generation Complete",
+                f"Generated test cases for {summary['succeeded']} of {summary['items']} work items "
+                f"in {summary['wall_seconds']:.0f}s.\n\n"
+                f"Output folder: {self.testcases_dir}"
+            )
+            
+        except Exception as e:
+            self.log_message(f"Unexpected error: {str(e)}", "ERROR")
+            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.update_status("Error occurred")
+            
+        finally:
+            client.close()
+            self.progress.stop()
+            self.generate_btn.config(state=tk.NORMAL)
+        
+    def _generate_for_pipeline(self, work_item_id, work_item_data):
+        """Generate test cases for one work item of a multi-item run (raises on failure)"""
+        template_file = os.path.join(self.app_dir, "testcase_template.csv")
+        output_file = os.path.join(self.testcases_dir, f"Testcases_PBI_{work_item_id}.csv")
+        if not self.generate_with_ai(work_item_data, template_file, output_file, str(work_item_id), show_viewer=False):
+            raise RuntimeError("AI generation failed")
+        return output_file
+    
+    def generate_from_query(self):
+        """Ask for a WIQL query, area path or iteration path and generate test cases for every match"""
+        if not self.api_key.get().strip():
+            messagebox.showerror("Error", "Generating from a query requires an AI API key.\n\n"
+                                          "Click 'Show Advanced Settings' to configure your token.")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Generate from Query")
+        dialog.geometry("600x340")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        mode = tk.StringVar(value="Iteration Path")
+        project = tk.StringVar()
+        
+        ttk.Label(dialog, text="Select work items by:", font=("Segoe UI", 10, "bold")).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        mode_frame = ttk.Frame(dialog)
+        mode_frame.pack(fill=tk.X, padx=10)
+        for option in ("Iteration Path", "Area Path", "WIQL Query"):
+            ttk.Radiobutton(mode_frame, text=option, variable=mode, value=option).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Label(dialog, text="Path (e.g. MyProject\\Team A\\Sprint 42) or WIQL query:").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        text = scrolledtext.ScrolledText(dialog, wrap=tk.WORD, height=6, font=("Segoe UI", 10))
+        text.pack(fill=tk.BOTH, expand=True, padx=10)
+        text.focus()
+        
+        project_frame = ttk.Frame(dialog)
+        project_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(project_frame, text="Project (only for WIQL using @project):").pack(side=tk.LEFT)
+        ttk.Entry(project_frame, textvariable=project, width=30).pack(side=tk.LEFT, padx=5)
+        
+        def run():
+            value = text.get('1.0', 'end-1c').strip()
+            if not value:
+                messagebox.showerror("Error", f"Please enter a {mode.get()}", parent=dialog)
+                return
+            if mode.get() == "WIQL Query":
+                query = value
+            elif mode.get() == "Area Path":
+                query = build_wiql_query(area_path=value)
+            else:
+                query = build_wiql_query(iteration_path=value)
+            dialog.destroy()
             
-        # Run in separate thread to avoid freezing UI
-        thread = threading.Thread(target=self._generate_test_cases_thread, args=(work_item_id,))
+            thread = threading.Thread(target=self._generate_query_thread, args=(query, project.get().strip() or None))
+            thread.daemon = True
+            thread.start()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Generate", command=run).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+    
+    def _generate_query_thread(self, query, project):
+        """Thread worker that streams query results page by page through the pipeline"""
+        org_url = self.organization_url.get()
+        client = AdoClient(org_url)
+        
+        def show_progress(totals):
+            self.update_status(f"{totals['items']} work items processed ({totals['failed']} failed) - "
+                               f"{totals['items_per_minute']:.1f} items/min")
+        
+        try:
+            self.generate_btn.config(state=tk.DISABLED)
+            self.query_btn.config(state=tk.DISABLED)
+            self.progress.start(10)
+            self.update_status("Running query...")
+            
+            self.log_message("Starting test case generation for query results")
+            self.log_message(f"  {query}")
+            self.log_message("=" * 60)
+            
+            fields = self.export_fields()
+            export = make_exporter(self.work_item_cache, client, org_url, self.json_dir,
+                                   log=self.log_message, fields=fields)
+            totals = run_paged_pipeline(
+                client.iter_query_id_pages(query, project),
+                export, self._generate_for_pipeline,
+                # Export each page in one batched request before its items are generated
+                prefetch=lambda ids: self.work_item_cache.get_work_items(ids, client, log=self.log_message, fields=fields),
+                on_progress=show_progress,
+                concurrency=self.max_concurrency,
+                log=self.log_message
+            )
+            
+            self.log_message("=" * 60)
+            if totals['failed_ids']:
+                self.log_message(f"Failed work items: {', '.join(map(str, totals['failed_ids']))}", "WARNING")
+            self.log_message(f"Finished {totals['items']} work items in {totals['wall_seconds']:.1f}s "
+                             f"({totals['items_per_minute']:.1f} items/min)", "SUCCESS")
+            self.update_status(f"Completed: {totals['succeeded']} of {totals['items']} work items")
+            
+            if totals['items']:
+                messagebox.showinfo(
+                    "Generation Complete",
+                    f"Generated test cases for {totals['succeeded']} of {totals['items']} work items "
+                    f"in {totals['wall_seconds']:.0f}s ({totals['items_per_minute']:.1f} items/min).\n\n"
+                    f"Output folder: {self.testcases_dir}"
+                )
+            else:
+                messagebox.showwarning("No Work Items", "The query returned no work items.")
+            
+        except AdoError as e:
+            self.log_message(f"Query failed: {str(e)}", "ERROR")
+            messagebox.showerror("Query Failed", str(e))
+            self.update_status("Query failed")
+        except Exception as e:
+            self.log_message(f"Unexpected error: {str(e)}", "ERROR")
+            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.update_status("Error occurred")
+            
+        finally:
+            client.close()
+            self.progress.stop()
+            self.generate_btn.config(state=tk.NORMAL)
+            self.query_btn.config(state=tk.NORMAL)
+        
+    def sync_work_items(self):
+        """Sync the work items changed since the last sync of a project"""
+        project = simpledialog.askstring(
+            "Sync Changes",
+            "Project to sync (only work items changed since the last sync are fetched):",
+            initialvalue=self.sync_project,
+            parent=self.root
+        )
+        if not project or not project.strip():
+            return
+        self.sync_project = project.strip()
+        
+        thread = threading.Thread(target=self._sync_thread, args=(self.sync_project,))
         thread.daemon = True
         thread.start()
+    
+    def _sync_thread(self, project):
+        """Thread worker for incremental sync"""
+        client = AdoClient(self.organization_url.get())
         
+        try:
+            self.sync_btn.config(state=tk.DISABLED)
+            self.progress.start(10)
+            self.update_status(f"Syncing changed work items in {project}...")
+            
+            result = sync_changed_work_items(
+                client, self.work_item_cache, self.suite_store, project,
+                fields=self.export_fields(), log=self.log_message
+            )
+            self.update_status(f"Sync complete: {result['updated']} work items updated")
+            
+            flagged = [item['work_item_id'] for item in self.suite_store.flagged_work_items() if item['has_suite']]
+            if flagged and self.api_key.get().strip():
+                if messagebox.askyesno(
+                    "Acceptance Criteria Changed",
+                    f"{len(flagged)} work item(s) with existing test suites changed their acceptance criteria:\n"
+                    f"{', '.join(map(str, flagged))}\n\n"
+                    "Regenerate their test suites now?"
+                ):
+                    self.root.after(0, lambda: threading.Thread(
+                        target=self._generate_many_thread, args=(flagged,), daemon=True
+                    ).start())
+            else:
+                messagebox.showinfo(
+                    "Sync Complete",
+                    f"{result['updated']} work item(s) updated.\n"
+                    f"{len(result['flagged'])} flagged for regeneration."
+                )
+            
+        except AdoError as e:
+            self.log_message(f"Sync failed: {str(e)}", "ERROR")
+            messagebox.showerror("Sync Failed", str(e))
+            self.update_status("Sync failed")
+        except Exception as e:
+            self.log_message(f"Unexpected error: {str(e)}", "ERROR")
+            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.update_status("Error occurred")
+            
+        finally:
+            client.close()
+            self.progress.stop()
+            self.sync_btn.config(state=tk.NORMAL)
+    
     def _generate_test_cases_thread(self, work_item_id):
         """Thread worker for generating test cases"""
         try:
@@ -872,9 +1345,32 @@ class TestCaseGeneratorApp:
             self.generate_btn.config(state=tk.NORMAL)
             
     def export_work_item(self, work_item_id):
-        """Export work item from Azure DevOps"""
+        """Export work item from Azure DevOps, reusing the cached copy when its revision is unchanged"""
         self.log_message(f"Step 1: Exporting work item {work_item_id} from Azure DevOps...")
         
+        output_file = os.path.join(self.json_dir, f"PBI-{work_item_id}.json")
+        client = AdoClient(self.organization_url.get())
+        
+        try:
+            work_item = self.work_item_cache.get_work_item(work_item_id, client, log=self.log_message,
+                                                           fields=self.export_fields())
+        except AdoError as e:
+            self.log_message(f"Work item cache unavailable ({str(e)}) - exporting with Azure CLI", "WARNING")
+            return self.export_work_item_with_az_cli(work_item_id)
+        finally:
+            client.close()
+        
+        if not work_item:
+            self.log_message(f"Error: Work item {work_item_id} was not found", "ERROR")
+            messagebox.showerror("Export Failed", f"Work item {work_item_id} was not found or you do not have access to it.")
+            self.update_status("Export failed")
+            return False
+        
+        self.log_message(f"✓ Work item exported to: {output_file}", "SUCCESS")
+        return True
+    
+    def export_work_item_with_az_cli(self, work_item_id):
+        """Export work item from Azure DevOps with the Azure CLI"""
         workspace = self.workspace_path.get()
         org_url = self.organization_url.get()
         output_file = os.path.join(self.json_dir, f"PBI-{work_item_id}.json")
@@ -940,6 +1436,57 @@ class TestCaseGeneratorApp:
             self.update_status("Export failed")
             return False
             
+    def bulk_export_work_items(self):
+        """Export several work items at once through the Azure DevOps batch API"""
+        try:
+            work_item_ids = parse_work_item_ids(self.work_item_id.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
+        if not work_item_ids:
+            messagebox.showerror("Error", "Please enter one or more Work Item IDs")
+            return
+        
+        thread = threading.Thread(target=self._bulk_export_thread, args=(work_item_ids,))
+        thread.daemon = True
+        thread.start()
+    
+    def _bulk_export_thread(self, work_item_ids):
+        """Thread worker for bulk export"""
+        client = AdoClient(self.organization_url.get())
+        try:
+            self.bulk_export_btn.config(state=tk.DISABLED)
+            self.progress.start(10)
+            self.update_status(f"Exporting {len(work_item_ids)} work item(s)...")
+            
+            self.log_message(f"Starting bulk export of {len(work_item_ids)} work item(s)")
+            self.log_message("=" * 60)
+            
+            exported = export_work_items(client, work_item_ids, self.json_dir, log=self.log_message,
+                                         fields=self.export_fields(), cache=self.work_item_cache)
+            
+            self.log_message("=" * 60)
+            self.update_status(f"Exported {len(exported)} of {len(work_item_ids)} work item(s)")
+            messagebox.showinfo(
+                "Bulk Export Complete",
+                f"Exported {len(exported)} of {len(work_item_ids)} work item(s) to:\n{self.json_dir}"
+            )
+            
+        except AdoError as e:
+            self.log_message(f"Bulk export failed: {str(e)}", "ERROR")
+            messagebox.showerror("Export Failed", f"Bulk export failed:\n{str(e)}")
+            self.update_status("Export failed")
+        except Exception as e:
+            self.log_message(f"Error during bulk export: {str(e)}", "ERROR")
+            messagebox.showerror("Error", f"Bulk export failed:\n{str(e)}")
+            self.update_status("Export failed")
+            
+        finally:
+            client.close()
+            self.progress.stop()
+            self.bulk_export_btn.config(state=tk.NORMAL)
+    
     def generate_csv_from_json(self, work_item_id):
         """Generate CSV test cases from JSON"""
         self.log_message(f"Step 2: Generating test cases CSV...")
@@ -1001,36 +1548,14 @@ class TestCaseGeneratorApp:
         
         return True
     
-    def generate_with_ai(self, work_item_data, template_file, output_file, work_item_id):
+    def generate_with_ai(self, work_item_data, template_file, output_file, work_item_id, show_viewer=True):
         """Generate test cases using AI"""
         try:
-            # Check if openai package is available
-            try:
-                import openai
-            except ImportError:
-                self.log_message("Installing openai package...", "INFO")
-                subprocess.run([sys.executable, "-m", "pip", "install", "openai"], 
-                             check=True, capture_output=True)
-                import openai
-            
-            # Set API key and client based on provider
+            # Set API key and client based on provider (clients are pooled and keep their connections)
             api_key = self.api_key.get().strip()
             provider = self.ai_provider.get()
-            
-            if provider == "github":
-                # Use GitHub Models
-                client = openai.OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-                model = self.selected_model
-            elif provider == "openai":
-                client = openai.OpenAI(api_key=api_key)
-                model = self.selected_model
-            else:  # azure
-                # For Azure OpenAI, user would need to provide endpoint
-                client = openai.OpenAI(api_key=api_key)
-                model = self.selected_model
+            client = get_client_pool().get(provider, api_key, log=self.log_message)
+            model = self.selected_model
             
             # Read template to understand the format
             template_content = ""
@@ -1040,32 +1565,64 @@ class TestCaseGeneratorApp:
             
             # Extract key information from work item
             fields = work_item_data.get('fields', {})
+            # Rich-text fields are compacted to text; markup and boilerplate only cost tokens
             title = fields.get('System.Title', '')
-            description = fields.get('System.Description', '')
-            acceptance_criteria = fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', '')
-            developer_notes = fields.get('Custom.DeveloperNotes', '') or fields.get('Microsoft.VSTS.TCM.ReproSteps', '')
+            compacted = compact_prompt_fields({
+                'acceptance_criteria': fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', ''),
+                'description': fields.get('System.Description', ''),
+                'developer_notes': fields.get('Custom.DeveloperNotes', '') or fields.get('Microsoft.VSTS.TCM.ReproSteps', '')
+            }, log=self.log_message)
+            description = compacted['description']
+            acceptance_criteria = compacted['acceptance_criteria']
+            developer_notes = compacted['developer_notes']
             work_item_type = fields.get('System.WorkItemType', 'PBI')
             
+            related_context = self.get_related_context(work_item_data) if self.include_related.get() else ""
+            
             # Build the prompt
             prompt = self.build_test_case_prompt(
                 work_item_id, title, description, acceptance_criteria, 
-                developer_notes, template_content, work_item_type
+                developer_notes, template_content, work_item_type, related_context
             )
             
+            # Screenshots pasted into the work item, served from the blob cache after the first run
+            images = []
+            if self.include_images.get():
+                if supports_vision(model):
+                    images = self.get_embedded_images(work_item_data)
+                else:
+                    self.log_message(f"{model} cannot read images - embedded images are not attached", "WARNING")
+            
+            # Check the prompt against the model's budget before anything is sent
+            budget = prompt_budget(provider, model)
+            prompt_tokens = estimate_tokens(GENERATION_SYSTEM_PROMPT + prompt, model)
+            self.log_message(f"Prompt size: ~{prompt_tokens:,} tokens ({budget:,} available for {model})", "INFO")
+            
             self.log_message(f"Calling {provider.upper()} API...")
             self.log_message("This may take 30-60 seconds...")
             
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert QA test case writer. Generate comprehensive manual test cases in CSV format."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=4000
-            )
-            
-            csv_content = response.choices[0].message.content
+            # Interactive runs stream the answer and show test cases as they arrive
+            on_test_case = None
+            if show_viewer:
+                self.root.after(0, self.open_live_preview)
+                on_test_case = lambda test_case: self.root.after(0, lambda: self.add_live_test_case(test_case))
+            
+            csv_content = None
+            if self.shard_by_cos.get():
+                csv_content = self.generate_by_cos(
+                    client, model, provider, fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', ''),
+                    work_item_id, title, description, developer_notes, template_content, work_item_type,
+                    related_context, images, on_test_case
+                )
+            if csv_content is None:
+                if prompt_tokens > budget:
+                    csv_content = self.generate_in_chunks(
+                        client, model, provider, budget, fields.get('Microsoft.VSTS.Common.AcceptanceCriteria', ''),
+                        work_item_id, title, description, developer_notes, template_content, work_item_type,
+                        related_context, images, on_test_case
+                    )
+                else:
+                    csv_content = self.request_test_cases(client, model, provider, prompt, images, on_test_case)
             
             self.log_message(f"AI Response received (first 200 chars):", "INFO")
             self.log_message(csv_content[:200] if csv_content else "EMPTY", "INFO")
@@ -1157,16 +1714,19 @@ class TestCaseGeneratorApp:
                 self.log_message(f"Error: CSV file was not created!", "ERROR")
                 return False
             
+            self.record_suite(output_file, "generated", work_item_data=work_item_data)
+            
             self.log_message(f"✓ Test cases generated successfully!", "SUCCESS")
             self.log_message(f"Output file: {output_file}", "SUCCESS")
             
-            # Schedule viewer creation on main thread (Tkinter requirement)
-            self.log_message(f"Scheduling viewer creation on main thread", "INFO")
-            self.root.after(0, lambda: self.show_test_case_viewer(output_file))
-            
-            # Schedule screenshot analysis tab on main thread
-            self.log_message(f"Scheduling screenshot tab creation on main thread", "INFO")
-            self.root.after(0, lambda: self.show_screenshot_analysis_tab(output_file))
+            if show_viewer:
+                # Schedule viewer creation on main thread (Tkinter requirement)
+                self.log_message(f"Scheduling viewer creation on main thread", "INFO")
+                self.root.after(0, lambda: self.show_test_case_viewer(output_file))
+                
+                # Schedule screenshot analysis tab on main thread
+                self.log_message(f"Scheduling screenshot tab creation on main thread", "INFO")
+                self.root.after(0, lambda: self.show_screenshot_analysis_tab(output_file))
             
             return True
             
@@ -1175,60 +1735,280 @@ class TestCaseGeneratorApp:
             import traceback
             self.log_message(f"Traceback:\n{traceback.format_exc()}", "ERROR")
             return False
+        finally:
+            if show_viewer:
+                self.root.after(0, self.close_live_preview)
+    
+    def get_related_context(self, work_item_data):
+        """Summarize the parent, children and linked items of a work item for the prompt"""
+        client = AdoClient(self.organization_url.get())
+        try:
+            return build_related_context(work_item_data, self.work_item_cache, client, log=self.log_message)
+        except AdoError as e:
+            self.log_message(f"Could not load related work items ({str(e)}) - continuing without them", "WARNING")
+            return ""
+        finally:
+            client.close()
+    
+    def request_test_cases(self, client, model, provider, prompt, images=None, on_test_case=None, refresh_cache=False):
+        """Send one generation prompt and return the model's answer
+        
+        With `on_test_case` the answer is streamed and the callback gets each
+        test case (see csv_stream) as soon as its rows are complete.
+        `refresh_cache` (or the "ignore cached answers" setting) asks the model
+        again instead of using a cached answer. With structured output the model answers in JSON (see structured_output),
+        which is converted to CSV here.
+        """
+        refresh_cache = refresh_cache or self.refresh_cache.get()
+        structured = self.structured_output.get()
+        if structured:
+            # The JSON shape rides on the prompt too, for models without native structured output
+            prompt += STRUCTURED_INSTRUCTIONS
+        
+        # Mark the static prompt prefix for the provider's prompt cache; embedded images go last
+        image_parts = None
+        if images:
+            image_parts = image_message_parts(images, provider)
+            self.log_message(f"✓ Attached {len(images)} embedded image(s) from the work item", "INFO")
+        user_content = cacheable_prompt(prompt, PROMPT_CACHE_SPLIT, provider, image_parts)
+        
+        messages = [{"role": "user", "content": user_content}]
+        cache_hits = self.response_cache.stats['hits']
+        if structured:
+            answer = complete(client, provider, model, messages, system=GENERATION_SYSTEM_PROMPT,
+                              temperature=0.7, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, cache=self.response_cache,
+                              refresh=refresh_cache, response_schema=TEST_SUITE_SCHEMA,
+                              on_usage=self.log_token_usage, validate=parse_structured_suite)
+            self.log_cache_hit(cache_hits)
+            csv_content, test_cases = structured_answer_to_csv(answer)
+            self.log_message(f"✓ Structured answer converted to CSV ({test_cases} test cases)", "SUCCESS")
+            if on_test_case:
+                # Fill the live preview in one go; JSON answers are not streamed
+                read_streamed_answer([csv_content], on_test_case)
+            return csv_content
+        
+        if not on_test_case:
+            answer = complete(client, provider, model, messages, system=GENERATION_SYSTEM_PROMPT,
+                              temperature=0.7, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, cache=self.response_cache,
+                              refresh=refresh_cache, on_usage=self.log_token_usage)
+            self.log_cache_hit(cache_hits)
+            return answer
+        
+        started = datetime.now()
+        streamed = []
+        
+        def report(test_case):
+            if not streamed:
+                elapsed = (datetime.now() - started).total_seconds()
+                self.log_message(f"First test case streamed in after {elapsed:.1f}s", "INFO")
+            streamed.append(test_case)
+            on_test_case(test_case)
+        
+        answer = read_streamed_answer(
+            stream_complete(client, provider, model, messages, system=GENERATION_SYSTEM_PROMPT,
+                            temperature=0.7, max_tokens=DEFAULT_MAX_OUTPUT_TOKENS, cache=self.response_cache,
+                            refresh=refresh_cache, on_usage=self.log_token_usage),
+            report
+        )
+        self.log_cache_hit(cache_hits)
+        return answer
+    
+    def log_token_usage(self, usage):
+        """Log the tokens of an answered request and how many prompt tokens the provider served from its cache"""
+        if not usage:
+            return
+        message = f"Tokens: {usage['input_tokens']:,} in / {usage['output_tokens']:,} out"
+        if usage['cached_tokens']:
+            message += f" - {usage['cached_tokens']:,} prompt tokens read from the provider's prompt cache"
+        if usage['cache_write_tokens']:
+            message += f" - {usage['cache_write_tokens']:,} prompt tokens written to the prompt cache"
+        self.log_message(message, "INFO")
+    
+    def clear_response_cache(self):
+        """Delete every cached AI answer after confirmation"""
+        summary = self.response_cache.summary()
+        if not summary['entries']:
+            messagebox.showinfo("Cached Answers", "There are no cached AI answers.")
+            return
+        if not messagebox.askyesno(
+            "Clear Cached Answers",
+            f"Delete {summary['entries']} cached AI answer(s) ({summary['bytes'] / 1024 / 1024:.1f} MB)?\n\n"
+            f"The next generation of each work item will call the model again."
+        ):
+            return
+        self.response_cache.clear()
+        self.log_message(f"✓ Cleared {summary['entries']} cached AI answer(s)", "SUCCESS")
+    
+    def log_cache_hit(self, hits_before):
+        """Log when the last AI call was answered from the response cache"""
+        if self.response_cache.stats['hits'] > hits_before:
+            self.log_message("✓ Same prompt answered before - using the cached response (no API call)", "SUCCESS")
+    
+    def generate_in_chunks(self, client, model, provider, budget, raw_acceptance_criteria, work_item_id, title,
+                           description, developer_notes, template_content, work_item_type, related_context, images,
+                           on_test_case=None):
+        """Generate an oversized work item one chunk of acceptance criteria at a time and merge the suites"""
+        criteria = cos_items(raw_acceptance_criteria)
+        
+        def prompt_for(description, acceptance_criteria):
+            return self.build_test_case_prompt(
+                work_item_id, title, description, acceptance_criteria,
+                developer_notes, template_content, work_item_type, related_context
+            )
+        
+        # Size of everything except the criteria
+        base_tokens = estimate_tokens(GENERATION_SYSTEM_PROMPT + prompt_for(description, ""), model)
+        if base_tokens + MIN_CRITERIA_TOKENS > budget:
+            # The description alone nearly fills the budget - shorten it so the criteria still fit
+            keep = max(estimate_tokens(description, model) - (base_tokens + MIN_CRITERIA_TOKENS - budget), 0)
+            description = truncate_to_tokens(description, keep, model)
+            self.log_message(f"Description shortened to ~{keep:,} tokens to fit the {model} budget", "WARNING")
+            base_tokens = budget - MIN_CRITERIA_TOKENS
+        
+        chunks = chunk_criteria(criteria, budget - base_tokens, model) or [[]]
+        self.log_message(f"Work item exceeds the {budget:,}-token prompt budget of {model} - generating in {len(chunks)} part(s)", "WARNING")
+        
+        parts = []
+        for part, chunk in enumerate(chunks, 1):
+            acceptance_criteria = ""
+            if chunk:
+                acceptance_criteria = format_criteria_chunk(chunk, part, len(chunks))
+                self.log_message(f"Generating part {part}/{len(chunks)} (COS {chunk[0][0]}-{chunk[-1][0]})...")
+            # Images go with the first part only; they would count against every part's budget
+            parts.append(self.request_test_cases(client, model, provider, prompt_for(description, acceptance_criteria),
+                                                 images if part == 1 else None, on_test_case))
+        
+        merged = merge_suites(parts)
+        self.log_message(f"✓ Merged {len(parts)} part(s) into one suite", "SUCCESS")
+        return merged
+    
+    def generate_by_cos(self, client, model, provider, raw_acceptance_criteria, work_item_id, title, description,
+                        developer_notes, template_content, work_item_type, related_context, images,
+                        on_test_case=None):
+        """Generate test cases one COS at a time in concurrent requests and merge them in COS order
+        
+        Returns None when the acceptance criteria have no COS items to shard by.
+        """
+        criteria = self.parse_cos_from_acceptance_criteria(raw_acceptance_criteria)
+        if not criteria or work_item_type == "Bug":
+            self.log_message("No COS items to shard by - generating in a single request", "INFO")
+            return None
+        
+        shards = shard_criteria(criteria)
+        
+        def generate_shard(index):
+            shard = shards[index]
+            number = shard[0][0]
+            prompt = self.build_test_case_prompt(
+                work_item_id, title, description, format_criteria_chunk(shard, index + 1, len(shards)),
+                developer_notes, template_content, work_item_type, related_context
+            )
+            refresh = False
+            for attempt in range(2):
+                try:
+                    # Images go with the first shard only, as with chunked generation
+                    answer = self.request_test_cases(client, model, provider, prompt,
+                                                     images if index == 0 else None, on_test_case, refresh)
+                except Exception as e:
+                    self.log_message(f"COS {number}: generation failed: {str(e)}", "WARNING")
+                    return None
+                answer, test_cases = tag_cos_references(answer, [n for n, _ in shard])
+                if test_cases:
+                    return answer
+                # An empty answer is not worth keeping in the response cache
+                refresh = True
+            self.log_message(f"COS {number}: no test cases returned", "WARNING")
+            return None
+        
+        self.log_message(f"Sharding by COS: {len(criteria)} COS in parallel requests...")
+        started = datetime.now()
+        with ThreadPoolExecutor(max_workers=min(COS_SHARD_CONCURRENCY, len(shards))) as executor:
+            results = list(executor.map(generate_shard, range(len(shards))))
+        
+        parts = [part for part in results if part]
+        if not parts:
+            raise RuntimeError("No COS shard produced test cases")
+        missing = [shard[0][0] for shard, part in zip(shards, results) if not part]
+        if missing:
+            self.log_message(f"COS without test cases: {', '.join(map(str, missing))}", "WARNING")
+        
+        merged = merge_suites(parts)
+        elapsed = (datetime.now() - started).total_seconds()
+        self.log_message(f"✓ Merged {len(parts)} COS shard(s) in {elapsed:.1f}s - "
+                         f"{len(criteria) - len(missing)}/{len(criteria)} COS covered", "SUCCESS")
+        return merged
+    
+    def get_embedded_images(self, work_item_data):
+        """Images embedded in the work item, downloaded once and then served from the blob cache"""
+        client = AdoClient(self.organization_url.get())
+        try:
+            return get_work_item_images(work_item_data, self.image_cache, client, log=self.log_message)
+        except OSError as e:
+            self.log_message(f"Could not cache embedded images ({str(e)}) - continuing without them", "WARNING")
+            return []
+        finally:
+            client.close()
     
     def build_test_case_prompt(self, work_item_id, title, description, acceptance_criteria, 
-                               developer_notes, template_content, work_item_type):
+                               developer_notes, template_content, work_item_type, related_context=""):
         """Build the prompt for AI test case generation"""
         
-        prompt = f"""Generate manual test cases for this Azure DevOps work item in CSV format.
-
-WORK ITEM DETAILS:
-ID: {work_item_id}
-Type: {work_item_type}
-Title: {title}
-
-Description:
-{description}
-
-Acceptance Criteria:
-{acceptance_criteria}
-
-Developer Notes (CRITICAL - must be covered by tests):
-{developer_notes}
-
-CSV TEMPLATE FORMAT - FOLLOW THIS EXACTLY:
-{template_content}
-
-CRITICAL FORMAT RULES:
-1. Header row MUST be: Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference
-2. Each Test Case is ONE row with: "Test Case" in column 1, full title in column 2, empty columns 3-5, COS number/text in column 6
-3. Each Step is a SEPARATE row with: empty column 1, empty column 2, step number in column 3, action in column 4, expected result in column 5, empty column 6
-4. COS Reference: For each test case, include which Condition of Satisfaction (COS) it addresses. Use "COS 1", "COS 2", etc. based on the numbered/bulleted list in Acceptance Criteria
-5. Example structure (EXACTLY 6 columns per row, NO trailing commas):
-   Test Case,FUNC-01: Test Name,,,, COS 1
-   , ,1,Do action 1,Expected result 1,
-   , ,2,Do action 2,Expected result 2,
-   Test Case,FUNC-02: Another Test,,,,COS 2
-   , ,1,Do action,Expected result,
-
-CONTENT REQUIREMENTS:
-1. Test Case Titles: Use prefixes FUNC-XX (Functional), VAL-XX (Validation), UI-XX (UI), NEG-XX (Negative), REG-XX (Regression)
-2. Do NOT include the PBI/Bug number in titles
-3. NO COMMAS inside any text field (use semicolons or dashes instead)
-4. Keep steps clear and actionable
-5. Each step must have a specific expected result
-6. EVERY test case MUST have a COS Reference indicating which Acceptance Criteria item it addresses
-7. Create at least one test case for EACH Condition of Satisfaction in the Acceptance Criteria
-8. Cover all aspects: Functional, Validation, UI, Negative, and Regression scenarios
-9. Pay special attention to Developer Notes - test what was actually implemented
-
-OUTPUT FORMAT:
-IMPORTANT: Return ONLY the CSV data - NO explanatory text, NO markdown formatting, NO notes.
-Start directly with the header row: Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference
-Do NOT include phrases like "Here is the CSV" or notes at the end.
-Just return pure CSV data that can be parsed directly.
-"""
-        return prompt
+        return PROMPT_TEMPLATE.format(
+            work_item_id=work_item_id, work_item_type=work_item_type, title=title, description=description,
+            acceptance_criteria=acceptance_criteria, developer_notes=developer_notes,
+            template_content=template_content, related_context=related_context or "None"
+        )
+    
+    def open_live_preview(self):
+        """Open a read-only tab that fills with test cases while the answer streams in"""
+        self.close_live_preview()
+        self.live_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.live_tab, text="⏳ Generating...")
+        
+        self.live_status = ttk.Label(self.live_tab, text="Waiting for the first test case...",
+                                     font=("Arial", 10, "italic"), padding="10")
+        self.live_status.pack(fill=tk.X)
+        
+        container = ttk.Frame(self.live_tab)
+        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        vsb = ttk.Scrollbar(container, orient="vertical")
+        self.live_tree = ttk.Treeview(container, yscrollcommand=vsb.set, selectmode='none', show='headings')
+        vsb.config(command=self.live_tree.yview)
+        self.live_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.live_tree.tag_configure('testcase', background='#e3f2fd', font=('Arial', 9, 'bold'))
+        self.live_count = 0
+        
+        self.notebook.select(self.live_tab)
+    
+    def add_live_test_case(self, test_case):
+        """Append one streamed test case to the live preview"""
+        if not self.live_tree:
+            return
+        header = test_case['header']
+        if not self.live_tree['columns']:
+            self.live_tree['columns'] = header
+            for col in header:
+                self.live_tree.heading(col, text=col)
+                self.live_tree.column(col, width=300 if col in ("Title", "Step Action", "Step Expected") else 100)
+        
+        for index, row in enumerate(test_case['rows']):
+            values = (row + [''] * len(header))[:len(header)]
+            self.live_tree.insert('', tk.END, values=values, tags=('testcase',) if index == 0 else ())
+        self.live_tree.yview_moveto(1.0)
+        
+        self.live_count += 1
+        self.live_status.config(text=f"{self.live_count} test case(s) so far - latest: {test_case['title']}")
+    
+    def close_live_preview(self):
+        """Remove the live preview tab once the generated suite is saved or generation failed"""
+        if self.live_tab:
+            try:
+                self.notebook.forget(self.live_tab)
+            except tk.TclError:
+                pass
+        self.live_tab = None
+        self.live_tree = None
     
     def show_test_case_viewer(self, csv_file):
         """Display generated test cases in a viewer tab"""
@@ -1660,6 +2440,7 @@ Just return pure CSV data that can be parsed directly.
             
             self.csv_modified = False
             self.modified_label.config(text="✓ Saved")
+            self.record_suite(self.current_csv_file, "edited")
             messagebox.showinfo("Success", "Changes saved successfully!")
             
             self.log_message(f"✓ Changes saved to: {self.current_csv_file}", "SUCCESS")
@@ -1918,66 +2699,8 @@ Just return pure CSV data that can be parsed directly.
     
     def parse_cos_from_acceptance_criteria(self, acceptance_criteria):
         """Parse Conditions of Satisfaction from acceptance criteria text"""
-        if not acceptance_criteria:
-            return []
-        
-        cos_list = []
-        import re
-        
-        # First, try to extract list items from HTML if present
-        if '<li>' in acceptance_criteria or '<LI>' in acceptance_criteria:
-            # Extract text from <li> tags, but handle nested lists
-            li_pattern = r'<li[^>]*>(.*?)</li>'
-            li_matches = re.findall(li_pattern, acceptance_criteria, re.IGNORECASE | re.DOTALL)
-            for item in li_matches:
-                # Check if this item contains nested <ul> or <ol> tags
-                has_nested_list = '<ul>' in item.lower() or '<ol>' in item.lower()
-                
-                if has_nested_list:
-                    # Extract the main text before the nested list
-                    main_text_pattern = r'^(.*?)(?:<ul>|<ol>)'
-                    main_match = re.search(main_text_pattern, item, re.IGNORECASE | re.DOTALL)
-                    if main_match:
-                        clean_item = re.sub(r'<[^>]+>', '', main_match.group(1)).strip()
-                        if clean_item:
-                            cos_list.append(clean_item)
-                else:
-                    # Remove remaining HTML tags from the item
-                    clean_item = re.sub(r'<[^>]+>', '', item).strip()
-                    # Skip very short items that are likely sub-bullets (like "SSM" or "SSM Types")
-                    # unless they contain meaningful context words
-                    if clean_item and (len(clean_item) > 30 or any(word in clean_item.lower() for word in ['verify', 'ensure', 'check', 'test', 'should', 'must', 'user', 'system'])):
-                        cos_list.append(clean_item)
-        
-        # If we found items from HTML lists, return them
-        if cos_list:
-            return cos_list
-        
-        # Otherwise, parse plain text
-        # Remove HTML tags
-        clean_text = re.sub(r'<[^>]+>', '', acceptance_criteria)
-        
-        # Split by newlines and process each line
-        lines = clean_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Look for numbered or bulleted items
-            # Patterns: 1. , 1) , - , * , • , etc.
-            cos_pattern = r'^(?:\d+[\.)]|[-*•]|\[[xX\s]\])\s*(.+)$'
-            match = re.match(cos_pattern, line)
-            
-            if match:
-                cos_list.append(match.group(1).strip())
-            elif len(line) > 20:  # Standalone sentence/requirement
-                # Could be a COS if it's substantial
-                if any(keyword in line.lower() for keyword in ['should', 'must', 'shall', 'will', 'can', 'user', 'system', 'given', 'when', 'then', 'verify']):
-                    cos_list.append(line)
-        
-        return cos_list
+        # Top-level list items, or bulleted / requirement-like lines for plain text
+        return cos_items(acceptance_criteria)
     
     def find_tests_for_cos(self, cos_index, test_cases):
         """Find which test cases address this COS by reading the COS Reference column"""
@@ -2072,26 +2795,8 @@ Just return pure CSV data that can be parsed directly.
             
             self.log_message(f"Initializing {provider.upper()} AI...")
             
-            try:
-                from openai import OpenAI
-            except ImportError:
-                self.log_message("Error: openai package not installed", "ERROR")
-                messagebox.showerror("Missing Package", "Please install: pip install openai")
-                return False
-            
-            # Use appropriate model
-            if provider == "github":
-                client = OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-                model = self.selected_model
-            elif provider == "openai":
-                client = OpenAI(api_key=api_key)
-                model = self.selected_model
-            else:  # azure
-                client = OpenAI(api_key=api_key)
-                model = self.selected_model
+            client = get_client_pool().get(provider, api_key, log=self.log_message)
+            model = self.selected_model
             
             # Build list of missing COS with numbers
             missing_cos_text = "\n".join(f"COS {cos_num}: {cos_text}" for cos_num, cos_text in missing_cos)
@@ -2130,18 +2835,12 @@ Return ONLY the CSV content for the NEW test cases."""
             self.log_message(f"Generating test cases for {len(missing_cos)} missing COS...")
             self.log_message("This may take 30-60 seconds...")
             
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert QA analyst who creates targeted test cases for missing coverage."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=4000
+            new_tests_csv = complete(
+                client, provider, model, [{"role": "user", "content": prompt}],
+                system="You are an expert QA analyst who creates targeted test cases for missing coverage.",
+                temperature=0.7, max_tokens=4000, cache=self.response_cache
             )
             
-            new_tests_csv = response.choices[0].message.content
-            
             # Clean up response
             if "```" in new_tests_csv:
                 parts = new_tests_csv.split("```")
@@ -2159,7 +2858,6 @@ Return ONLY the CSV content for the NEW test cases."""
             
             # Backup original
             backup_file = csv_file.replace(".csv", "_before_missing_cos.csv")
-            import shutil
             shutil.copy(csv_file, backup_file)
             self.log_message(f"Backup saved: {backup_file}", "INFO")
             
@@ -2169,6 +2867,10 @@ Return ONLY the CSV content for the NEW test cases."""
                     f.write('\n')
                 f.write(new_tests_csv)
             
+            self.record_suite(csv_file, "refined",
+                              prompt=f"Add test cases for missing COS:\n{missing_cos_text}",
+                              summary=f"Added test cases for {len(missing_cos)} missing COS")
+            
             self.log_message(f"✓ Added test cases for {len(missing_cos)} missing COS!", "SUCCESS")
             self.log_message(f"Updated file: {csv_file}", "SUCCESS")
             
@@ -2551,26 +3253,8 @@ Return ONLY the CSV content for the NEW test cases."""
             
             self.log_message(f"Initializing {provider.upper()} AI...")
             
-            try:
-                from openai import OpenAI
-            except ImportError:
-                self.log_message("Error: openai package not installed", "ERROR")
-                messagebox.showerror("Missing Package", "Please install: pip install openai")
-                return False
-            
-            # Use appropriate model
-            if provider == "github":
-                client = OpenAI(
-                    base_url="https://models.inference.ai.azure.com",
-                    api_key=api_key
-                )
-                model = self.selected_model
-            elif provider == "openai":
-                client = OpenAI(api_key=api_key)
-                model = self.selected_model
-            else:  # azure
-                client = OpenAI(api_key=api_key)
-                model = self.selected_model
+            client = get_client_pool().get(provider, api_key, log=self.log_message)
+            model = self.selected_model
             
             # Build prompt for enhancement
             prompt = f"""You are a QA expert analyzing test cases and a screenshot together.
@@ -2613,29 +3297,24 @@ Then provide the complete updated CSV:
             self.log_message("This may take 30-60 seconds...")
             
             # Make API call with vision
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert QA analyst who enhances test cases based on screenshot analysis."},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{screenshot_base64}"
-                                }
+            response_content = complete(
+                client, provider, model,
+                [{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/png;base64,{screenshot_base64}"
                             }
-                        ]
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=4000
+                        }
+                    ]
+                }],
+                system="You are an expert QA analyst who enhances test cases based on screenshot analysis.",
+                temperature=0.7, max_tokens=4000
             )
             
-            response_content = response.choices[0].message.content
-            
             # Parse summary and CSV from response
             summary = "No summary provided"
             csv_content = response_content
@@ -2681,6 +3360,8 @@ Then provide the complete updated CSV:
                 writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
                 writer.writerows(rows)
             
+            self.record_suite(csv_file, "refined", prompt="Enhance test cases from screenshot analysis", summary=summary)
+            
             self.log_message("✓ Test cases enhanced with screenshot analysis!", "SUCCESS")
             self.log_message(f"Updated file: {csv_file}", "SUCCESS")
             
@@ -0,0 +1,138 @@
+"""
+Token budget estimation for prompts
+Estimates prompt size per model family and splits acceptance criteria that do not fit into chunks
+"""
+
+import re
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# (model name pattern, characters per token, context window in tokens); first match wins
+MODEL_FAMILIES = [
+    (r'gpt-4\.1', 4.0, 1047576),
+    (r'gpt-4o|gpt-4-turbo|gpt-4-vision', 4.0, 128000),
+    (r'gpt-4-32k', 4.0, 32768),
+    (r'gpt-4', 4.0, 8192),
+    (r'gpt-3\.5', 4.0, 16385),
+    (r'^o[134]\b|^o[134]-', 4.0, 128000),
+    (r'claude', 3.5, 200000),
+    (r'codestral', 3.5, 32000),
+    (r'mistral|ministral', 3.5, 128000),
+    (r'llama', 3.8, 128000),
+    (r'phi-', 3.8, 128000),
+    (r'deepseek', 3.8, 64000),
+    (r'cohere|command', 4.0, 128000),
+    (r'jamba|ai21', 4.0, 256000)
+]
+# Unknown models: assume a small window and a conservative ratio
+DEFAULT_CHARS_PER_TOKEN = 3.5
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Per-request input caps some providers apply below the model's own window
+# (GitHub Models allows 8,000 input tokens per request on the free tier)
+PROVIDER_INPUT_LIMITS = {
+    'github': 8000
+}
+
+DEFAULT_MAX_OUTPUT_TOKENS = 4000
+# Estimates are approximate, so keep this share of the budget in reserve
+SAFETY_MARGIN = 0.1
+
+_OPENAI_RE = re.compile(r'gpt-|^o[134]\b|^o[134]-', re.IGNORECASE)
+_encodings = {}
+
+
+def model_family(model):
+    """Return (characters per token, context window) for a model name"""
+    name = (model or '').lower()
+    for pattern, chars_per_token, context_window in MODEL_FAMILIES:
+        if re.search(pattern, name):
+            return chars_per_token, context_window
+    return DEFAULT_CHARS_PER_TOKEN, DEFAULT_CONTEXT_WINDOW
+
+
+def _encoding_for(model):
+    """tiktoken encoding for OpenAI models, or None to use the character estimate"""
+    if not (TIKTOKEN_AVAILABLE and model and _OPENAI_RE.search(model)):
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def estimate_tokens(text, model=None):
+    """Estimate the number of tokens `text` takes for a model
+
+    Uses tiktoken for OpenAI models when it is installed, otherwise the model
+    family's characters-per-token ratio.
+    """
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    chars_per_token, _ = model_family(model)
+    return int(len(text) / chars_per_token) + 1
+
+
+def prompt_budget(provider, model, max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS):
+    """Tokens available for the prompt (system plus user message) in one request"""
+    _, context_window = model_family(model)
+    available = context_window - max_output_tokens
+    if provider in PROVIDER_INPUT_LIMITS:
+        available = min(available, PROVIDER_INPUT_LIMITS[provider])
+    return int(available * (1 - SAFETY_MARGIN))
+
+
+def truncate_to_tokens(text, max_tokens, model=None):
+    """Cut text to about `max_tokens` tokens at a line or word boundary"""
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+    chars_per_token, _ = model_family(model)
+    cut = text[:max(int(max_tokens * chars_per_token), 0)]
+    boundary = max(cut.rfind('\n'), cut.rfind(' '))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary]
+    return cut.rstrip() + " [truncated]"
+
+
+def chunk_criteria(items, available_tokens, model=None):
+    """Split numbered criteria into chunks that each fit `available_tokens`
+
+    `items` are the criteria texts in order; returns lists of (number, text)
+    keeping the original 1-based numbers so COS references stay valid. An item
+    larger than the budget gets a chunk of its own.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for number, text in enumerate(items, 1):
+        tokens = estimate_tokens(f"COS {number}: {text}\n", model)
+        if current and used + tokens > available_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append((number, text))
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def shard_criteria(items, per_shard=1):
+    """Split numbered criteria into shards of `per_shard` items, in the same (number, text) form as chunk_criteria"""
+    numbered = list(enumerate(items, 1))
+    return [numbered[start:start + per_shard] for start in range(0, len(numbered), max(per_shard, 1))]
+
+
+def format_criteria_chunk(chunk, part, parts):
+    """Acceptance criteria text for one chunk of a split work item"""
+    lines = [f"COS {number}: {text}" for number, text in chunk]
+    lines.append(f"(Part {part} of {parts}: write test cases only for the criteria above and keep their COS numbers)")
+    return "\n".join(lines)
@@ -0,0 +1,172 @@
+"""
+Revision-aware local work item cache
+Serves data/json/PBI-<id>.json when System.Rev / System.ChangedDate have not changed
+"""
+
+import json
+import os
+import threading
+import time
+
+from ado_client import save_work_item_json, work_item_json_path
+
+# Fields needed for the cheap revision check
+REVISION_FIELDS = ["System.Id", "System.Rev", "System.ChangedDate"]
+
+DEFAULT_TTL_SECONDS = 300
+INDEX_FILE_NAME = ".cache_index.json"
+
+
+def _covers(cached_fields, fields):
+    """True when a copy exported with `cached_fields` has every field in `fields` (None = all)"""
+    if cached_fields is None:
+        return True
+    return fields is not None and set(fields) <= set(cached_fields)
+
+
+def _revision_of(work_item):
+    """Return (rev, changed_date) for a work item"""
+    fields = work_item.get('fields', {})
+    rev = work_item.get('rev', fields.get('System.Rev'))
+    return rev, fields.get('System.ChangedDate')
+
+
+class WorkItemCache:
+    """Cache of exported work items keyed by ID and revision
+
+    The cache reuses the exported JSON files in data/json. A small index next to
+    them records when each item's revision was last confirmed, so within
+    `ttl_seconds` a cached item is served without any network call. After the
+    TTL one batched revision check decides which items must be re-exported.
+    Items exported with a field projection are only reused for requests that
+    need no more than those fields.
+    """
+
+    def __init__(self, json_dir, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.json_dir = json_dir
+        self.ttl_seconds = ttl_seconds
+        self.index_file = os.path.join(json_dir, INDEX_FILE_NAME)
+        self.stats = {'hits': 0, 'misses': 0, 'revision_checks': 0}
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        try:
+            with open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, indent=2)
+        except OSError:
+            pass  # The index only saves revision checks; losing it is not critical
+
+    def _load_local(self, work_item_id):
+        path = work_item_json_path(self.json_dir, work_item_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _mark_checked(self, work_item, now, fields=None):
+        rev, changed_date = _revision_of(work_item)
+        self._index[str(work_item['id'])] = {
+            'rev': rev,
+            'changed_date': changed_date,
+            'checked_at': now,
+            'fields': fields
+        }
+
+    def peek(self, work_item_id):
+        """Return the locally exported copy of a work item without any revision check, or None"""
+        return self._load_local(work_item_id)
+
+    def update(self, work_items, fields=None):
+        """Save freshly fetched work items and mark their revisions as checked now"""
+        now = time.time()
+        with self._lock:
+            for work_item in work_items:
+                save_work_item_json(work_item, self.json_dir)
+                self._mark_checked(work_item, now, fields)
+            self._save_index()
+
+    def get_work_items(self, ids, client, log=None, fields=None):
+        """Return a dict of work item ID -> work item data, exporting only what changed
+
+        Pass `fields` to export only those fields for items that are not cached.
+        """
+        log = log or (lambda message, level="INFO": None)
+        ids = [int(i) for i in ids]
+        now = time.time()
+
+        results = {}
+        needs_check = {}
+
+        with self._lock:
+            for work_item_id in ids:
+                local = self._load_local(work_item_id)
+                if local is None:
+                    continue
+                entry = self._index.get(str(work_item_id))
+                cached_fields = entry.get('fields') if entry else None
+                if not _covers(cached_fields, fields):
+                    continue
+                fresh = (entry and entry.get('rev') == _revision_of(local)[0]
+                         and now - entry.get('checked_at', 0) < self.ttl_seconds)
+                if fresh:
+                    results[work_item_id] = local
+                else:
+                    needs_check[work_item_id] = local
+
+        # One batched call returns just the revision fields for every stale item
+        if needs_check:
+            self.stats['revision_checks'] += 1
+            remote = {
+                item['id']: _revision_of(item)
+                for item in client.iter_work_items(list(needs_check), fields=REVISION_FIELDS)
+            }
+            with self._lock:
+                for work_item_id, local in needs_check.items():
+                    if remote.get(work_item_id) == _revision_of(local):
+                        entry = self._index.get(str(work_item_id))
+                        results[work_item_id] = local
+                        self._mark_checked(local, now, entry.get('fields') if entry else None)
+
+        hits = [i for i in ids if i in results]
+        misses = [i for i in ids if i not in results]
+
+        if misses:
+            fetched = {item['id']: item for item in client.iter_work_items(misses, fields=fields)}
+            with self._lock:
+                for work_item_id, work_item in fetched.items():
+                    save_work_item_json(work_item, self.json_dir)
+                    self._mark_checked(work_item, now, fields)
+                    results[work_item_id] = work_item
+
+        with self._lock:
+            self._save_index()
+            self.stats['hits'] += len(hits)
+            self.stats['misses'] += len(misses)
+
+        for work_item_id in hits:
+            log(f"Work item cache hit: {work_item_id} (rev {_revision_of(results[work_item_id])[0]})", "INFO")
+        for work_item_id in misses:
+            if work_item_id in results:
+                log(f"Work item cache miss: {work_item_id} exported (rev {_revision_of(results[work_item_id])[0]})", "INFO")
+            else:
+                log(f"Work item {work_item_id} not found or not accessible", "WARNING")
+
+        log(f"Cache stats: {self.stats['hits']} hit(s), {self.stats['misses']} miss(es), "
+            f"{self.stats['revision_checks']} revision check(s)", "INFO")
+
+        return results
+
+    def get_work_item(self, work_item_id, client, log=None, fields=None):
+        """Return a single work item, or None if it does not exist"""
+        return self.get_work_items([work_item_id], client, log, fields=fields).get(int(work_item_id))
@@ -0,0 +1,129 @@
+"""
+Incremental work item sync
+Fetches only the work items changed since the last stored System.ChangedDate watermark
+"""
+
+import argparse
+import os
+import sys
+
+from ado_client import AdoClient, AdoError, BATCH_SIZE, wiql_string
+from suite_store import DB_FILE_NAME, SuiteStore
+from work_item_cache import WorkItemCache
+
+# Fields that make up the acceptance criteria / expected results a suite is generated from
+CRITERIA_FIELDS = [
+    "Microsoft.VSTS.Common.AcceptanceCriteria",
+    "Custom.ExpectedResults",
+    "Microsoft.VSTS.TCM.ReproSteps"
+]
+
+
+def sync_scope(project, area_path=None):
+    """Key the watermark is stored under"""
+    return f"{project}|{area_path or ''}"
+
+
+def build_changed_query(project, watermark=None, area_path=None):
+    """WIQL for the work items in a project (or area path) changed at or after the watermark"""
+    conditions = [f"[System.TeamProject] = {wiql_string(project)}"]
+    if area_path:
+        conditions.append(f"[System.AreaPath] UNDER {wiql_string(area_path)}")
+    if watermark:
+        # >= rather than > so items sharing the watermark's timestamp are not missed
+        conditions.append(f"[System.ChangedDate] >= {wiql_string(watermark)}")
+    return "SELECT [System.Id] FROM WorkItems WHERE " + " AND ".join(conditions)
+
+
+def _criteria_of(work_item):
+    fields = (work_item or {}).get('fields', {})
+    return tuple((fields.get(name) or '').strip() for name in CRITERIA_FIELDS)
+
+
+def sync_changed_work_items(client, cache, store, project, area_path=None, fields=None, log=None,
+                            page_size=BATCH_SIZE):
+    """Update the local mirror with the work items changed since the last sync
+
+    Changed IDs are streamed in pages; each page is fetched in one batched
+    request and written to data/json (same format as export_work_item), the
+    work item cache index and the suite store. Items whose acceptance criteria,
+    expected results or repro steps changed are flagged for regeneration. The
+    first sync of a scope has no watermark and mirrors every item in it.
+
+    Returns a dict with updated, flagged (IDs) and watermark.
+    """
+    log = log or (lambda message, level="INFO": None)
+    scope = sync_scope(project, area_path)
+    watermark = store.get_watermark(scope)
+    query = build_changed_query(project, watermark, area_path)
+
+    if watermark:
+        log(f"Syncing work items changed since {watermark}...")
+    else:
+        log("No sync watermark yet - mirroring every work item in scope (first sync only)...")
+
+    updated = 0
+    flagged = []
+    new_watermark = watermark
+
+    for page in client.iter_query_id_pages(query, project, page_size=page_size, time_precision=True):
+        previous = {work_item_id: store.get_work_item(work_item_id) or cache.peek(work_item_id)
+                    for work_item_id in page}
+        work_items = client.get_work_items(page, fields=fields)
+
+        cache.update(work_items, fields)
+        store.save_work_items(work_items)
+        updated += len(work_items)
+
+        changed = [item['id'] for item in work_items
+                   if previous.get(item['id']) and _criteria_of(previous[item['id']]) != _criteria_of(item)]
+        if changed:
+            store.flag_for_regeneration(changed, "Acceptance criteria changed")
+            flagged.extend(changed)
+
+        for item in work_items:
+            changed_date = item.get('fields', {}).get('System.ChangedDate')
+            # ISO 8601 UTC timestamps compare correctly as strings
+            if changed_date and (new_watermark is None or changed_date > new_watermark):
+                new_watermark = changed_date
+
+        log(f"Synced {updated} work item(s) so far, {len(flagged)} flagged for regeneration")
+
+    if new_watermark:
+        store.set_watermark(scope, new_watermark)
+
+    if flagged:
+        log(f"Acceptance criteria changed for: {', '.join(map(str, flagged))} - regenerate their test suites", "WARNING")
+    log(f"✓ Sync complete: {updated} work item(s) updated, watermark {new_watermark or 'unchanged'}", "SUCCESS")
+
+    return {'updated': updated, 'flagged': flagged, 'watermark': new_watermark}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync work items changed since the last run into data/json")
+    parser.add_argument("--organization", required=True, help="Azure DevOps organization URL")
+    parser.add_argument("--project", required=True, help="Project to sync")
+    parser.add_argument("--area-path", help="Only sync work items under this area path")
+    args = parser.parse_args()
+
+    data_dir = os.path.join(os.getcwd(), 'data')
+    json_dir = os.path.join(data_dir, 'json')
+    os.makedirs(json_dir, exist_ok=True)
+
+    client = AdoClient(args.organization)
+    store = SuiteStore(os.path.join(data_dir, DB_FILE_NAME))
+    try:
+        sync_changed_work_items(
+            client, WorkItemCache(json_dir), store, args.project, args.area_path,
+            log=lambda message, level="INFO": print(f"[{level}] {message}")
+        )
+    except AdoError as e:
+        print(f"[ERROR] {str(e)}")
+        sys.exit(1)
+    finally:
+        client.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Shared test setup
+The app modules import each other as top-level modules, so app/ goes on sys.path
+"""
+
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+
+def make_work_item(work_item_id, rev=1, changed_date="2024-01-01T00:00:00Z", fields=None):
+    """Work item in the batch API's shape, with `fields` added to the System fields"""
+    values = {'System.Id': work_item_id, 'System.Rev': rev, 'System.ChangedDate': changed_date,
+              'System.Title': f"Work item {work_item_id}"}
+    values.update(fields or {})
+    return {'id': work_item_id, 'rev': rev, 'fields': values}
+
+
+class FakeAdoClient:
+    """Stand-in for ado_client.AdoClient serving work items from memory and recording the calls"""
+
+    def __init__(self, work_items=()):
+        self.work_items = {item['id']: item for item in work_items}
+        self.batches = []
+        self.queries = []
+        self.request_count = 0
+
+    def add(self, *work_items):
+        self.work_items.update({item['id']: item for item in work_items})
+
+    def iter_work_items(self, ids, fields=None, expand="Relations"):
+        ids = [int(i) for i in ids]
+        self.batches.append((ids, list(fields) if fields else None))
+        self.request_count += 1
+        for work_item_id in ids:
+            item = self.work_items.get(work_item_id)
+            if item is None:
+                continue
+            if fields:
+                item = dict(item, fields={name: value for name, value in item['fields'].items() if name in fields})
+            yield item
+
+    def get_work_items(self, ids, fields=None, expand="Relations"):
+        return list(self.iter_work_items(ids, fields=fields, expand=expand))
+
+    def iter_query_id_pages(self, query, project=None, page_size=200, time_precision=False):
+        """Match the System.ChangedDate >= condition of a sync query"""
+        self.queries.append(query)
+        match = re.search(r"\[System\.ChangedDate\] >= '([^']*)'", query)
+        ids = sorted(work_item_id for work_item_id, item in self.work_items.items()
+                     if not match or item['fields']['System.ChangedDate'] >= match.group(1))
+        for start in range(0, len(ids), page_size):
+            yield ids[start:start + page_size]
+
+
+@pytest.fixture
+def ado_client():
+    return FakeAdoClient()
@@ -0,0 +1,104 @@
+import re
+
+import pytest
+
+import ado_client
+from ado_client import AdoClient, AdoError, build_wiql_query, parse_work_item_ids
+
+
+class WiqlClient(AdoClient):
+    """AdoClient answering WIQL from a list of IDs; understands `[System.Id] > n` and $top"""
+
+    def __init__(self, ids):
+        super().__init__("https://dev.azure.com/example", token="stand-in")
+        self.ids = sorted(ids)
+        self.wiql = []
+
+    def query_work_item_ids(self, query, project=None, top=None, time_precision=False):
+        self.wiql.append((query, top))
+        match = re.search(r'\[System\.Id\] > (\d+)', query)
+        ids = [i for i in self.ids if not match or i > int(match.group(1))]
+        return ids[:top] if top else ids
+
+
+def pages(client, query, page_size):
+    return list(client.iter_query_id_pages(query, page_size=page_size))
+
+
+def test_parse_work_item_ids():
+    assert parse_work_item_ids("12, #34;12\n56") == [12, 34, 56]
+    with pytest.raises(ValueError):
+        parse_work_item_ids("12, abc")
+
+
+def test_build_wiql_query_quotes_paths():
+    assert build_wiql_query(area_path="Team's Area") == (
+        "SELECT [System.Id] FROM WorkItems WHERE [System.AreaPath] UNDER 'Team''s Area'")
+    with pytest.raises(ValueError):
+        build_wiql_query()
+
+
+def test_keyset_paging_returns_every_id_once():
+    client = WiqlClient(range(1, 8))
+    assert pages(client, build_wiql_query(area_path="Area"), 3) == [[1, 2, 3], [4, 5, 6], [7]]
+    assert [query.split(" WHERE ", 1)[1] for query, _ in client.wiql] == [
+        "([System.AreaPath] UNDER 'Area') AND [System.Id] > 0 ORDER BY [System.Id]",
+        "([System.AreaPath] UNDER 'Area') AND [System.Id] > 3 ORDER BY [System.Id]",
+        "([System.AreaPath] UNDER 'Area') AND [System.Id] > 6 ORDER BY [System.Id]"
+    ]
+    assert {top for _, top in client.wiql} == {3}
+
+
+def test_keyset_paging_of_an_exact_multiple_yields_no_empty_page():
+    client = WiqlClient(range(1, 7))
+    assert pages(client, "SELECT [System.Id] FROM WorkItems", 3) == [[1, 2, 3], [4, 5, 6]]
+    # The last full page needs one more query to see that nothing follows
+    assert len(client.wiql) == 3
+    assert client.wiql[0][0] == "SELECT [System.Id] FROM WorkItems WHERE [System.Id] > 0 ORDER BY [System.Id]"
+
+
+def test_keyset_paging_of_no_results():
+    assert pages(WiqlClient([]), "SELECT [System.Id] FROM WorkItems", 3) == []
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT [System.Id] FROM WorkItems WHERE [System.State] = 'Active' ORDER BY [System.ChangedDate] DESC",
+    "SELECT [System.Id] FROM WorkItems ASOF '2024-01-01'",
+    "SELECT [System.Id] FROM WorkItemLinks WHERE [Source].[System.Id] = 1"
+])
+def test_unpageable_queries_run_once_and_are_split_locally(query):
+    client = WiqlClient(range(1, 6))
+    assert pages(client, query, 2) == [[1, 2], [3, 4], [5]]
+    assert client.wiql == [(query, None)]
+
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.text = ""
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+
+def test_a_rejected_token_calls_the_clients_own_hook(monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(ado_client, "invalidate_az_access_token", lambda: invalidated.append("az"))
+    client = AdoClient("https://dev.azure.com/example", token_getter=lambda: "own",
+                       on_unauthorized=lambda: invalidated.append("own"))
+    client.session.request = lambda *args, **kwargs: Response(401)
+    with pytest.raises(AdoError, match="rejected the access token"):
+        client.field_names()
+    assert invalidated == ["own"]
+
+
+def test_a_custom_token_getter_leaves_the_shared_az_token_alone(monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(ado_client, "invalidate_az_access_token", lambda: invalidated.append("az"))
+    client = AdoClient("https://dev.azure.com/example", token_getter=lambda: "own")
+    client.session.request = lambda *args, **kwargs: Response(203)
+    with pytest.raises(AdoError):
+        client.field_names()
+    assert invalidated == []
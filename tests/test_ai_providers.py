@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ai_providers
+from ai_providers import complete, supports_json_schema, supports_vision
+from response_cache import ResponseCache, cache_key
+
+MESSAGES = [{"role": "user", "content": "Write test cases"}]
+
+
+class FakeOpenAI:
+    """Client with the OpenAI SDK's chat.completions.create, answering from a list"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        self.requests.append(request)
+        message = SimpleNamespace(content=self.answers.pop(0))
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def ask(client, **options):
+    # A small output allowance keeps the shared rate limiter from queueing test calls
+    return complete(client, "openai", "gpt-4o", MESSAGES, max_tokens=10, **options)
+
+
+@pytest.mark.parametrize("model, supported", [
+    ("gpt-4o", True),
+    ("gpt-4o-2024-08-06", True),
+    ("gpt-4o-2024-05-13", False),
+    ("gpt-4o-mini", True),
+    ("openai/gpt-4.1", True),
+    ("o1", True),
+    ("o1-mini", False),
+    ("o1-preview", False),
+    ("gpt-4-turbo", False),
+    ("Mistral-large-2411", False)
+])
+def test_supports_json_schema_uses_the_feature_table(model, supported):
+    assert supports_json_schema("openai", model) is supported
+
+
+def test_supports_json_schema_for_anthropic_depends_on_the_sdk(monkeypatch):
+    monkeypatch.setattr(ai_providers, "_sdk_version", lambda package: (0, 18, 1))
+    assert not supports_json_schema("anthropic", "claude-3-5-sonnet-20241022")
+    monkeypatch.setattr(ai_providers, "_sdk_version", lambda package: (0, 34, 2))
+    assert supports_json_schema("anthropic", "claude-3-5-sonnet-20241022")
+
+
+def test_complete_reports_usage():
+    usage = []
+    assert ask(FakeOpenAI(" Answer "), on_usage=usage.append) == "Answer"
+    assert usage == [{'input_tokens': 10, 'output_tokens': 5, 'cached_tokens': 0, 'cache_write_tokens': 0}]
+
+
+def test_cached_answers_are_served_without_a_request(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    client = FakeOpenAI("First", "Second")
+    assert ask(client, cache=cache) == "First"
+    assert ask(client, cache=cache) == "First"
+    assert len(client.requests) == 1
+    assert (cache.stats['hits'], cache.stats['misses']) == (1, 1)
+
+
+def test_refresh_asks_again_and_replaces_the_answer(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    client = FakeOpenAI("First", "Second")
+    ask(client, cache=cache)
+    assert ask(client, cache=cache, refresh=True) == "Second"
+    assert ask(client, cache=cache) == "Second"
+    assert len(client.requests) == 2
+
+
+def test_answers_that_fail_validation_are_not_cached(tmp_path):
+    def validate(text):
+        if text != "good":
+            raise ValueError("truncated")
+
+    cache = ResponseCache(str(tmp_path))
+    client = FakeOpenAI("bad", "good")
+    with pytest.raises(ValueError):
+        ask(client, cache=cache, validate=validate)
+    assert cache.summary()['entries'] == 0
+    assert ask(client, cache=cache, validate=validate) == "good"
+    assert ask(client, cache=cache, validate=validate) == "good"
+    assert len(client.requests) == 2
+
+
+def test_a_stored_answer_that_fails_validation_is_asked_again(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(cache_key("openai", "gpt-4o", MESSAGES, None, None, 10), "stored before validation", "gpt-4o")
+    client = FakeOpenAI("valid")
+    assert ask(client, cache=cache, validate=lambda text: text == "valid" or int("x")) == "valid"
+    assert len(client.requests) == 1
+
+
+def test_cache_keys_depend_on_every_request_parameter():
+    key = cache_key("openai", "gpt-4o", MESSAGES, "system", 0.2, 100)
+    assert key == cache_key("openai", "gpt-4o", MESSAGES, "system", 0.2, 100)
+    assert key != cache_key("openai", "gpt-4o-mini", MESSAGES, "system", 0.2, 100)
+    assert key != cache_key("openai", "gpt-4o", MESSAGES, "system", 0.3, 100)
+    assert key != cache_key("openai", "gpt-4o", MESSAGES, "system", 0.2, 100, {'name': "suite"})
+
+
+def test_the_cache_evicts_least_recently_used_answers(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=150)
+    cache.put("a", "x" * 40)
+    cache.put("b", "y" * 40)
+    cache.get("a")
+    cache.put("c", "z" * 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 40
+    assert cache.stats['evictions'] == 1
+
+
+def test_structured_requests_send_a_strict_json_schema():
+    schema = {'name': "test_suite", 'description': "Test cases", 'schema': {'type': "object"}}
+    client = FakeOpenAI('{"test_cases": []}')
+    ask(client, response_schema=schema)
+    assert client.requests[0]['response_format'] == {
+        "type": "json_schema", "json_schema": {"name": "test_suite", "schema": {'type': "object"}, "strict": True}}
+
+    client = FakeOpenAI('{"test_cases": []}')
+    complete(client, "openai", "gpt-4o-2024-05-13", MESSAGES, max_tokens=10, response_schema=schema)
+    assert 'response_format' not in client.requests[0]
+
+
+def test_anthropic_structured_requests_force_a_tool_call(monkeypatch):
+    monkeypatch.setattr(ai_providers, "_sdk_version", lambda package: (0, 34, 2))
+    requests = []
+
+    def create(**request):
+        requests.append(request)
+        usage = SimpleNamespace(input_tokens=10, output_tokens=5)
+        return SimpleNamespace(content=[SimpleNamespace(type="tool_use", input={'test_cases': []})], usage=usage)
+
+    client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    schema = {'name': "test_suite", 'description': "Test cases", 'schema': {'type': "object"}}
+    answer = complete(client, "anthropic", "claude-3-5-sonnet-20241022", MESSAGES, system="Be brief", max_tokens=10,
+                      response_schema=schema)
+    assert answer == '{"test_cases": []}'
+    assert requests[0]['tool_choice'] == {"type": "tool", "name": "test_suite"}
+    assert requests[0]['tools'][0]['input_schema'] == {'type': "object"}
+    assert requests[0]['system'] == "Be brief"
+
+
+@pytest.mark.parametrize("model, supported", [
+    ("gpt-4o", True),
+    ("gpt-4.1-mini", True),
+    ("gpt-4-turbo-2024-04-09", True),
+    ("o3-mini", False),
+    ("gpt-4", False),
+    ("claude-3-haiku-20240307", True),
+    ("claude-sonnet-4-20250514", True),
+    ("claude-2.1", False),
+    ("Llama-3.2-11B-Vision-Instruct", True),
+    ("Mistral-large-2411", False)
+])
+def test_supports_vision_uses_the_feature_table(model, supported):
+    assert supports_vision(model) is supported
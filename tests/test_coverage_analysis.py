@@ -0,0 +1,62 @@
+import numpy as np
+
+from coverage_analysis import analyze_coverage, apply_categorization, similarity_matrix
+
+HEADER = "Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference"
+
+CRITERIA = [
+    "COS 1: Users can upload a PDF invoice up to 10 MB",
+    "COS 2: Uploaded invoices are listed with their upload date"
+]
+
+SUITE = f"""{HEADER}
+Test Case,FUNC-01: Upload a PDF invoice,,,,COS 1
+,,1,Upload a 2 MB PDF invoice,The invoice upload succeeds,
+Test Case,FUNC-02: Uploaded invoices are listed with their date,,,,COS 2
+,,1,Open the invoice list,Each uploaded invoice shows its upload date,
+Test Case,NEG-01: Browser back button during checkout,,,,
+,,1,Press back while paying,The cart is kept,"""
+
+
+def test_similarity_matrix_is_cosine_of_tf_idf():
+    scores = similarity_matrix(["upload invoice", "delete account"], ["upload an invoice", "payment"])
+    assert scores.shape == (2, 2)
+    assert np.isclose(scores[0, 0], 1.0)
+    assert scores[1, 0] == 0.0
+    assert similarity_matrix([], ["anything"]).shape == (0, 1)
+
+
+def test_analyze_coverage_sorts_test_cases_by_criterion():
+    coverage = analyze_coverage(SUITE, CRITERIA)
+    assert [(entry['test_title'], entry['addresses'].split(":")[0]) for entry in coverage['direct_coverage']] == [
+        ("FUNC-01: Upload a PDF invoice", "COS 1"),
+        ("FUNC-02: Uploaded invoices are listed with their date", "COS 2")
+    ]
+    assert [entry['test_title'] for entry in coverage['additional_considerations']] == [
+        "NEG-01: Browser back button during checkout"]
+    assert coverage['covered'] == [1, 2] and coverage['uncovered'] == []
+
+
+def test_analyze_coverage_does_not_repeat_the_cos_number():
+    coverage = analyze_coverage(SUITE, CRITERIA)
+    assert coverage['direct_coverage'][0]['addresses'] == "COS 1: Users can upload a PDF invoice up to 10 MB"
+
+
+def test_analyze_coverage_reports_uncovered_criteria():
+    coverage = analyze_coverage(SUITE, CRITERIA + ["COS 3: Admins can export all invoices as CSV"])
+    assert coverage['uncovered'] == [3]
+
+
+def test_analyze_coverage_without_criteria_or_test_cases():
+    assert analyze_coverage(SUITE, [])['direct_coverage'] == []
+    assert analyze_coverage(HEADER, CRITERIA)['uncovered'] == [1, 2]
+
+
+def test_apply_categorization_moves_the_decided_test_cases():
+    coverage = {'direct_coverage': [{'test_title': "A", 'addresses': "COS 1: x"}],
+                'additional_considerations': [{'test_title': "B", 'purpose': "Negative coverage"}],
+                'ambiguous': ["A", "B"], 'covered': [1], 'uncovered': [2]}
+    result = apply_categorization(coverage, {'direct_coverage': [{'test_title': "B", 'addresses': "COS 2"}]})
+    assert [entry['test_title'] for entry in result['direct_coverage']] == ["A", "B"]
+    assert result['additional_considerations'] == []
+    assert result['ambiguous'] == ["A"]
@@ -0,0 +1,38 @@
+from ado_client import AdoError
+from generation_pipeline import run_paged_pipeline, run_pipeline_sync
+
+
+def test_paged_pipeline_falls_back_to_the_exporter_when_prefetch_fails():
+    prefetched = []
+
+    def prefetch(ids):
+        prefetched.append(ids)
+        raise AdoError("Azure DevOps returned 500")
+
+    totals = run_paged_pipeline([[1, 2], [3]], lambda work_item_id: {'id': work_item_id},
+                                lambda work_item_id, work_item: work_item_id, prefetch=prefetch)
+    assert (totals['items'], totals['succeeded'], totals['pages']) == (3, 3, 2)
+    # Prefetch is not tried again after it failed
+    assert prefetched == [[1, 2]]
+
+
+def test_paged_pipeline_counts_failed_items():
+    def export(work_item_id):
+        if work_item_id == 2:
+            raise RuntimeError("not found")
+        return {'id': work_item_id}
+
+    totals = run_paged_pipeline([[1, 2, 3]], export, lambda work_item_id, work_item: work_item_id)
+    assert (totals['succeeded'], totals['failed'], totals['failed_ids']) == (2, 1, [2])
+
+
+def test_pipeline_accepts_coroutine_exports_and_reports_per_item_results():
+    async def export(work_item_id):
+        return {'id': work_item_id}
+
+    seen = []
+    results, summary = run_pipeline_sync([3, 1, 2], export, lambda work_item_id, work_item: f"PBI-{work_item['id']}",
+                                         concurrency=2, on_result=lambda result: seen.append(result['work_item_id']))
+    assert [result['output'] for result in results] == ["PBI-3", "PBI-1", "PBI-2"]
+    assert sorted(seen) == [1, 2, 3]
+    assert (summary['items'], summary['succeeded']) == (3, 3)
@@ -0,0 +1,33 @@
+from model_registry import AVAILABLE, RATE_LIMITED, UNAVAILABLE, UNCHECKED, ModelRegistry, classify_error
+
+
+def test_classify_error():
+    assert classify_error(Exception("Error code: 404 - unknown_model")) == UNAVAILABLE
+    assert classify_error(Exception("Error code: 429 - RateLimitReached")) == RATE_LIMITED
+    assert classify_error(Exception("Connection reset")) == "error"
+
+
+def test_registry_entries_persist_per_key(tmp_path):
+    path = str(tmp_path / "model_registry.json")
+    ModelRegistry(path).update("github", "key-1", {'gpt-4o': AVAILABLE})
+    registry = ModelRegistry(path)
+    assert registry.get("github", "key-1")['models'] == {'gpt-4o': AVAILABLE}
+    assert registry.get("github", "key-2") is None
+    assert "key-1" not in (tmp_path / "model_registry.json").read_text()
+
+
+def test_stale_after_the_ttl(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "model_registry.json"), ttl_seconds=0)
+    registry.update("github", "key", {'gpt-4o': AVAILABLE})
+    assert registry.get("github", "key")['stale']
+
+
+def test_unchecked_models_keep_their_last_status_and_mark_the_entry_stale(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "model_registry.json"))
+    registry.update("github", "key", {'gpt-4o': AVAILABLE, 'Mistral-large-2411': UNAVAILABLE})
+    registry.update("github", "key", {'gpt-4o': RATE_LIMITED, 'Mistral-large-2411': UNCHECKED,
+                                      'Phi-3.5-mini-instruct': UNCHECKED})
+    entry = registry.get("github", "key")
+    assert entry['models'] == {'gpt-4o': RATE_LIMITED, 'Mistral-large-2411': UNAVAILABLE,
+                               'Phi-3.5-mini-instruct': UNCHECKED}
+    assert entry['stale']
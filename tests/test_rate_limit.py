@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limit import RateLimiter, is_retryable, limits_from_environment, parse_rate_limit, retry_after
+
+
+def error(status_code=None, headers=None, message="error"):
+    exception = Exception(message)
+    exception.status_code = status_code
+    exception.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+    return exception
+
+
+def test_parse_rate_limit():
+    assert parse_rate_limit("5000, 800000") == (5000, 800000)
+    assert parse_rate_limit("0,") == (None, None)
+    for text in ("5000", "-1,10", "a,b"):
+        with pytest.raises(ValueError):
+            parse_rate_limit(text)
+
+
+def test_limits_from_environment_ignores_other_and_malformed_variables():
+    environ = {'AI_RATE_LIMIT_OPENAI': "5000,800000", 'AI_RATE_LIMIT_GITHUB': "lots", 'PATH': "/bin"}
+    assert limits_from_environment(environ) == {'openai': (5000, 800000)}
+
+
+def test_calls_within_the_limits_do_not_wait():
+    limiter = RateLimiter({'openai': (3, None)})
+    assert [limiter.acquire("openai", "gpt-4o") for _ in range(3)] == [0, 0, 0]
+    assert limiter.summary()['waits'] == 0
+
+
+def test_limits_are_tracked_per_model():
+    limiter = RateLimiter({'openai': (1, None)})
+    limiter.acquire("openai", "gpt-4o")
+    assert limiter.acquire("openai", "gpt-4o-mini") == 0
+
+
+def test_set_limits_applies_to_existing_buckets(monkeypatch):
+    limiter = RateLimiter({'openai': (1, 1000)})
+    limiter.acquire("openai", "gpt-4o", 1000)
+    limiter.set_limits("openai", 6000, None)
+    assert limiter.limits_for("openai") == (6000, None)
+    # The spent request still counts, but a second one now fits
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    assert limiter.acquire("openai", "gpt-4o", 10 ** 6) < 0.02
+
+
+def test_providers_without_limits_are_not_limited():
+    limiter = RateLimiter({})
+    assert limiter.limits_for("azure") == (None, None)
+    assert limiter.acquire("azure", "gpt-4o", 10 ** 9) == 0
+
+
+def test_retry_after_reads_headers_and_messages():
+    assert retry_after(error(429, {'retry-after-ms': "1500"})) == 1.5
+    assert retry_after(error(429, {'retry-after': "7"})) == 7
+    assert retry_after(error(429, message="Rate limit reached. Please wait 12 seconds")) == 12
+    assert retry_after(error(429)) is None
+
+
+def test_only_throttling_and_server_errors_are_retried():
+    assert is_retryable(error(429)) and is_retryable(error(529)) and is_retryable(error(503))
+    assert not is_retryable(error(400)) and not is_retryable(error(401))
+    assert is_retryable(Exception("RateLimitError: too many requests"))
+
+
+def test_backoff_pauses_the_model_for_retry_after():
+    limiter = RateLimiter({})
+    delay = limiter.backoff("openai", "gpt-4o", error(429, {'retry-after': "2"}), attempt=0)
+    assert 2 <= delay <= 3
+    assert limiter.backoff("openai", "gpt-4o", error(429, {'retry-after': "3600"}), attempt=0) is None
+    assert limiter.backoff("openai", "gpt-4o", error(429), attempt=4, max_retries=4) is None
+    assert limiter.summary()['retries'] == 1
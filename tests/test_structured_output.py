@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+
+import pytest
+
+from structured_output import parse_structured_suite, structured_answer_to_csv, suite_to_csv
+
+SUITE = {'test_cases': [
+    {'title': "FUNC-01: Save a draft, then publish", 'reference': "COS 1",
+     'steps': [{'action': 'Click "Save"', 'expected': "Draft saved, not published"},
+               {'action': "Click Publish", 'expected': "Post is live"}]},
+    {'title': "NEG-01: Publish without a title", 'reference': "COS 2",
+     'steps': [{'action': "Clear the title, click Publish", 'expected': "Title is required"}]}
+]}
+
+
+def rows(csv_content):
+    return list(csv.reader(io.StringIO(csv_content)))
+
+
+def test_parse_accepts_fences_and_text_around_the_json():
+    answer = "Sure:\n```json\n" + json.dumps(SUITE) + "\n```\nLet me know if you need more."
+    assert parse_structured_suite(answer) == SUITE['test_cases']
+
+
+def test_parse_keeps_the_complete_test_cases_of_a_cut_off_answer():
+    text = json.dumps(SUITE)
+    truncated = text[:text.index('"NEG-01') + 20]
+    assert [test_case['title'] for test_case in parse_structured_suite(truncated)] == [
+        "FUNC-01: Save a draft, then publish"]
+
+
+@pytest.mark.parametrize("answer", ["", "Title,Steps\nFUNC-01,x", '{"operations": []}', '{"test_cases": [tru'])
+def test_parse_rejects_answers_without_test_cases(answer):
+    with pytest.raises(ValueError):
+        parse_structured_suite(answer)
+
+
+def test_suite_to_csv_quotes_commas_and_numbers_steps():
+    table = rows(suite_to_csv(SUITE['test_cases']))
+    assert table[0] == ["Work Item Type", "Title", "Test Step", "Step Action", "Step Expected", "COS Reference"]
+    assert table[1] == ["Test Case", "FUNC-01: Save a draft, then publish", "", "", "", "COS 1"]
+    assert table[2] == ["", "", "1", 'Click "Save"', "Draft saved, not published", ""]
+    assert table[3][2] == "2"
+    assert len(table) == 6
+
+
+def test_suite_to_csv_skips_untitled_test_cases_and_renames_the_last_column():
+    table = rows(suite_to_csv([{'title': " ", 'steps': []}, {'title': "UI-01: Logo"}], "Expected Result"))
+    assert table == [["Work Item Type", "Title", "Test Step", "Step Action", "Step Expected", "Expected Result"],
+                     ["Test Case", "UI-01: Logo", "", "", "", ""]]
+
+
+def test_structured_answer_to_csv_counts_test_cases():
+    csv_content, count = structured_answer_to_csv(json.dumps(SUITE))
+    assert count == 2
+    assert csv_content == suite_to_csv(SUITE['test_cases'])
@@ -0,0 +1,63 @@
+from suite_diff import align_test_cases, diff_steps, diff_suites, format_change_summary
+
+HEADER = "Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference"
+
+OLD = f"""{HEADER}
+Test Case,FUNC-01: User can log in,,,,COS 1
+,,1,Open the login page,Login page is shown,
+,,2,Enter valid credentials,User is signed in,
+Test Case,FUNC-02: User can log out,,,,COS 2
+,,1,Click Log out,User is signed out,
+Test Case,UI-01: Logo is shown,,,,COS 3
+,,1,Open the home page,Logo is visible,"""
+
+NEW = f"""{HEADER}
+Test Case,FUNC-01: User can log in,,,,COS 1
+,,1,Open the login page,Login page is shown,
+,,2,Enter valid credentials,User is signed in,
+Test Case,FUNC-02: User can sign out,,,,COS 2
+,,1,Click Log out,User is signed out,
+,,2,Press Back,Login page is shown,
+Test Case,NEG-01: Wrong password is rejected,,,,COS 1
+,,1,Enter a wrong password,An error is shown,"""
+
+
+def steps(*actions):
+    return [{'action': action, 'expected': f"{action} works"} for action in actions]
+
+
+def test_align_matches_renumbered_and_renamed_test_cases():
+    old = [{'title': "FUNC-01: Login"}, {'title': "FUNC-02: Logout"}, {'title': "VAL-01: Email is required"}]
+    new = [{'title': "FUNC-05: Login"}, {'title': "FUNC-02: Sign out"}, {'title': "VAL-01: E-mail is required"}]
+    pairs, removed, added = align_test_cases(old, new)
+    assert pairs == [(0, 0), (1, 1), (2, 2)]
+    assert removed == [] and added == []
+
+
+def test_align_leaves_unrelated_test_cases_unmatched():
+    pairs, removed, added = align_test_cases([{'title': "UI-01: Logo is shown"}],
+                                             [{'title': "NEG-01: Wrong password is rejected"}])
+    assert pairs == [] and removed == [0] and added == [0]
+
+
+def test_diff_steps_names_changed_added_and_removed_steps():
+    assert diff_steps(steps("a", "b", "c"), steps("a", "B", "c", "d", "e")) == ["step 2 changed", "steps 4-5 added"]
+    assert diff_steps(steps("a", "b", "c"), steps("a")) == ["steps 2-3 removed"]
+    assert diff_steps(steps("a", "b"), steps("a", "X", "Y")) == ["step 2 changed", "step 3 added"]
+    assert diff_steps(steps("a"), steps("a")) == []
+
+
+def test_diff_suites():
+    diff = diff_suites(OLD, NEW)
+    assert diff['added'] == ["NEG-01: Wrong password is rejected"]
+    assert diff['removed'] == ["UI-01: Logo is shown"]
+    assert diff['modified'] == [{'title': "FUNC-02: User can sign out", 'old_title': "FUNC-02: User can log out",
+                                 'changes': ['renamed from "FUNC-02: User can log out"', "step 2 added"]}]
+    assert (diff['unchanged'], diff['old_count'], diff['new_count']) == (1, 3, 3)
+
+
+def test_format_change_summary():
+    summary = format_change_summary(diff_suites(OLD, NEW))
+    assert summary.splitlines()[0] == "- **3 → 3 test cases:** 1 added, 1 removed, 1 modified, 1 unchanged"
+    assert "  - NEG-01: Wrong password is rejected" in summary
+    assert format_change_summary(diff_suites(OLD, OLD)).endswith("- No test case changed")
@@ -0,0 +1,83 @@
+from suite_merge import merge_suites, parse_suite, tag_cos_references
+
+HEADER = "Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference"
+
+FUNCTIONAL = f"""{HEADER}
+Test Case,FUNC-01: User can log in,,,,COS 1
+,,1,Open the login page,Login page is shown,
+Test Case,FUNC-02: Session survives a reload,,,,COS 1
+,,1,Log in as in FUNC-01,User is signed in,
+,,2,Reload the page,User is still signed in,"""
+
+NEGATIVE = f"""Here are the negative test cases:
+```csv
+{HEADER}
+Test Case,FUNC-01: User can log in,,,,COS 1
+,,1,Open the login page,Login page is shown,
+Test Case,NEG-01: Wrong password is rejected,,,,COS 1
+,,1,Repeat FUNC-01 with a wrong password,An error is shown,
+```"""
+
+
+def titles(csv_content):
+    _, rows = parse_suite(csv_content)
+    return [row[1] for row in rows if row[0] == "Test Case"]
+
+
+def test_parse_suite_skips_prose_and_fences():
+    header, rows = parse_suite(NEGATIVE)
+    assert header == HEADER.split(",")
+    assert [row[0] for row in rows] == ["Test Case", "", "Test Case", ""]
+
+
+def test_merge_renumbers_ids_per_category_across_parts():
+    merged = merge_suites([FUNCTIONAL, NEGATIVE])
+    assert merged.splitlines()[0] == HEADER
+    assert titles(merged) == [
+        "FUNC-01: User can log in",
+        "FUNC-02: Session survives a reload",
+        "FUNC-03: User can log in",
+        "NEG-01: Wrong password is rejected"
+    ]
+
+
+def test_merge_updates_references_to_the_parts_own_ids():
+    _, rows = parse_suite(merge_suites([FUNCTIONAL, NEGATIVE]))
+    steps = [row[3] for row in rows if row[0] == ""]
+    # The first part's FUNC-01 stays; the second part's FUNC-01 became FUNC-03
+    assert "Log in as in FUNC-01" in steps
+    assert "Repeat FUNC-03 with a wrong password" in steps
+
+
+def test_merge_can_drop_duplicate_titles_with_their_steps():
+    merged = merge_suites([FUNCTIONAL, NEGATIVE], drop_duplicates=True)
+    assert titles(merged) == [
+        "FUNC-01: User can log in",
+        "FUNC-02: Session survives a reload",
+        "NEG-01: Wrong password is rejected"
+    ]
+    _, rows = parse_suite(merged)
+    assert len(rows) == 7
+
+
+def test_merge_of_one_part_keeps_its_numbering():
+    assert titles(merge_suites([FUNCTIONAL])) == titles(FUNCTIONAL)
+
+
+def test_tag_cos_references_fills_missing_and_foreign_references():
+    suite = f"""{HEADER}
+Test Case,FUNC-01: Upload a file,,,,COS 3
+,,1,Upload,File is stored,
+Test Case,FUNC-02: Reject large files,,,,
+,,1,Upload 2 GB,An error is shown,
+Test Case,FUNC-03: Rename a file,,,,COS 7"""
+    tagged, count = tag_cos_references(suite, [3, 4])
+    _, rows = parse_suite(tagged)
+    assert count == 3
+    assert [row[5] for row in rows if row[0] == "Test Case"] == ["COS 3", "COS 3; COS 4", "COS 3; COS 4"]
+
+
+def test_tag_cos_references_adds_a_header_and_missing_columns():
+    tagged, count = tag_cos_references("Test Case,VAL-01: Name is required", [2])
+    assert count == 1
+    assert tagged.splitlines() == [HEADER, "Test Case,VAL-01: Name is required,,,,COS 2"]
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from suite_patch import apply_patch, apply_patch_answer, parse_patch, suite_from_csv
+
+SUITE = """Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference
+Test Case,FUNC-01: User can log in,,,,COS 1
+,,1,Open the login page,Login page is shown,
+,,2,Enter valid credentials,User is signed in,
+Test Case,FUNC-02: User can log out,,,,COS 2
+,,1,Click Log out,User is signed out,
+Test Case,NEG-01: Wrong password is rejected,,,,COS 1
+,,1,Enter a wrong password,An error is shown,"""
+
+
+def patch(*operations):
+    return json.dumps({'operations': list(operations)})
+
+
+def titles(csv_content):
+    return [test_case['title'] for test_case in suite_from_csv(csv_content)[1]]
+
+
+def test_suite_from_csv_reads_test_cases_and_steps():
+    last_column, test_cases = suite_from_csv(SUITE)
+    assert last_column == "COS Reference"
+    assert [len(test_case['steps']) for test_case in test_cases] == [2, 1, 1]
+    assert test_cases[0]['reference'] == "COS 1"
+    assert test_cases[0]['steps'][1] == {'action': "Enter valid credentials", 'expected': "User is signed in"}
+
+
+def test_parse_patch_accepts_text_around_the_json():
+    operations = parse_patch('Here you go:\n```json\n{"operations": [{"op": "delete_test", "test": "FUNC-02"}]}\n```')
+    assert operations == [{'op': "delete_test", 'test': "FUNC-02"}]
+
+
+def test_parse_patch_rejects_answers_without_operations():
+    with pytest.raises(ValueError):
+        parse_patch('{"test_cases": []}')
+
+
+def test_apply_patch_edits_steps_and_titles():
+    _, test_cases = suite_from_csv(SUITE)
+    patched, skipped = apply_patch(test_cases, [
+        {'op': "replace_step", 'test': "FUNC-01", 'step': 2, 'action': "Enter a valid user", 'expected': "Signed in"},
+        {'op': "add_step", 'test': "func-02", 'step': None, 'action': "Reload", 'expected': "Still signed out"},
+        {'op': "delete_step", 'test': "NEG-01", 'step': 1},
+        {'op': "retitle", 'test': "FUNC-02", 'title': "User can sign out"},
+        {'op': "set_reference", 'test': "NEG-01: Wrong password is rejected", 'reference': "COS 3"}
+    ])
+    assert skipped == []
+    assert patched[0]['steps'][1] == {'action': "Enter a valid user", 'expected': "Signed in"}
+    assert patched[1]['title'] == "FUNC-02: User can sign out"
+    assert [step['action'] for step in patched[1]['steps']] == ["Click Log out", "Reload"]
+    assert patched[2]['steps'] == [] and patched[2]['reference'] == "COS 3"
+    # The input is left alone
+    assert test_cases[0]['steps'][1]['action'] == "Enter valid credentials"
+
+
+def test_apply_patch_skips_operations_that_do_not_fit():
+    _, test_cases = suite_from_csv(SUITE)
+    patched, skipped = apply_patch(test_cases, [
+        {'op': "delete_test", 'test': "UI-09"},
+        {'op': "replace_step", 'test': "FUNC-01", 'step': 5, 'action': "x", 'expected': "y"},
+        {'op': "delete_test", 'test': "FUNC-02"}
+    ])
+    assert len(skipped) == 2
+    assert [test_case['title'] for test_case in patched] == ["FUNC-01: User can log in",
+                                                             "NEG-01: Wrong password is rejected"]
+
+
+def test_add_test_goes_after_its_category_with_a_free_id():
+    _, test_cases = suite_from_csv(SUITE)
+    patched, _ = apply_patch(test_cases, [
+        {'op': "add_test", 'title': "FUNC-01: Remember me keeps the session", 'reference': "COS 1",
+         'steps': [{'action': "Tick Remember me", 'expected': "Session survives a restart"}]},
+        {'op': "add_test", 'title': "Session expires after an hour", 'reference': None, 'steps': None}
+    ])
+    assert [test_case['title'] for test_case in patched] == [
+        "FUNC-01: User can log in",
+        "FUNC-02: User can log out",
+        "FUNC-03: Remember me keeps the session",
+        "FUNC-04: Session expires after an hour",
+        "NEG-01: Wrong password is rejected"
+    ]
+
+
+def test_apply_patch_answer_applies_operations():
+    csv_content, applied, skipped = apply_patch_answer(SUITE, patch(
+        {'op': "delete_test", 'test': "FUNC-02"},
+        {'op': "delete_test", 'test': "REG-01"}
+    ))
+    assert (applied, len(skipped)) == (1, 1)
+    assert titles(csv_content) == ["FUNC-01: User can log in", "NEG-01: Wrong password is rejected"]
+    assert csv_content.splitlines()[0] == "Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference"
+
+
+def test_apply_patch_answer_accepts_a_fenced_csv_suite():
+    answer = "Here is the updated suite:\n```csv\n" + SUITE.replace("User can log out", "User can sign out") + "\n```"
+    csv_content, applied, skipped = apply_patch_answer(SUITE, answer)
+    assert applied is None and skipped == []
+    assert "```" not in csv_content
+    assert titles(csv_content)[1] == "FUNC-02: User can sign out"
+
+
+def test_apply_patch_answer_accepts_a_json_suite():
+    answer = json.dumps({'test_cases': [{'title': "UI-01: Button is visible", 'reference': "COS 4",
+                                         'steps': [{'action': "Open the page", 'expected': "Button shown"}]}]})
+    csv_content, applied, _ = apply_patch_answer(SUITE, answer)
+    assert applied is None
+    assert titles(csv_content) == ["UI-01: Button is visible"]
+
+
+def test_apply_patch_answer_rejects_prose():
+    with pytest.raises(ValueError, match="no usable edits"):
+        apply_patch_answer(SUITE, "Sorry, I cannot help with that.")
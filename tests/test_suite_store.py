@@ -0,0 +1,34 @@
+import json
+
+from conftest import make_work_item
+from suite_store import SuiteStore
+
+SUITE = "Work Item Type,Title,Test Step,Step Action,Step Expected,COS Reference\nTest Case,FUNC-01: Log in,,,,COS 1"
+
+
+def test_import_files_loads_exported_work_items_and_suites(tmp_path):
+    (tmp_path / "PBI-7.json").write_text(json.dumps(make_work_item(7)), encoding='utf-8')
+    (tmp_path / "Testcases_PBI_7.csv").write_text(SUITE, encoding='utf-8')
+    store = SuiteStore(str(tmp_path / "testgen.db"))
+    try:
+        assert store.import_files([str(tmp_path)], [str(tmp_path)]) == (1, 1)
+        assert store.latest_suite(7) is not None
+        # Files already in the store are not imported twice
+        assert store.import_files([str(tmp_path)], [str(tmp_path)]) == (0, 0)
+    finally:
+        store.close()
+
+
+def test_import_files_skips_unreadable_files(tmp_path):
+    (tmp_path / "PBI-8.json").write_text("{not json", encoding='utf-8')
+    (tmp_path / "Testcases_PBI_8.csv").write_bytes(b"\xff\xfe" + SUITE.encode('utf-16-le'))
+    (tmp_path / "Testcases_PBI_9.csv").write_text(SUITE, encoding='utf-8')
+    messages = []
+    store = SuiteStore(str(tmp_path / "testgen.db"))
+    try:
+        assert store.import_files([str(tmp_path)], [str(tmp_path)],
+                                  log=lambda message, level="INFO": messages.append(level)) == (0, 1)
+        assert store.latest_suite(9) is not None
+        assert messages.count("WARNING") == 2
+    finally:
+        store.close()
@@ -0,0 +1,100 @@
+import json
+import os
+
+from conftest import make_work_item
+from work_item_cache import INDEX_FILE_NAME, REVISION_FIELDS, WorkItemCache, _covers
+
+DESCRIPTION = "System.Description"
+
+
+def test_covers():
+    assert _covers(None, None) and _covers(None, ["System.Title"])
+    assert _covers(["System.Title", DESCRIPTION], [DESCRIPTION])
+    assert not _covers(["System.Title"], [DESCRIPTION])
+    # A projected copy never serves a request for every field
+    assert not _covers(["System.Title"], None)
+
+
+def test_first_request_exports_and_writes_the_file(tmp_path, ado_client):
+    ado_client.add(make_work_item(1), make_work_item(2))
+    cache = WorkItemCache(str(tmp_path))
+    items = cache.get_work_items([1, 2, 3], ado_client)
+    assert sorted(items) == [1, 2]
+    assert ado_client.batches == [([1, 2, 3], None)]
+    assert (tmp_path / "PBI-1.json").exists()
+    assert cache.stats == {'hits': 0, 'misses': 3, 'revision_checks': 0}
+
+
+def test_within_the_ttl_items_are_served_without_a_request(tmp_path, ado_client):
+    ado_client.add(make_work_item(1))
+    cache = WorkItemCache(str(tmp_path), ttl_seconds=300)
+    cache.get_work_items([1], ado_client)
+    ado_client.batches.clear()
+    assert cache.get_work_item(1, ado_client)['rev'] == 1
+    assert ado_client.batches == []
+    assert cache.stats['hits'] == 1
+
+
+def test_after_the_ttl_an_unchanged_revision_is_confirmed_cheaply(tmp_path, ado_client):
+    ado_client.add(make_work_item(1))
+    cache = WorkItemCache(str(tmp_path), ttl_seconds=0)
+    cache.get_work_items([1], ado_client)
+    ado_client.batches.clear()
+    cache.get_work_items([1], ado_client)
+    assert ado_client.batches == [([1], REVISION_FIELDS)]
+    assert cache.stats['revision_checks'] == 1 and cache.stats['hits'] == 1
+
+
+def test_a_new_revision_is_exported_again(tmp_path, ado_client):
+    ado_client.add(make_work_item(1, rev=1))
+    cache = WorkItemCache(str(tmp_path), ttl_seconds=0)
+    cache.get_work_items([1], ado_client)
+    ado_client.add(make_work_item(1, rev=2, changed_date="2024-01-02T00:00:00Z"))
+    ado_client.batches.clear()
+    assert cache.get_work_item(1, ado_client)['rev'] == 2
+    assert ado_client.batches == [([1], REVISION_FIELDS), ([1], None)]
+    with open(tmp_path / "PBI-1.json", encoding='utf-8') as f:
+        assert json.load(f)['rev'] == 2
+
+
+def test_a_file_edited_behind_the_index_is_revalidated(tmp_path, ado_client):
+    ado_client.add(make_work_item(1, rev=3))
+    cache = WorkItemCache(str(tmp_path), ttl_seconds=300)
+    cache.get_work_items([1], ado_client)
+    # An older copy written by another tool no longer matches the indexed revision
+    with open(tmp_path / "PBI-1.json", 'w', encoding='utf-8') as f:
+        json.dump(make_work_item(1, rev=2), f)
+    ado_client.batches.clear()
+    assert cache.get_work_item(1, ado_client)['rev'] == 3
+    assert ado_client.batches == [([1], REVISION_FIELDS), ([1], None)]
+
+
+def test_a_projected_copy_is_only_reused_for_the_same_or_fewer_fields(tmp_path, ado_client):
+    ado_client.add(make_work_item(1, fields={DESCRIPTION: "Details"}))
+    cache = WorkItemCache(str(tmp_path), ttl_seconds=300)
+    projected = ["System.Title"]
+    assert DESCRIPTION not in cache.get_work_item(1, ado_client, fields=projected)['fields']
+
+    ado_client.batches.clear()
+    cache.get_work_item(1, ado_client, fields=projected)
+    assert ado_client.batches == []
+
+    assert cache.get_work_item(1, ado_client, fields=None)['fields'][DESCRIPTION] == "Details"
+    assert ado_client.batches == [([1], None)]
+
+
+def test_the_index_survives_a_restart(tmp_path, ado_client):
+    ado_client.add(make_work_item(1))
+    WorkItemCache(str(tmp_path)).get_work_items([1], ado_client, fields=["System.Title"])
+    assert os.path.exists(tmp_path / INDEX_FILE_NAME)
+    ado_client.batches.clear()
+    WorkItemCache(str(tmp_path)).get_work_items([1], ado_client, fields=["System.Title"])
+    assert ado_client.batches == []
+
+
+def test_update_records_the_projected_fields(tmp_path, ado_client):
+    cache = WorkItemCache(str(tmp_path))
+    cache.update([make_work_item(1)], ["System.Title"])
+    ado_client.add(make_work_item(1, fields={DESCRIPTION: "Details"}))
+    cache.get_work_item(1, ado_client, fields=[DESCRIPTION])
+    assert ado_client.batches == [([1], [DESCRIPTION])]
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import make_work_item
+from suite_store import SuiteStore
+from work_item_cache import WorkItemCache
+from work_item_sync import build_changed_query, sync_changed_work_items, sync_scope
+
+CRITERIA = "Microsoft.VSTS.Common.AcceptanceCriteria"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SuiteStore(str(tmp_path / "testgen.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    json_dir = tmp_path / "json"
+    json_dir.mkdir()
+    return WorkItemCache(str(json_dir))
+
+
+def sync(ado_client, cache, store, page_size=200):
+    return sync_changed_work_items(ado_client, cache, store, "Project", page_size=page_size)
+
+
+def test_build_changed_query():
+    assert build_changed_query("Project") == "SELECT [System.Id] FROM WorkItems WHERE [System.TeamProject] = 'Project'"
+    assert build_changed_query("Project", "2024-01-01T10:00:00Z", "Project\\Team").endswith(
+        "[System.AreaPath] UNDER 'Project\\Team' AND [System.ChangedDate] >= '2024-01-01T10:00:00Z'")
+
+
+def test_first_sync_mirrors_everything_and_sets_the_watermark(ado_client, cache, store):
+    ado_client.add(make_work_item(1, changed_date="2024-01-01T10:00:00Z"),
+                   make_work_item(2, changed_date="2024-01-03T10:00:00Z"),
+                   make_work_item(3, changed_date="2024-01-02T10:00:00Z"))
+    result = sync(ado_client, cache, store, page_size=2)
+    assert result == {'updated': 3, 'flagged': [], 'watermark': "2024-01-03T10:00:00Z"}
+    assert store.get_watermark(sync_scope("Project")) == "2024-01-03T10:00:00Z"
+    assert store.get_work_item(3) is not None and cache.peek(3) is not None
+    assert "ChangedDate" not in ado_client.queries[0]
+
+
+def test_items_changed_at_the_watermark_are_fetched_again(ado_client, cache, store):
+    ado_client.add(make_work_item(1, changed_date="2024-01-01T10:00:00Z"),
+                   make_work_item(2, changed_date="2024-01-03T10:00:00Z"))
+    sync(ado_client, cache, store)
+    # Saved in the same instant as item 2, after the previous sync read it
+    ado_client.add(make_work_item(3, changed_date="2024-01-03T10:00:00Z"))
+    result = sync(ado_client, cache, store)
+    assert "[System.ChangedDate] >= '2024-01-03T10:00:00Z'" in ado_client.queries[-1]
+    assert ado_client.batches[-1][0] == [2, 3]
+    assert result['updated'] == 2 and result['watermark'] == "2024-01-03T10:00:00Z"
+
+
+def test_a_sync_without_changes_keeps_the_watermark(ado_client, cache, store):
+    ado_client.add(make_work_item(1, changed_date="2024-01-01T10:00:00Z"))
+    sync(ado_client, cache, store)
+    ado_client.work_items.clear()
+    assert sync(ado_client, cache, store) == {'updated': 0, 'flagged': [], 'watermark': "2024-01-01T10:00:00Z"}
+
+
+def test_changed_acceptance_criteria_flag_the_item(ado_client, cache, store):
+    ado_client.add(make_work_item(1, changed_date="2024-01-01T10:00:00Z", fields={CRITERIA: "Can log in"}),
+                   make_work_item(2, changed_date="2024-01-01T10:00:00Z", fields={CRITERIA: "Can log out"}))
+    sync(ado_client, cache, store)
+    ado_client.add(make_work_item(1, rev=2, changed_date="2024-01-02T10:00:00Z", fields={CRITERIA: "Can log in"}),
+                   make_work_item(2, rev=2, changed_date="2024-01-02T10:00:00Z", fields={CRITERIA: "Can sign out"}))
+    result = sync(ado_client, cache, store)
+    assert result['flagged'] == [2]
+    assert [row['work_item_id'] for row in store.flagged_work_items()] == [2]
@@ -0,0 +1,137 @@
+"""Benchmark bulk work item export against a local stand-in Azure DevOps server
+
+Serves the work items in data/json from a local HTTP server that mimics the
+work items batch endpoint, then times a bulk export into a temporary folder.
+
+Usage: python utilities/benchmark_export.py [count] [latency_ms]
+"""
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from ado_client import AdoClient, export_work_items
+
+DATA_JSON_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'json')
+
+
+def load_corpus():
+    """Load the exported work items used as server responses"""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(DATA_JSON_DIR, 'PBI-*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            corpus.append(json.load(f))
+    return corpus
+
+
+# Work item IDs the stand-in server reports as matching any WIQL query
+QUERY_ID_RANGE = range(1000, 1450)
+
+
+def make_handler(corpus, latency):
+    """Build a request handler that answers like POST _apis/wit/workitemsbatch"""
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+        def do_GET(self):
+            if not self.path.startswith('/_apis/wit/fields'):
+                self.send_error(404)
+                return
+            names = sorted({name for item in corpus for name in item['fields']})
+            self._send_json({'count': len(names), 'value': [{'referenceName': name} for name in names]})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+
+            if '/_apis/wit/wiql' in self.path:
+                # Honour the `[System.Id] > N` condition and $top used for paging
+                match = re.search(r'\[System\.Id\] > (\d+)', body.get('query', ''))
+                last_id = int(match.group(1)) if match else 0
+                top = re.search(r'[?&]%24top=(\d+)|[?&]\$top=(\d+)', self.path)
+                ids = [i for i in QUERY_ID_RANGE if i > last_id]
+                if top:
+                    ids = ids[:int(top.group(1) or top.group(2))]
+                self._send_json({'workItems': [{'id': i} for i in ids]})
+                return
+
+            if not self.path.startswith('/_apis/wit/workitemsbatch'):
+                self.send_error(404)
+                return
+
+            fields = body.get('fields')
+            value = []
+            for work_item_id in body.get('ids', []):
+                item = json.loads(json.dumps(corpus[work_item_id % len(corpus)]))
+                item['id'] = work_item_id
+                item['fields']['System.Id'] = work_item_id
+                if fields:
+                    item = {
+                        'id': work_item_id,
+                        'rev': item['rev'],
+                        'fields': {k: v for k, v in item['fields'].items() if k in fields},
+                        'url': item['url']
+                    }
+                value.append(item)
+
+            self._send_json({'count': len(value), 'value': value})
+
+        def _send_json(self, body):
+            time.sleep(latency)
+
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+
+def start_stand_in_server(latency=0.05):
+    """Start the stand-in server on a free local port and return (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(load_corpus(), latency))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+    server, base_url = start_stand_in_server(latency)
+    ids = list(range(1000, 1000 + count))
+
+    with tempfile.TemporaryDirectory() as json_dir:
+        client = AdoClient(base_url, token="stand-in")
+        start = time.perf_counter()
+        exported = export_work_items(client, ids, json_dir, log=lambda message, level="INFO": print(f"[{level}] {message}"))
+        elapsed = time.perf_counter() - start
+        client.close()
+
+        print("\n=== Bulk Export Benchmark ===")
+        print(f"Work items:      {len(exported)}")
+        print(f"HTTP requests:   {client.request_count}")
+        print(f"Server latency:  {latency * 1000:.0f} ms per request")
+        print(f"Total time:      {elapsed:.3f} s ({elapsed / max(len(exported), 1) * 1000:.1f} ms per item)")
+        print(f"One `az` call per item at ~2 s startup would take ~{2 * count} s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark the HTML normalizer against the regex chains it replaced
+
+Runs every rich-text field in data/json through the old regex-based clean-ups
+(COS tab, COS parser, related item summaries) and through html_text, cold and
+memoized.
+
+Usage: python utilities/benchmark_html.py [rounds]
+"""
+import glob
+import json
+import os
+import re
+import sys
+import time
+from html import unescape
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from html_text import clear_cache, normalize_html
+
+DATA_JSON_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'json')
+
+HTML_FIELDS = [
+    "System.Description",
+    "Microsoft.VSTS.Common.AcceptanceCriteria",
+    "Microsoft.VSTS.TCM.ReproSteps",
+    "Custom.DeveloperNotes"
+]
+
+
+def load_field_values():
+    """Collect the non-empty rich-text field values from the exported work items"""
+    values = []
+    for path in sorted(glob.glob(os.path.join(DATA_JSON_DIR, 'PBI-*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            fields = json.load(f).get('fields', {})
+        values.extend(fields[name] for name in HTML_FIELDS if fields.get(name))
+    return values
+
+
+def legacy_cos_tab(value):
+    """COS tab clean-up: unescape plus six re.sub passes"""
+    text = unescape(value)
+    text = re.sub(r'<li[^>]*>', '\n• ', text)
+    text = re.sub(r'</li>', '', text)
+    text = re.sub(r'<br\s*/?>', '\n', text)
+    text = re.sub(r'</p>\s*<p>', '\n\n', text)
+    text = re.sub(r'<div[^>]*>', '\n', text)
+    text = re.sub(r'</div>', '', text)
+    text = re.sub(r'<[^<]+?>', '', text)
+    return [line.strip() for line in text.split('\n') if len(line.strip()) > 3]
+
+
+def legacy_cos_parser(value):
+    """COS parser: <li> regex, nested list regex and per-item tag stripping"""
+    cos_list = []
+    for item in re.findall(r'<li[^>]*>(.*?)</li>', value, re.IGNORECASE | re.DOTALL):
+        main_match = re.search(r'^(.*?)(?:<ul>|<ol>)', item, re.IGNORECASE | re.DOTALL)
+        clean_item = re.sub(r'<[^>]+>', '', main_match.group(1) if main_match else item).strip()
+        if clean_item:
+            cos_list.append(clean_item)
+    if not cos_list:
+        cos_list = [line.strip() for line in re.sub(r'<[^>]+>', '', value).split('\n') if line.strip()]
+    return cos_list
+
+
+def legacy_plain_text(value):
+    """Related item summaries: strip tags and collapse whitespace"""
+    return re.sub(r"\s+", " ", unescape(re.sub(r"<[^>]+>", " ", value))).strip()
+
+
+def time_rounds(func, values, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for value in values:
+            func(value)
+    return time.perf_counter() - start
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    values = load_field_values()
+    if not values:
+        print(f"No rich-text fields found in {DATA_JSON_DIR}")
+        return
+
+    def legacy(value):
+        legacy_cos_tab(value)
+        legacy_cos_parser(value)
+        legacy_plain_text(value)
+
+    def normalizer_cold(value):
+        clear_cache()
+        normalize_html(value)
+
+    legacy_time = time_rounds(legacy, values, rounds)
+    cold_time = time_rounds(normalizer_cold, values, rounds)
+    clear_cache()
+    warm_time = time_rounds(normalize_html, values, rounds)
+
+    calls = len(values) * rounds
+    print("\n=== HTML Normalizer Benchmark ===")
+    print(f"Field values:    {len(values)} ({sum(map(len, values)) / 1024:.0f} KB), {rounds} rounds")
+    print(f"Regex chains:    {legacy_time:.3f} s ({legacy_time / calls * 1e6:.0f} us per field, 3 passes)")
+    print(f"Normalizer:      {cold_time:.3f} s ({cold_time / calls * 1e6:.0f} us per field, one pass)")
+    print(f"Memoized:        {warm_time:.3f} s ({warm_time / calls * 1e6:.1f} us per field)")
+
+
+if __name__ == "__main__":
+    main()